@@ -0,0 +1,137 @@
+# benchmarks/bench_jobqueue.py
+"""多节点任务队列：用多个本机进程模拟节点，检查领取竞争、租约过期重新排队与最大尝试次数，并给出领取吞吐
+
+运行：python benchmarks/bench_jobqueue.py [任务数] [节点进程数]
+任一检查不通过时以非 0 退出码结束。任务路径为虚构路径，不解码视频。
+"""
+import logging
+import multiprocessing as mp
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.jobqueue import JobQueue
+
+
+def _node_drain(db_path: str, owner: str, start, claimed):
+    """正常节点：领取 → 完成，直到队列为空；返回领取到的任务号"""
+    queue = JobQueue(db_path)
+    start.wait()
+    ids = []
+    while True:
+        job = queue.claim(owner)
+        if job is None:
+            break
+        ids.append(job.id)
+        queue.complete(job.id, owner, events=0)
+    claimed.put((owner, ids))
+
+
+def _node_crash(db_path: str, lease_seconds: float, result):
+    """崩溃节点：领取后不续约、不完成，直接退出进程"""
+    job = JobQueue(db_path, lease_seconds=lease_seconds).claim(f"crash:{os.getpid()}")
+    result.put(None if job is None else (job.id, job.attempts))
+    result.close()
+    result.join_thread()
+    os._exit(1)
+
+
+def check_claim_race(workdir: str, jobs: int, nodes: int) -> bool:
+    """多个进程同时领取：每个任务恰好被领取一次，全部完成"""
+    db_path = os.path.join(workdir, "race.db")
+    queue = JobQueue(db_path)
+    queue.enqueue([f"/虚构/视频_{i}.mp4" for i in range(jobs)])
+    start, claimed = mp.Event(), mp.Queue()
+    procs = [mp.Process(target=_node_drain, args=(db_path, f"节点{i}", start, claimed)) for i in range(nodes)]
+    for p in procs:
+        p.start()
+    begin = time.perf_counter()
+    start.set()
+    results = [claimed.get() for _ in procs]
+    elapsed = time.perf_counter() - begin
+    for p in procs:
+        p.join()
+    ids = [job_id for _, owned in results for job_id in owned]
+    status = queue.status()
+    ok = len(ids) == len(set(ids)) == jobs and status["done"] == jobs
+    per_node = "，".join(f"{owner} {len(owned)}" for owner, owned in sorted(results))
+    print(f"[领取竞争] {'通过' if ok else '失败'}：{jobs} 个任务，{nodes} 个进程，领取 {len(ids)} 次"
+          f"（不重复 {len(set(ids))}），完成 {status['done']}；{jobs / elapsed:.0f} 任务/秒（{per_node}）")
+    return ok
+
+
+def check_lease_expiry(workdir: str, lease_seconds: float = 0.5) -> bool:
+    """节点领取后崩溃：租约有效期内其他节点领取不到，过期后重新领取且尝试次数加一"""
+    db_path = os.path.join(workdir, "lease.db")
+    queue = JobQueue(db_path, lease_seconds=lease_seconds)
+    queue.enqueue(["/虚构/崩溃.mp4"])
+    result = mp.Queue()
+    crash = mp.Process(target=_node_crash, args=(db_path, lease_seconds, result))
+    crash.start()
+    first = result.get()
+    crash.join()
+    during = queue.claim("接管节点")
+    time.sleep(lease_seconds * 1.2)
+    after = queue.claim("接管节点")
+    ok = (crash.exitcode == 1 and first is not None and first[1] == 1 and during is None
+          and after is not None and after.id == first[0] and after.attempts == 2)
+    if after is not None:
+        ok = queue.complete(after.id, "接管节点", events=0) and ok
+    print(f"[租约过期] {'通过' if ok else '失败'}：崩溃节点领取 {first}，租约内再领取 {during}，"
+          f"过期后领取 {tuple(after[:1]) + (after.attempts,) if after else None}")
+    return ok
+
+
+def check_max_attempts(workdir: str, lease_seconds: float = 0.2, max_attempts: int = 2,
+                       exhausted: int = 3000) -> bool:
+    """反复崩溃的任务在 max_attempts 次后标记为失败；大量此类任务连续排在前面时一次领取跳过全部"""
+    db_path = os.path.join(workdir, "attempts.db")
+    queue = JobQueue(db_path, lease_seconds=lease_seconds, max_attempts=max_attempts)
+    queue.enqueue(["/虚构/反复崩溃.mp4"])
+    # 真实进程依次领取后崩溃，直到用完尝试次数
+    attempts = []
+    for _ in range(max_attempts):
+        result = mp.Queue()
+        crash = mp.Process(target=_node_crash, args=(db_path, lease_seconds, result))
+        crash.start()
+        attempts.append(result.get())
+        crash.join()
+        time.sleep(lease_seconds * 1.2)
+    leftover = queue.claim("检查节点")
+    failed = queue.failures()
+    single_ok = leftover is None and len(failed) == 1 and [a for _, a in attempts] == list(range(1, max_attempts + 1))
+
+    # 模拟大量节点在这些任务上崩溃过：直接把尝试次数写满、租约置为过期，后面再排一个正常任务
+    paths = [f"/虚构/耗尽_{i}.mp4" for i in range(exhausted)]
+    queue.enqueue(paths + ["/虚构/正常.mp4"])
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("UPDATE jobs SET state = 'running', attempts = ?, lease_until = ? WHERE path LIKE '/虚构/耗尽%'",
+                     (max_attempts, time.time() - 1))
+    begin = time.perf_counter()
+    job = queue.claim("检查节点")
+    elapsed = time.perf_counter() - begin
+    status = queue.status()
+    bulk_ok = job is not None and job.path == "/虚构/正常.mp4" and status["failed"] == exhausted + 1
+    ok = single_ok and bulk_ok
+    print(f"[最大尝试次数] {'通过' if ok else '失败'}：单个任务尝试 {[a for _, a in attempts]} 后标记失败 "
+          f"{'是' if single_ok else '否'}；{exhausted} 个耗尽任务之后领取到 {job.path if job else None}"
+          f"（{elapsed * 1000:.0f} 毫秒，失败 {status['failed']}）")
+    return ok
+
+
+if __name__ == "__main__":
+    n_jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    n_nodes = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    logging.getLogger("core.jobqueue").setLevel(logging.ERROR)  # 逐个任务的失败警告不输出
+    mp.set_start_method("spawn")  # 与独立节点一致：各进程不继承父进程的数据库连接等状态
+    with tempfile.TemporaryDirectory(prefix="jobqueue_") as tmp:
+        results = [
+            check_claim_race(tmp, n_jobs, n_nodes),
+            check_lease_expiry(tmp),
+            check_max_attempts(tmp)
+        ]
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,96 @@
+# benchmarks/bench_startup.py
+"""启动耗时：冷启动（新解释器）各入口的耗时、工作进程拉起延迟，并检查无界面路径未加载 Tk / PIL
+
+运行：python benchmarks/bench_startup.py [重复次数]
+"""
+import importlib
+import importlib.util
+import multiprocessing as mp
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+GUI_MODULES = ("tkinter", "PIL")
+
+# 无界面入口：(名称, 在新解释器中执行的代码)
+HEADLESS_ENTRIES = [
+    ("解释器基线", "pass"),
+    ("命令行解析", "import cli; cli.build_parser()"),
+    ("任务队列管理", "import core.jobqueue"),
+    ("单视频处理", "import core.runner"),
+    ("监视目录", "import core.watcher"),
+    ("HTTP 服务", "import core.service"),
+]
+
+
+def _run(code: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def cold_start(code: str, repeat: int) -> float:
+    """新解释器执行 code 的耗时中位数（秒）"""
+    _run(code)  # 预热磁盘缓存
+    return statistics.median(_run(code) for _ in range(repeat))
+
+
+def loaded_gui_modules(code: str) -> list:
+    probe = f"{code}\nimport sys\nprint(','.join(m for m in {GUI_MODULES!r} if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, check=True,
+                         capture_output=True, text=True).stdout.strip()
+    return [m for m in out.split(",") if m]
+
+
+def _worker_ready() -> int:
+    importlib.import_module("core.runner")  # 与监视目录工作进程的实际导入一致
+    return os.getpid()
+
+
+def spawn_latency(method: str, workers: int) -> float:
+    """从创建进程池到所有工作进程完成导入并返回结果的耗时（秒）"""
+    ctx = mp.get_context(method)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as executor:
+        futures = [executor.submit(_worker_ready) for _ in range(workers)]
+        for f in futures:
+            f.result()
+    return time.perf_counter() - start
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    print(f"冷启动耗时（中位数，{repeat} 次）")
+    for name, code in HEADLESS_ENTRIES:
+        gui = loaded_gui_modules(code)
+        flag = f"  ← 加载了 {', '.join(gui)}" if gui else ""
+        print(f"  {name:<10} {cold_start(code, repeat) * 1000:8.1f} ms{flag}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "q.db")
+        code = f"import cli; cli.main(['queue', 'status', {db!r}, '--log-dir', {tmp!r}])"
+        print(f"  {'queue status':<10} {cold_start(code, repeat) * 1000:8.1f} ms")
+
+    missing = [m for m in GUI_MODULES if importlib.util.find_spec(m) is None]
+    if missing:
+        print(f"  {'界面模块':<10} 跳过（未安装 {', '.join(missing)}）")
+    else:
+        print(f"  {'界面模块':<10} {cold_start('import ui.main_window', repeat) * 1000:8.1f} ms")
+
+    print("工作进程拉起延迟（2 个进程，导入 core.runner）")
+    for method in mp.get_all_start_methods():
+        times = [spawn_latency(method, 2) for _ in range(max(1, repeat // 2))]
+        print(f"  {method:<10} {statistics.median(times) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,518 @@
+# cli.py
+"""命令行（无界面）入口
+
+    python main.py run 视频1.mp4 视频2.mp4 --speed 4
+    python main.py watch /mnt/nvr/cam1 /mnt/nvr/cam2 --workers 2
+    python main.py queue enqueue /mnt/share/任务.db /mnt/nvr/*.mp4 --segment-frames 18000
+    python main.py worker /mnt/share/任务.db        # 每台服务器各运行一个或多个
+    python main.py serve --port 8765
+    python main.py store list 变化截图/cam1.tar
+    python main.py verify 样例.mp4 --modes threaded segmented
+    python main.py probe /mnt/nvr/*.flv --index 视频索引.jsonl
+    python main.py events 变化截图/事件索引.db --camera cam1 --time 02:00-03:00 --min-ratio 10
+"""
+import argparse
+import functools
+import logging
+import os
+import signal
+import sys
+import threading
+from datetime import datetime
+from typing import List, Optional
+
+from config import (
+    DEFAULT_GMM_VAR_THRESHOLD,
+    DEFAULT_FRAME_DIFF_THRESHOLD,
+    DEFAULT_MIN_INTERVAL,
+    DEDUP_ENABLED,
+    MV_PREFILTER_ENABLED,
+    CAPTURE_MODE,
+    ACTIVITY_ENABLED,
+    FUSION_MODE,
+    MORPH_ENABLED,
+    MORPH_KERNEL_SIZE,
+    MIN_AREA,
+    COMPONENT_MAX_AREA,
+    SCREENSHOT_MODE,
+    SCREENSHOT_MAX_DIM,
+    SCREENSHOT_STORE,
+    TRIGGER_CLOCK,
+    WATCH_MAX_WORKERS,
+    WATCH_POLL_INTERVAL,
+    WATCH_STABLE_SECONDS,
+    WATCH_LEDGER_NAME,
+    JOB_SEGMENT_FRAMES,
+    JOB_POLL_INTERVAL,
+    SERVICE_HOST,
+    SERVICE_PORT,
+    SERVICE_MAX_WORKERS,
+    SERVICE_QUEUE_SIZE,
+    METRICS_PORT,
+    MEMORY_BUDGET_MB,
+    MEMORY_WORKER_MAX_TASKS,
+    CPU_BUDGET_PERCENT,
+    PROCESS_NICE,
+    PROCESS_IO_IDLE,
+    RUN_SCHEDULE,
+    EQUIVALENCE_FRAME_TOLERANCE,
+    PROBE_WORKERS,
+    PROBE_INDEX_NAME,
+    EVENT_DB_ENABLED,
+    EVENT_DB_NAME
+)
+
+
+def setup_logging(log_dir: str):
+    """与界面相同的日志格式，同时输出到控制台与 检测日志 目录"""
+    os.makedirs(log_dir, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    log_path = os.path.join(log_dir, f"检测日志_{timestamp}_{os.getpid()}.txt")
+    formatter = logging.Formatter("[%(asctime)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    # delay=True：首条日志写入时才创建文件
+    for handler in (logging.StreamHandler(), logging.FileHandler(log_path, encoding='utf-8', delay=True)):
+        handler.setFormatter(formatter)
+        root.addHandler(handler)
+
+
+def _add_detection_args(parser: argparse.ArgumentParser):
+    parser.add_argument("--gmm-var", type=int, default=DEFAULT_GMM_VAR_THRESHOLD, help="GMM 敏感度 (varThreshold)")
+    parser.add_argument("--fd-var", type=int, default=DEFAULT_FRAME_DIFF_THRESHOLD, help="帧间差分阈值")
+    parser.add_argument("--interval", type=float, default=DEFAULT_MIN_INTERVAL, help="截图最小间隔（视频内秒）")
+    parser.add_argument("--throttle-clock", choices=("video", "wall"), default=TRIGGER_CLOCK,
+                        help="截图间隔计时方式（video: 视频内时间，wall: 处理时的系统时间）")
+    parser.add_argument("--threshold", type=float, default=None, help="画面变化阈值（%%），默认仅按连通域面积判断")
+    parser.add_argument("--speed", type=int, default=1, help="处理倍速（跳帧）")
+    parser.add_argument("--fusion", choices=("and", "or", "gmm", "diff"), default=FUSION_MODE,
+                        help="前景融合方式（and: GMM 与帧差同时变化，or: 任一变化，gmm / diff: 只用其中一种，更省）")
+    parser.add_argument("--morph", action=argparse.BooleanOptionalAction, default=MORPH_ENABLED,
+                        help="开闭运算去噪")
+    parser.add_argument("--kernel-size", type=int, default=MORPH_KERNEL_SIZE, help="形态学核边长（奇数）")
+    parser.add_argument("--min-area", type=int, default=MIN_AREA, help="有效连通域最小面积（处理分辨率像素）")
+    parser.add_argument("--max-area", type=int, default=COMPONENT_MAX_AREA,
+                        help="有效连通域最大面积（处理分辨率像素，0 不限制）")
+    parser.add_argument("--zones", default=None, help="关注区域 JSON 文件（原始分辨率坐标）")
+    parser.add_argument("--dedup", action=argparse.BooleanOptionalAction, default=DEDUP_ENABLED,
+                        help="相似截图去重")
+    parser.add_argument("--mv-prefilter", action=argparse.BooleanOptionalAction, default=MV_PREFILTER_ENABLED,
+                        help="按编码运动矢量跳过静止帧的检测（需要 PyAV）")
+    parser.add_argument("--capture-mode", choices=("frame", "track"), default=CAPTURE_MODE,
+                        help="截图方式（frame: 逐帧触发按间隔节流，track: 按目标跟踪，每个目标一张截图 + 轨迹记录）")
+    parser.add_argument("--activity", action=argparse.BooleanOptionalAction, default=ACTIVITY_ENABLED,
+                        help="每个视频输出活动热力图（PNG）与分钟活动时间线（CSV / npz）")
+    parser.add_argument("--mode", choices=("full", "crop", "sheet"), default=SCREENSHOT_MODE, help="截图内容")
+    parser.add_argument("--max-dim", type=int, default=SCREENSHOT_MAX_DIM, help="截图长边上限（0 不限制）")
+    parser.add_argument("--store", choices=("files", "tar"), default=SCREENSHOT_STORE,
+                        help="截图存储方式（files: 单独 JPEG 文件，tar: 每个视频一个归档 + 索引）")
+    parser.add_argument("--save-path", default=os.path.join(os.getcwd(), "变化截图"), help="截图保存目录")
+    parser.add_argument("--log-dir", default=os.path.join(os.getcwd(), "检测日志"), help="日志目录")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT, help="本机指标接口端口（0 不开启）")
+    parser.add_argument("--metrics-textfile", default=None,
+                        help="定期写入指标文件（供 node_exporter textfile 收集器读取，建议以 .prom 结尾）")
+    parser.add_argument("--memory-budget", type=float, default=MEMORY_BUDGET_MB,
+                        help="每个处理进程的内存上限（MB），超出后释放缓存 / 重建工作进程；0 只记录不干预")
+    parser.add_argument("--event-db", action=argparse.BooleanOptionalAction, default=EVENT_DB_ENABLED,
+                        help=f"截图事件写入事件索引（截图目录下的 {EVENT_DB_NAME}）")
+    parser.add_argument("--cpu-budget", type=float, default=CPU_BUDGET_PERCENT,
+                        help="检测占全机 CPU 的上限（%%），按并发数、OpenCV 线程数与帧节奏限制；0 不限制")
+    parser.add_argument("--nice", type=int, default=PROCESS_NICE, help="调低 CPU 调度优先级（nice 增量）")
+    parser.add_argument("--ionice-idle", action=argparse.BooleanOptionalAction, default=PROCESS_IO_IDLE,
+                        help="IO 调度设为空闲级（仅 Linux）")
+    parser.add_argument("--schedule", action="append", default=None,
+                        help="允许运行的时段 HH:MM-HH:MM（可多次指定，可跨越午夜），时段外暂停")
+
+
+def start_metrics(args: argparse.Namespace):
+    """按参数开启指标接口 / 指标文件，返回需要在退出时停止的文件写入线程"""
+    from core import metrics
+    if getattr(args, "metrics_port", 0):
+        metrics.start_http_server(args.metrics_port)
+    textfile = getattr(args, "metrics_textfile", None)
+    if not textfile or args.func is cmd_watch:
+        return None  # 监视模式由各工作进程分别写指标文件
+    writer = metrics.TextfileWriter(textfile)
+    writer.start()
+    return writer
+
+
+def build_governor(args: argparse.Namespace):
+    """本进程的资源限制（CPU 节奏 + 运行时段），并按预算设置 OpenCV 线程数"""
+    from core.governor import ResourceGovernor
+    governor = ResourceGovernor(args.cpu_budget, args.schedule or RUN_SCHEDULE)
+    threads = governor.configure_threads()
+    if threads:
+        logging.info(f"CPU 预算 {args.cpu_budget:.0f}%，OpenCV 线程数 {threads}")
+    return governor
+
+
+def event_db_path(args: argparse.Namespace) -> Optional[str]:
+    return os.path.join(args.save_path, EVENT_DB_NAME) if args.event_db else None
+
+
+def build_event_index(args: argparse.Namespace):
+    from core.eventdb import EventIndex
+    path = event_db_path(args)
+    return EventIndex(path) if path else None
+
+
+def build_params(args: argparse.Namespace):
+    from core.pipeline import DetectionParams
+    from core.video_processor import DetectionPipeline
+    from core.zones import load_zones
+    pipeline = DetectionPipeline(fusion=args.fusion, morphology=args.morph, kernel_size=args.kernel_size,
+                                 min_area=args.min_area, max_area=args.max_area)
+    logging.info(f"检测流程: {pipeline.describe()}")
+    return DetectionParams(
+        gmm_var=args.gmm_var,
+        fd_var=args.fd_var,
+        min_interval=args.interval,
+        change_threshold=args.threshold / 100 if args.threshold is not None else None,
+        speed=max(1, args.speed),
+        roi_zones=load_zones(args.zones) if args.zones else [],
+        dedup=args.dedup,
+        throttle_clock=args.throttle_clock,
+        motion_prefilter=args.mv_prefilter,
+        capture_mode=args.capture_mode,
+        activity=args.activity,
+        pipeline=pipeline
+    )
+
+
+def cmd_run(args: argparse.Namespace) -> int:
+    import time
+    from core.memory import MemoryMonitor
+    from core.probe import ProbeIndex, ProbePrefetch, format_eta
+    from core.runner import process_video
+    from core.store import ScreenshotSink
+    from core.video_processor import BackgroundModelPool
+    params = build_params(args)
+    pool = BackgroundModelPool()
+    memory = MemoryMonitor(budget_mb=args.memory_budget)
+    memory.track_pool(pool)
+    governor = build_governor(args)
+    event_index = build_event_index(args)
+    # 后台逐包计数：每个视频开始前只等待它自己的探测结果，其余文件在处理期间探测
+    probes = ProbePrefetch(args.videos, ProbeIndex(os.path.join(args.save_path, PROBE_INDEX_NAME)))
+    done_frames = 0
+    start = time.time()
+    failed = 0
+    try:
+        for i, path in enumerate(args.videos):
+            info = probes.get(i)
+            summary = process_video(path, params, args.save_path, screenshot_mode=args.mode,
+                                    max_dim=args.max_dim, pool=pool, memory=memory,
+                                    sink=ScreenshotSink(args.save_path, args.store),
+                                    frame_count=info.frame_count or None, governor=governor,
+                                    event_index=event_index)
+            failed += summary["error"] is not None
+            done_frames += info.frame_count
+            total_frames = probes.estimated_total()
+            if 0 < done_frames < total_frames:
+                remaining = (time.time() - start) / done_frames * (total_frames - done_frames)
+                logging.info(f"总进度 {done_frames}/{total_frames} 帧，预计剩余 {format_eta(remaining)}")
+    finally:
+        probes.close()
+    logging.info(f"所有 {len(args.videos)} 个视频处理完成，失败 {failed} 个")
+    return 1 if failed else 0
+
+
+def cmd_watch(args: argparse.Namespace) -> int:
+    from core.watcher import WatchDaemon
+    stop = _install_stop_handlers()
+
+    daemon = WatchDaemon(
+        args.dirs, build_params(args), args.save_path,
+        ledger_path=args.ledger or os.path.join(args.save_path, WATCH_LEDGER_NAME),
+        max_workers=args.workers,
+        screenshot_mode=args.mode,
+        max_dim=args.max_dim,
+        store=args.store,
+        stable_seconds=args.stable_seconds,
+        poll_interval=args.poll_interval,
+        metrics_textfile=args.metrics_textfile,
+        memory_budget=args.memory_budget,
+        max_tasks_per_worker=args.max_tasks_per_worker,
+        cpu_budget=args.cpu_budget,
+        schedule=args.schedule or RUN_SCHEDULE,
+        event_db=event_db_path(args),
+        log_setup=functools.partial(setup_logging, args.log_dir)
+    )
+    daemon.run(stop)
+    return 0
+
+
+def _install_stop_handlers() -> threading.Event:
+    stop = threading.Event()
+
+    def _on_signal(signum, frame):
+        logging.info("收到停止信号")
+        stop.set()
+    signal.signal(signal.SIGINT, _on_signal)
+    signal.signal(signal.SIGTERM, _on_signal)
+    return stop
+
+
+def cmd_queue(args: argparse.Namespace) -> int:
+    from core.jobqueue import JobQueue
+    queue = JobQueue(args.db)
+    if args.action == "enqueue":
+        added = queue.enqueue(args.videos, segment_frames=args.segment_frames)
+        logging.info(f"新增任务 {added} 个")
+    counts = queue.status()
+    logging.info("任务状态: " + "，".join(f"{k} {v}" for k, v in counts.items()))
+    if args.action == "status":
+        for path, start, end, attempts, error in queue.failures():
+            logging.info(f"失败: {path} 帧 [{start}, {end}) 尝试 {attempts} 次: {error}")
+    return 0
+
+
+def cmd_worker(args: argparse.Namespace) -> int:
+    from core.jobqueue import JobQueue, JobWorker
+    stop = _install_stop_handlers()
+    worker = JobWorker(
+        JobQueue(args.db), build_params(args), args.save_path,
+        worker_id=args.worker_id,
+        screenshot_mode=args.mode,
+        max_dim=args.max_dim,
+        store=args.store,
+        poll_interval=args.poll_interval,
+        memory_budget=args.memory_budget,
+        governor=build_governor(args),
+        event_index=build_event_index(args)
+    )
+    worker.run(stop, exit_when_empty=args.exit_when_empty)
+    # 因超出内存预算退出时返回非零，便于 systemd 等进程管理器重启
+    return 3 if worker.over_budget else 0
+
+
+def cmd_serve(args: argparse.Namespace) -> int:
+    from core.service import JobService, make_server
+    service = JobService(
+        args.save_path, defaults=build_params(args),
+        max_workers=args.workers,
+        queue_size=args.queue_size,
+        screenshot_mode=args.mode,
+        max_dim=args.max_dim,
+        store=args.store,
+        allowed_dirs=args.allow_dir or [],
+        memory_budget=args.memory_budget,
+        governor=build_governor(args),
+        event_index=build_event_index(args)
+    )
+    server = make_server(service, args.host, args.port)
+
+    def _on_signal(signum, frame):
+        logging.info("收到停止信号")
+        # shutdown() 会等待 serve_forever 返回，不能在主线程的信号处理中直接调用
+        threading.Thread(target=server.shutdown, daemon=True).start()
+    signal.signal(signal.SIGINT, _on_signal)
+    signal.signal(signal.SIGTERM, _on_signal)
+
+    logging.info(f"HTTP 任务服务已启动: http://{args.host}:{server.server_address[1]}（并发 {args.workers}，"
+                 f"排队上限 {args.queue_size}）")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        service.shutdown()
+    return 0
+
+
+def cmd_store(args: argparse.Namespace) -> int:
+    from core import store
+    if args.action == "list":
+        entries = store.read_index(args.archive)
+        for e in entries:
+            timestamp = f"{e['timestamp']:.3f}s" if e["timestamp"] is not None else "-"
+            ratio = f"{e['ratio'] * 100:.2f}%" if e["ratio"] is not None else "-"
+            zones = ",".join(e["zones"]) or "-"
+            print(f"{e['frame']}\t{timestamp}\t{ratio}\t{zones}\t{e['size']}\t{e['name']}")
+        logging.info(f"{args.archive}: 共 {len(entries)} 张截图")
+    else:
+        count = store.extract(args.archive, args.output, frames=args.frames)
+        logging.info(f"已导出 {count} 张截图到 {args.output}")
+    return 0
+
+
+def cmd_verify(args: argparse.Namespace) -> int:
+    import tempfile
+    from core import equivalence
+    workdir = args.save_path or tempfile.mkdtemp(prefix="equivalence_")
+    videos = list(args.videos)
+    synthetic = args.synthetic if args.synthetic is not None else (0 if videos else 2)
+    if synthetic:
+        videos += equivalence.make_synthetic_set(os.path.join(workdir, "synthetic"), count=synthetic)
+    reports = equivalence.run_harness(videos, modes=args.modes, params=build_params(args),
+                                      tolerance=args.tolerance, workdir=workdir)
+    for line in equivalence.format_report(reports):
+        logging.info(line)
+    diverged = [r for r in reports if not r.ok]
+    logging.info(f"一致性校验完成: {len(reports) - len(diverged)}/{len(reports)} 项一致，截图位于 {workdir}")
+    return 1 if diverged else 0
+
+
+def cmd_probe(args: argparse.Namespace) -> int:
+    from core.probe import ProbeIndex, probe_all
+    index = ProbeIndex(args.index) if args.index else None
+    infos = probe_all(args.videos, index, workers=args.workers)
+    for info in infos:
+        if info.error:
+            print(f"{info.path}\t错误: {info.error}")
+            continue
+        mismatch = f"（头部声明 {info.header_frames}）" if info.header_mismatch else ""
+        print(f"{info.path}\t{info.duration:.2f}s\t{info.fps:.2f}fps\t{info.frame_count} 帧{mismatch}\t"
+              f"{info.width}x{info.height}\t{info.codec or '-'}\tGOP {info.gop or '-'}")
+    return 1 if any(info.error for info in infos) else 0
+
+
+def cmd_events(args: argparse.Namespace) -> int:
+    import json
+    import time
+    from datetime import datetime
+    from core.eventdb import EventIndex
+    if not os.path.exists(args.db):
+        logging.error(f"事件索引不存在: {args.db}")
+        return 1
+    index = EventIndex(args.db)
+    if args.cameras:
+        for camera, count in index.cameras():
+            print(f"{camera}\t{count}")
+        return 0
+
+    def _moment(text: Optional[str]) -> Optional[float]:
+        return datetime.fromisoformat(text).timestamp() if text else None
+    time_of_day = tuple(args.time.split("-", 1)) if args.time else None
+    start = time.perf_counter()
+    rows = index.query(camera=args.camera, since=_moment(args.since), until=_moment(args.until),
+                       time_of_day=time_of_day,
+                       min_ratio=args.min_ratio / 100 if args.min_ratio is not None else None,
+                       zone=args.zone, path=args.path, limit=args.limit)
+    elapsed = (time.perf_counter() - start) * 1000
+    for row in rows:
+        if args.json:
+            print(json.dumps(row, ensure_ascii=False))
+            continue
+        moment = datetime.fromtimestamp(row["wall_time"]).strftime("%Y-%m-%d %H:%M:%S") if row["wall_time"] else "-"
+        zones = ",".join(row["zones"]) or "-"
+        print(f"{moment}\t{row['camera']}\t{os.path.basename(row['path'])}\t帧 {row['frame']}\t"
+              f"{row['ratio'] * 100:.2f}%\t{row['components']} 个连通域\t{zones}\t{row['screenshot'] or '-'}")
+    logging.info(f"共 {len(rows)} 条事件，查询耗时 {elapsed:.1f} 毫秒")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="视频画面变化检测（命令行模式）")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="依次处理指定视频")
+    run.add_argument("videos", nargs="+", help="视频文件")
+    _add_detection_args(run)
+    run.set_defaults(func=cmd_run)
+
+    watch = sub.add_parser("watch", help="监视目录，自动处理新写完的录像")
+    watch.add_argument("dirs", nargs="+", help="监视目录")
+    watch.add_argument("--workers", type=int, default=WATCH_MAX_WORKERS, help="同时处理的视频数")
+    watch.add_argument("--stable-seconds", type=float, default=WATCH_STABLE_SECONDS,
+                       help="文件大小保持不变多久视为写完（秒）")
+    watch.add_argument("--poll-interval", type=float, default=WATCH_POLL_INTERVAL, help="轮询间隔（秒）")
+    watch.add_argument("--ledger", default=None, help="已处理记录文件（默认位于截图目录）")
+    watch.add_argument("--max-tasks-per-worker", type=int, default=MEMORY_WORKER_MAX_TASKS,
+                       help="每个工作进程处理多少个视频后重建（0 表示仅在超出内存预算时重建）")
+    _add_detection_args(watch)
+    watch.set_defaults(func=cmd_watch)
+
+    queue = sub.add_parser("queue", help="管理共享存储上的多节点任务队列")
+    queue_sub = queue.add_subparsers(dest="action", required=True)
+    enqueue = queue_sub.add_parser("enqueue", help="加入视频任务")
+    enqueue.add_argument("db", help="任务数据库（位于各节点共同挂载的目录）")
+    enqueue.add_argument("videos", nargs="+", help="视频文件（各节点需能以相同路径访问）")
+    enqueue.add_argument("--segment-frames", type=int, default=JOB_SEGMENT_FRAMES,
+                         help="按帧数切分为多个任务（0 不切分）")
+    status = queue_sub.add_parser("status", help="查看任务状态")
+    status.add_argument("db", help="任务数据库")
+    for p in (enqueue, status):
+        p.add_argument("--log-dir", default=os.path.join(os.getcwd(), "检测日志"), help="日志目录")
+        p.set_defaults(func=cmd_queue, save_path=None)
+
+    worker = sub.add_parser("worker", help="作为工作节点从任务队列领取并处理视频")
+    worker.add_argument("db", help="任务数据库")
+    worker.add_argument("--worker-id", default=None, help="节点标识（默认 主机名:进程号）")
+    worker.add_argument("--poll-interval", type=float, default=JOB_POLL_INTERVAL, help="队列为空时的等待间隔（秒）")
+    worker.add_argument("--exit-when-empty", action="store_true", help="队列中没有可领取的任务时退出")
+    _add_detection_args(worker)
+    worker.set_defaults(func=cmd_worker)
+
+    serve = sub.add_parser("serve", help="启动本机 HTTP 任务服务（提交视频、查询进度、事件流）")
+    serve.add_argument("--host", default=SERVICE_HOST, help="监听地址")
+    serve.add_argument("--port", type=int, default=SERVICE_PORT, help="监听端口")
+    serve.add_argument("--workers", type=int, default=SERVICE_MAX_WORKERS, help="同时处理的视频数")
+    serve.add_argument("--queue-size", type=int, default=SERVICE_QUEUE_SIZE, help="排队上限（超过返回 503）")
+    serve.add_argument("--allow-dir", action="append", default=None, help="只允许提交该目录下的视频（可多次指定）")
+    _add_detection_args(serve)
+    serve.set_defaults(func=cmd_serve)
+
+    store = sub.add_parser("store", help="查看 / 导出 tar 截图归档")
+    store_sub = store.add_subparsers(dest="action", required=True)
+    listing = store_sub.add_parser("list", help="列出归档中的截图（帧号、视频内时间、变化比例、区域、大小）")
+    listing.add_argument("archive", help="截图归档（.tar）")
+    extract = store_sub.add_parser("extract", help="把归档中的截图导出为单独的 JPEG 文件")
+    extract.add_argument("archive", help="截图归档（.tar）")
+    extract.add_argument("-o", "--output", default=os.getcwd(), help="导出目录")
+    extract.add_argument("--frames", type=int, nargs="+", default=None, help="只导出指定帧号")
+    for p in (listing, extract):
+        p.add_argument("--log-dir", default=os.path.join(os.getcwd(), "检测日志"), help="日志目录")
+        p.set_defaults(func=cmd_store, save_path=None)
+
+    verify = sub.add_parser("verify", help="一致性校验：各执行方式（并行 / 分段 / 复用背景模型等）与串行处理的事件对比")
+    verify.add_argument("videos", nargs="*", help="样例视频")
+    verify.add_argument("--modes", nargs="+", default=None, help="参与校验的执行方式（默认全部）")
+    verify.add_argument("--tolerance", type=int, default=EQUIVALENCE_FRAME_TOLERANCE, help="事件帧号容差（1 倍速，倍速时乘以 --speed）")
+    verify.add_argument("--synthetic", type=int, default=None, help="额外生成的合成视频数（未指定视频时默认 2）")
+    _add_detection_args(verify)
+    # 截图默认写入临时目录；指定 --save-path 时保留各方式的截图便于查看
+    verify.set_defaults(func=cmd_verify, save_path=None)
+
+    probe = sub.add_parser("probe", help="并行探测视频元数据（时长、帧率、实际帧数、分辨率、编码、GOP）")
+    probe.add_argument("videos", nargs="+", help="视频文件")
+    probe.add_argument("--index", default=None, help="元数据索引文件（已探测且未变化的文件直接取缓存）")
+    probe.add_argument("--workers", type=int, default=PROBE_WORKERS, help="并行探测线程数")
+    probe.add_argument("--log-dir", default=os.path.join(os.getcwd(), "检测日志"), help="日志目录")
+    probe.set_defaults(func=cmd_probe, save_path=None)
+
+    events = sub.add_parser("events", help="查询事件索引（按机位、日期、时段、变化比例、区域）")
+    events.add_argument("db", help="事件索引文件（截图目录下的 " + EVENT_DB_NAME + "）")
+    events.add_argument("--camera", default=None, help="机位（CAMERA_GROUPS 分组名，未配置时为视频所在目录名）")
+    events.add_argument("--since", default=None, help="录像时刻下限，如 2026-10-19 或 2026-10-19T02:00")
+    events.add_argument("--until", default=None, help="录像时刻上限（不含）")
+    events.add_argument("--time", default=None, help="每天的时段 HH:MM-HH:MM（可跨越午夜）")
+    events.add_argument("--min-ratio", type=float, default=None, help="变化比例下限（%%）")
+    events.add_argument("--zone", default=None, help="触发区域名")
+    events.add_argument("--path", default=None, help="视频路径（支持通配符 * 与 ?，如 \"*cam1_*\"）")
+    events.add_argument("--limit", type=int, default=1000, help="最多返回条数")
+    events.add_argument("--json", action="store_true", help="按 JSON Lines 输出")
+    events.add_argument("--cameras", action="store_true", help="只列出各机位事件数")
+    events.add_argument("--log-dir", default=os.path.join(os.getcwd(), "检测日志"), help="日志目录")
+    events.set_defaults(func=cmd_events, save_path=None)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    setup_logging(args.log_dir)
+    if args.save_path:
+        os.makedirs(args.save_path, exist_ok=True)
+    if getattr(args, "nice", 0) or getattr(args, "ionice_idle", False):
+        from core.governor import lower_priority
+        lower_priority(args.nice, args.ionice_idle)
+    writer = start_metrics(args)
+    try:
+        return args.func(args)
+    finally:
+        if writer is not None:
+            writer.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,5 @@
 # config.py
-from typing import List
+from typing import Dict, List
 
 # ========== 检测参数 ==========
 MIN_AREA = 150
@@ -10,6 +10,131 @@ DEFAULT_MIN_INTERVAL = 1.0      # 1秒
 TARGET_HEIGHT = 480
 PREVIEW_UPDATE_INTERVAL = 0.3   # 秒
 GMM_PREHEAT_FRAMES = 10
+GMM_HISTORY = 100               # 背景模型历史长度（按原始帧计，跳帧时学习率自动换算）
+SEGMENT_WARMUP_FRAMES = 2 * GMM_HISTORY  # 分段处理时在段首之前重放的帧数（检测但不输出），不应小于 GMM_HISTORY
+CHANGE_TILE_SIZE = 32           # 稀疏后处理的活动块边长（处理分辨率像素），0 表示始终整帧形态学 + 连通域
+CHANGE_TILE_MAX_ACTIVE = 0.35   # 活动块占比超过该值时改为整帧处理（稀疏处理不再划算）
+TRIGGER_CLOCK = "video"         # 截图间隔计时：video 按视频内时间（与处理速度无关）/ wall 按处理时的系统时间（旧行为）
+FUSION_MODE = "and"             # 前景融合：and（GMM 与帧差同时变化，噪点少）/ or（任一变化，更灵敏）/ gmm（仅背景模型）/ diff（仅帧差，最省）
+MORPH_ENABLED = True            # 开闭运算去噪；画面干净的机位可关闭以节省耗时
+MORPH_KERNEL_SIZE = 5           # 形态学椭圆核边长（奇数）
+COMPONENT_MAX_AREA = 0          # 连通域面积上限（处理分辨率像素），超过的视为整体变化不计入；0 表示不限制
+
+# ========== 全局变化抑制（开关灯 / 红外切换 / 镜头抖动）==========
+GLOBAL_REJECT_ENABLED = True
+GLOBAL_BRIGHTNESS_DELTA = 20.0  # 大面积变化时 ROI 平均亮度突变（灰度级）判为开关灯
+GLOBAL_CHANGE_FRACTION = 0.5    # 帧差像素占比超过该值视为全局变化
+GLOBAL_SHIFT_PIXELS = 2.0       # 全局平移量（处理分辨率像素）超过该值视为镜头抖动
+# 大面积变化但未检测到亮度突变或镜头平移时的处理：uniform 仅在变化遍布画面（各网格都有大量变化）时忽略，
+# keep 照常检测（近景目标、小 ROI、大倍速下的大面积帧差不会被丢弃），reject 一律忽略并重建背景
+GLOBAL_FALLBACK = "uniform"
+GLOBAL_UNIFORM_GRID = 4         # 均匀性判断的网格边长（4 → 4×4 格）
+GLOBAL_UNIFORM_CELLS = 0.9      # 变化占比不低于 GLOBAL_CHANGE_FRACTION / 2 的网格比例达到该值视为遍布画面
+
+# ========== 截图输出 ==========
+SCREENSHOT_MODE = "full"        # full: 完整画面 / crop: 变化区域裁剪 / sheet: 拼图（全景 + 各变化区域）
+SCREENSHOT_CROP_PADDING = 16    # 裁剪边距（原始分辨率像素）
+SCREENSHOT_MAX_DIM = 0          # 截图长边上限，0 表示不限制
+SCREENSHOT_JPEG_QUALITY = 95
+SCREENSHOT_SHEET_TILE_HEIGHT = 240
+SCREENSHOT_SHEET_COLS = 3
+SCREENSHOT_STORE = "files"      # files: 每张截图一个 JPEG / tar: 每个视频一个归档 + 索引（适合 NAS）
+
+# ========== 截图去重（感知哈希）==========
+DEDUP_ENABLED = False           # 默认关闭，可在界面“处理选项”中开启
+DEDUP_HASH_SIZE = 16            # dHash 边长（16 → 256 位，对画面中的小目标更敏感）
+DEDUP_MAX_DISTANCE = 8          # 汉明距离 ≤ 该值视为重复
+DEDUP_LRU_SIZE = 32             # 每个视频保留的最近截图哈希数
+DEDUP_USE_REGION = True         # True: 仅对变化区域外接矩形计算哈希（整帧 dHash 对小目标不敏感）
+DEDUP_MIN_IOU = 0.5             # 按区域计算时，变化区域交并比不低于该值才可能判为重复
+
+# ========== 背景模型复用 ==========
+BACKGROUND_REUSE = True         # 同机位连续视频复用已预热的背景模型（跳过预热）
+BACKGROUND_POOL_SIZE = 4        # 最多缓存的机位分组数
+# 文件名通配符 → 机位分组名；未匹配的视频按 分辨率 + ROI 自动分组
+CAMERA_GROUPS: Dict[str, str] = {}
+# 文件名通配符 → 该机位的检测阶段覆盖项（fusion / morphology / kernel_size / min_area / max_area），
+# 如 {"gate_*": {"fusion": "gmm", "morphology": False}}；未匹配的视频使用全局设置
+CAMERA_PIPELINES: Dict[str, Dict[str, object]] = {}
+
+# ========== 监视目录（守护进程）==========
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".flv")
+WATCH_POLL_INTERVAL = 5.0       # 秒
+WATCH_STABLE_SECONDS = 30.0     # 大小与修改时间保持不变多久视为写完
+WATCH_MAX_WORKERS = 2           # 同时处理的视频数
+WATCH_LEDGER_NAME = "已处理记录.jsonl"
+WATCH_MAX_ATTEMPTS = 3          # 处理失败的文件最多尝试次数（含首次），用尽后不再重试
+
+# ========== 多节点任务队列（共享存储）==========
+JOB_LEASE_SECONDS = 120.0       # 租约时长：超时未续约的任务视为节点失联，重新排队
+JOB_HEARTBEAT_INTERVAL = 30.0   # 续约间隔（应明显小于租约时长）
+JOB_MAX_ATTEMPTS = 3            # 单个任务最多尝试次数，超过后标记为失败
+JOB_POLL_INTERVAL = 5.0         # 队列为空时的等待间隔（秒）
+JOB_SEGMENT_FRAMES = 0          # 按帧数切分长视频为多个任务，0 表示整段视频为一个任务（默认；分段见 SEGMENT_WARMUP_FRAMES）
+
+# ========== HTTP 任务服务 ==========
+SERVICE_HOST = "127.0.0.1"      # 默认仅本机访问；对外提供服务时改为 0.0.0.0
+SERVICE_PORT = 8765
+SERVICE_MAX_WORKERS = 2         # 同时处理的视频数
+SERVICE_QUEUE_SIZE = 16         # 排队上限，超过后新提交返回 503
+SERVICE_JOB_HISTORY = 200       # 保留的已结束任务数（超出后最早的任务被清除）
+SERVICE_JOB_HISTORY_RELIEF = 20 # 超出内存预算时已结束任务缩减到的个数（最早的先清除）
+SERVICE_ALLOWED_DIRS: List[str] = []  # 允许提交的视频目录，为空表示不限制
+
+# ========== 运行指标（Prometheus 文本格式）==========
+METRICS_PORT = 0                        # 本机 /metrics 接口端口，0 表示不开启
+METRICS_TEXTFILE_INTERVAL = 15.0        # 指标文件写入间隔（秒）
+METRICS_DECODE_STALL_SECONDS = 1.0      # 单帧解码超过该耗时计为一次卡顿
+
+# ========== 内存预算 ==========
+MEMORY_BUDGET_MB = 0            # 进程常驻内存（RSS）上限，超过后依次释放缓存；0 表示只记录不干预
+MEMORY_LOG_PER_VIDEO = True     # 每个视频处理完后记录 RSS 与增量
+MEMORY_WORKER_MAX_TASKS = 0     # 监视目录：每个工作进程处理多少个视频后重建（0 表示仅在超出预算时重建）
+
+# ========== 一致性校验 ==========
+EQUIVALENCE_FRAME_TOLERANCE = 2 # 两种执行方式的事件帧号相差不超过该值视为同一事件
+EQUIVALENCE_SEGMENTS = 3        # segmented 方式把每个视频切成的段数
+EQUIVALENCE_WORKERS = 2         # threaded / process 方式的并发数
+
+# ========== 视频元数据探测 ==========
+PROBE_WORKERS = 4               # 并行探测的线程数
+PROBE_INDEX_NAME = "视频索引.jsonl"  # 元数据索引文件名（位于截图目录，按 路径 + 大小 + 修改时间 缓存）
+
+# ========== 运动矢量预筛选（需要 PyAV）==========
+MV_PREFILTER_ENABLED = False    # 按编码运动矢量跳过静止帧的检测（未安装 PyAV 时自动回退）
+MV_MIN_MAGNITUDE = 1.0          # 运动矢量长度（像素）低于该值视为编码噪声
+MV_MIN_AREA = 64                # ROI 内运动宏块面积（处理分辨率像素）低于该值视为静止帧，应小于 MIN_AREA
+MV_REFRESH_FRAMES = 25          # 连续静止时每隔多少帧仍更新一次背景模型
+
+# ========== 目标跟踪 ==========
+CAPTURE_MODE = "frame"          # frame: 逐帧触发（按截图间隔节流）/ track: 按目标跟踪，每个目标一张面积最大时的截图
+TRACK_IOU_THRESHOLD = 0.2       # 连通域外接矩形与轨迹上一位置的 IoU 不低于该值时优先匹配
+TRACK_MAX_DISTANCE = 80         # IoU 未匹配时按质心距离匹配的上限（处理分辨率像素）
+TRACK_MAX_GAP_SECONDS = 1.0     # 轨迹超过该视频内时间未匹配到即视为目标离开
+TRACK_MIN_HITS = 2              # 出现帧数少于该值的轨迹视为噪声，不输出
+TRACK_RECORD_SUFFIX = "_目标.jsonl"  # 轨迹记录文件名后缀（位于截图目录，每个视频一个）
+
+# ========== 资源限制（与录像等生产进程共用主机）==========
+CPU_BUDGET_PERCENT = 0          # 检测占全机 CPU 的上限（%），0 表示不限制；按并发数、OpenCV 线程数与帧节奏共同落实
+PROCESS_NICE = 0                # 启动时调低的 CPU 调度优先级（nice 增量），0 表示不调整
+PROCESS_IO_IDLE = False         # 把 IO 调度设为空闲级（ionice -c 3，仅 Linux）
+RUN_SCHEDULE: List[str] = []    # 允许运行的时段，如 ["22:00-06:00"]（可跨越午夜）；为空表示全天
+GOVERNOR_PACE_WINDOW = 2.0      # CPU 节奏控制的统计窗口（秒）
+GOVERNOR_REPORT_INTERVAL = 60.0 # 实际 / 预算 CPU 占用写入日志的间隔（秒）
+
+# ========== 事件索引（SQLite）==========
+EVENT_DB_ENABLED = False        # 截图事件同时写入事件索引，可按机位 / 时段 / 变化比例查询（默认关闭，--event-db 开启）
+EVENT_DB_NAME = "事件索引.db"   # 事件索引文件名（位于截图目录）
+EVENT_DB_BATCH_SIZE = 200       # 每批（一个事务）写入的事件数
+EVENT_DB_FLUSH_SECONDS = 5.0    # 未满一批时最长多久写入一次（秒）
+
+# ========== 活动热力图与时间线 ==========
+ACTIVITY_ENABLED = False        # 检测时累计每个视频的活动热力图与分钟活动时间线，视频结束后写入截图目录（每个视频 3 个文件，默认关闭）
+ACTIVITY_BIN_SECONDS = 60       # 时间线分桶长度（视频内时间，秒）
+ACTIVITY_HEATMAP_ALPHA = 0.6    # 热力图叠加在首帧上的最大不透明度（活动越多越不透明）
+ACTIVITY_HEATMAP_SUFFIX = "_热力图.png"
+ACTIVITY_TIMELINE_SUFFIX = "_活动.csv"
+ACTIVITY_COUNTS_SUFFIX = "_活动.npz"   # 原始像素计数与时间线（numpy），便于跨视频汇总
 
 # ========== UI 参数 ==========
 SPEED_LEVELS: List[int] = [1, 2, 4, 8, 16, 24, 32, 64]
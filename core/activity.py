@@ -0,0 +1,132 @@
+# core/activity.py
+"""活动热力图与分钟活动时间线：检测过程中顺带累计，不额外解码
+
+热力图为处理分辨率下每个像素被判为前景的帧数（预先分配的 uint32 数组，逐帧原地累加，无新分配）；
+时间线按 ACTIVITY_BIN_SECONDS（默认 1 分钟）分桶统计检测帧数、有效变化帧数、平均 / 最大变化比例与截图数。
+视频结束后写出三个文件（位于截图目录）：
+    {视频名}_热力图.png   叠加在首帧上的热力图（计数按对数压缩，避免少数常动像素掩盖其他区域）
+    {视频名}_活动.csv     分钟时间线（可直接用表格软件打开）
+    {视频名}_活动.npz     原始计数与时间线（numpy，便于跨视频汇总）
+"""
+import csv
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from config import (
+    ACTIVITY_BIN_SECONDS,
+    ACTIVITY_HEATMAP_ALPHA,
+    ACTIVITY_HEATMAP_SUFFIX,
+    ACTIVITY_TIMELINE_SUFFIX,
+    ACTIVITY_COUNTS_SUFFIX
+)
+from core.screenshot import safe_basename
+
+# 时间线各列：检测帧数、有效变化帧数、变化比例之和、最大变化比例、截图数
+_FRAMES, _ACTIVE, _RATIO_SUM, _RATIO_MAX, _EVENTS = range(5)
+TIMELINE_COLUMNS = ("frames", "active", "ratio_sum", "ratio_max", "events")
+
+
+class ActivityMap:
+    """单个视频（或其中一段）的活动累计"""
+
+    def __init__(self, shape: Tuple[int, int], background: Optional[np.ndarray] = None,
+                 bin_seconds: float = ACTIVITY_BIN_SECONDS, duration: float = 0.0):
+        self.counts = np.zeros(shape, dtype=np.uint32)
+        self.frames = 0
+        self.bin_seconds = max(1.0, bin_seconds)
+        self.background = background
+        self._hit = np.empty(shape, dtype=bool)
+        self._timeline = np.zeros((int(duration // self.bin_seconds) + 1, len(TIMELINE_COLUMNS)))
+        self._first_bin: Optional[int] = None
+        self._last_bin = 0
+
+    def update(self, fg_mask: np.ndarray, timestamp: float, ratio: float, valid_change: bool, events: int = 0):
+        """逐帧调用：前景像素计数 +1，并计入所在时间桶"""
+        if ratio > 0 and fg_mask.shape == self.counts.shape:
+            # 比例为 0 即前景为空，跳过整帧累加
+            np.not_equal(fg_mask, 0, out=self._hit)
+            np.add(self.counts, self._hit, out=self.counts)
+        self.frames += 1
+        index = self._bin(timestamp)  # 可能扩展时间线，须先于取行
+        row = self._timeline[index]
+        row[_FRAMES] += 1
+        if valid_change:
+            row[_ACTIVE] += 1
+        row[_RATIO_SUM] += ratio
+        if ratio > row[_RATIO_MAX]:
+            row[_RATIO_MAX] = ratio
+        if events:
+            row[_EVENTS] += events
+
+    def add_static(self, timestamp: float):
+        """运动矢量预筛选判为静止、未做检测的帧：按无变化计入时间线"""
+        index = self._bin(timestamp)
+        self._timeline[index, _FRAMES] += 1
+
+    def _bin(self, timestamp: float) -> int:
+        index = int(timestamp // self.bin_seconds)
+        if self._first_bin is None:
+            self._first_bin = index
+        if index >= len(self._timeline):
+            # 容器声明的时长偏短时按需扩展（成倍增长，摊销后不影响逐帧开销）
+            grown = np.zeros((max(index + 1, len(self._timeline) * 2), len(TIMELINE_COLUMNS)))
+            grown[:len(self._timeline)] = self._timeline
+            self._timeline = grown
+        self._last_bin = max(self._last_bin, index)
+        return index
+
+    def timeline(self) -> np.ndarray:
+        """[桶起点秒数, 检测帧数, 有效变化帧数, 平均变化比例, 最大变化比例, 截图数]，只含处理过的时间范围"""
+        if self._first_bin is None:
+            return np.zeros((0, 6))
+        rows = self._timeline[self._first_bin:self._last_bin + 1]
+        starts = np.arange(self._first_bin, self._last_bin + 1) * self.bin_seconds
+        mean = np.divide(rows[:, _RATIO_SUM], rows[:, _FRAMES], out=np.zeros(len(rows)), where=rows[:, _FRAMES] > 0)
+        return np.column_stack((starts, rows[:, _FRAMES], rows[:, _ACTIVE], mean, rows[:, _RATIO_MAX],
+                                rows[:, _EVENTS]))
+
+    def render(self) -> np.ndarray:
+        """彩色热力图（BGR）；有首帧时按活动强度叠加，无活动的区域保留原画面"""
+        peak = int(self.counts.max())
+        scaled = np.log1p(self.counts, dtype=np.float32)
+        if peak > 0:
+            scaled *= 1.0 / np.log1p(peak)
+        heat = cv2.applyColorMap((scaled * 255).astype(np.uint8), cv2.COLORMAP_JET)
+        if self.background is None:
+            return heat
+        base = cv2.cvtColor(cv2.cvtColor(self.background, cv2.COLOR_BGR2GRAY), cv2.COLOR_GRAY2BGR)
+        alpha = (scaled * ACTIVITY_HEATMAP_ALPHA)[:, :, None]
+        return (base * (1 - alpha) + heat * alpha).astype(np.uint8)
+
+    def save(self, save_path: str, video_basename: str, part: int = 0,
+             start_time: Optional[float] = None) -> List[str]:
+        """写出热力图 PNG、时间线 CSV 与原始计数 npz，返回写入的文件路径
+
+        start_time 为录像开始的绝对时间（Unix 秒），已知时时间线附带每个桶的时刻。
+        """
+        prefix = os.path.join(save_path, safe_basename(video_basename) + (f"_{part}" if part else ""))
+        paths = [prefix + ACTIVITY_HEATMAP_SUFFIX, prefix + ACTIVITY_TIMELINE_SUFFIX, prefix + ACTIVITY_COUNTS_SUFFIX]
+        ok, buf = cv2.imencode(".png", self.render())
+        if not ok:
+            raise IOError(f"PNG 编码失败: {paths[0]}")
+        buf.tofile(paths[0])  # 支持中文路径
+
+        timeline = self.timeline()
+        with open(paths[1], "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.writer(f)
+            writer.writerow(["起点(秒)", "时刻", "检测帧数", "有效变化帧数", "平均变化比例", "最大变化比例", "截图数"])
+            for start, frames, active, mean, peak, events in timeline:
+                moment = datetime.fromtimestamp(start_time + start).strftime("%Y-%m-%d %H:%M:%S") \
+                    if start_time is not None else ""
+                writer.writerow([f"{start:g}", moment, int(frames), int(active), f"{mean:.6f}", f"{peak:.6f}",
+                                 int(events)])
+
+        with open(paths[2], "wb") as f:
+            np.savez_compressed(f, counts=self.counts, frames=self.frames, timeline=timeline,
+                                bin_seconds=self.bin_seconds,
+                                start_time=start_time if start_time is not None else np.nan)
+        return paths
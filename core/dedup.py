@@ -0,0 +1,81 @@
+# core/dedup.py
+import cv2
+import numpy as np
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+from config import DEDUP_HASH_SIZE, DEDUP_LRU_SIZE, DEDUP_MAX_DISTANCE, DEDUP_MIN_IOU, DEDUP_USE_REGION
+
+
+def dhash(gray: np.ndarray, hash_size: int = DEDUP_HASH_SIZE) -> int:
+    """差值哈希：缩放到 (hash_size+1)×hash_size，比较相邻像素得到 hash_size² 位指纹"""
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def union_box(boxes: Sequence[Sequence[int]]) -> Optional[List[int]]:
+    """多个 [x, y, w, h, ...] 的外接矩形"""
+    if not boxes:
+        return None
+    x0 = min(b[0] for b in boxes)
+    y0 = min(b[1] for b in boxes)
+    x1 = max(b[0] + b[2] for b in boxes)
+    y1 = max(b[1] + b[3] for b in boxes)
+    return [x0, y0, x1 - x0, y1 - y0]
+
+
+def box_iou(a: Sequence[int], b: Sequence[int]) -> float:
+    """两个 [x, y, w, h] 的交并比"""
+    iw = min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0])
+    ih = min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1])
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    inter = iw * ih
+    return inter / float(a[2] * a[3] + b[2] * b[3] - inter)
+
+
+class ScreenshotDeduper:
+    """单个视频内的近似截图抑制：最近哈希的有界 LRU + 汉明距离判断"""
+
+    def __init__(self, max_entries: int = DEDUP_LRU_SIZE, max_distance: int = DEDUP_MAX_DISTANCE,
+                 use_region: bool = DEDUP_USE_REGION, min_iou: float = DEDUP_MIN_IOU):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.use_region = use_region
+        self.min_iou = min_iou
+        # 键为 (指纹, 变化区域外接矩形)；不按区域计算时矩形为 None
+        self._recent: "OrderedDict[Tuple[int, Optional[Tuple[int, ...]]], None]" = OrderedDict()
+        self.suppressed = 0
+
+    def reset(self):
+        self._recent.clear()
+        self.suppressed = 0
+
+    def _same_place(self, a: Optional[Sequence[int]], b: Optional[Sequence[int]]) -> bool:
+        if a is None or b is None:
+            return a is b
+        return box_iou(a, b) >= self.min_iou
+
+    def is_duplicate(self, gray: np.ndarray, boxes: Optional[Sequence[Sequence[int]]] = None) -> bool:
+        """与最近的截图近似则返回 True 并计数；否则记录该哈希
+
+        按区域计算时只比较变化区域的画面，且区域位置须大致重合：同样外观的目标出现在别处不算重复。
+        """
+        region, box = gray, None
+        if self.use_region:
+            box = union_box(boxes or [])
+            if box is not None:
+                x, y, w, h = box
+                region = gray[y:y + h, x:x + w]
+                box = (x, y, w, h)
+        fingerprint = dhash(region)
+        for key in self._recent:
+            seen, seen_box = key
+            if (seen ^ fingerprint).bit_count() <= self.max_distance and self._same_place(seen_box, box):
+                self._recent.move_to_end(key)
+                self.suppressed += 1
+                return True
+        self._recent[(fingerprint, box)] = None
+        while len(self._recent) > self.max_entries:
+            self._recent.popitem(last=False)
+        return False
@@ -0,0 +1,310 @@
+# core/equivalence.py
+"""一致性校验：同一批视频分别用各执行方式处理，与串行处理的事件逐个对比
+
+并行、分段、复用背景模型等执行方式上线前，需要证明它们与串行 process_video 找到的事件一致。
+校验统一按视频内时间节流（throttle_clock="video"），否则截图间隔受处理速度影响，结果本身不可复现。
+事件按帧号在容差内、触发区域相同视为同一事件；串行有而某方式没有的记为 missing，多出的记为 extra。
+默认生成的合成视频足够长，使 segmented 方式的中间段从视频中部开始重放（SEGMENT_WARMUP_FRAMES），且段首落在运动时段内；
+段长不超过重放帧数时各段实际从视频开头重放，此时一致不能说明分段处理可靠，会记录警告。
+
+    reports = run_harness(videos, modes=["threaded", "segmented"])
+    for line in format_report(reports):
+        print(line)
+"""
+import logging
+import math
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from config import EQUIVALENCE_FRAME_TOLERANCE, EQUIVALENCE_SEGMENTS, EQUIVALENCE_WORKERS, SEGMENT_WARMUP_FRAMES
+from core import metrics, mv_prefilter
+from core.pipeline import DetectionParams
+from core.runner import process_video
+from core.video_processor import BackgroundModelPool
+
+logger = logging.getLogger(__name__)
+
+
+class Event(NamedTuple):
+    frame_id: int
+    timestamp: float
+    zones: Tuple[str, ...]
+
+
+# 执行方式：(视频列表, 参数, 截图目录) → {视频路径: 按帧号排序的事件}
+ModeRunner = Callable[[Sequence[str], DetectionParams, str], Dict[str, List[Event]]]
+MODES: Dict[str, ModeRunner] = {}
+PREFILTER_MODES = set()  # 按运动矢量跳帧的方式：一帧都没跳过时一致不说明问题，报告为不一致
+REFERENCE_MODE = "serial"
+
+
+def register_mode(name: str, runner: ModeRunner, prefilter: bool = False):
+    """注册一种执行方式（新增的并行 / 预筛选方式在此登记后自动纳入校验）"""
+    MODES[name] = runner
+    if prefilter:
+        PREFILTER_MODES.add(name)
+
+
+def _collect(video_path: str, params: DetectionParams, save_path: str,
+             pool: Optional[BackgroundModelPool] = None,
+             start_frame: int = 0, end_frame: Optional[int] = None) -> List[Event]:
+    events: List[Event] = []
+    summary = process_video(video_path, params, save_path, pool=pool,
+                            start_frame=start_frame, end_frame=end_frame,
+                            on_event=lambda e: events.append(Event(e["frame_id"], e["timestamp"], tuple(e["zones"]))))
+    if summary["error"]:
+        raise RuntimeError(f"{video_path}: {summary['error']}")
+    return events
+
+
+def _run_serial(videos, params, save_path):
+    return {path: _collect(path, params, save_path) for path in videos}
+
+
+def _run_pooled(videos, params, save_path):
+    # 与 run / watch 默认行为一致：同机位后续视频复用已预热的背景模型
+    pool = BackgroundModelPool()
+    return {path: _collect(path, params, save_path, pool=pool) for path in videos}
+
+
+def _run_threaded(videos, params, save_path):
+    with ThreadPoolExecutor(max_workers=EQUIVALENCE_WORKERS) as executor:
+        futures = {path: executor.submit(_collect, path, params, save_path) for path in videos}
+        return {path: future.result() for path, future in futures.items()}
+
+
+def _run_process(videos, params, save_path):
+    with ProcessPoolExecutor(max_workers=EQUIVALENCE_WORKERS) as executor:
+        futures = {path: executor.submit(_collect, path, params, save_path) for path in videos}
+        return {path: future.result() for path, future in futures.items()}
+
+
+def _run_segmented(videos, params, save_path):
+    # 与多节点任务队列的分段任务一致：每段各自重放段首之前的帧后再检测
+    results = {}
+    for path in videos:
+        cap = cv2.VideoCapture(path)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        bounds = [round(total * i / EQUIVALENCE_SEGMENTS) for i in range(EQUIVALENCE_SEGMENTS + 1)]
+        if bounds[1] <= SEGMENT_WARMUP_FRAMES:
+            logger.warning(f"{os.path.basename(path)} 每段 {bounds[1]} 帧，不超过重放帧数 {SEGMENT_WARMUP_FRAMES}，"
+                           f"各段实际从视频开头重放，segmented 结果不能说明分段处理可靠")
+        events: List[Event] = []
+        for start, end in zip(bounds, bounds[1:]):
+            if end > start:
+                events.extend(_collect(path, params, save_path, start_frame=start, end_frame=end))
+        results[path] = events
+    return results
+
+
+def _run_mvprefilter(videos, params, save_path):
+    return _run_serial(videos, replace(params, motion_prefilter=True), save_path)
+
+
+register_mode("serial", _run_serial)
+register_mode("pooled", _run_pooled)
+register_mode("threaded", _run_threaded)
+register_mode("process", _run_process)
+register_mode("segmented", _run_segmented)
+if mv_prefilter.available():
+    register_mode("mvprefilter", _run_mvprefilter, prefilter=True)
+
+
+# ========== 对比 ==========
+@dataclass
+class ModeReport:
+    mode: str
+    video: str
+    matched: int = 0
+    missing: List[Event] = field(default_factory=list)   # 串行处理有、该方式没有
+    extra: List[Event] = field(default_factory=list)     # 该方式多出的
+    elapsed: float = 0.0                                 # 该方式处理全部视频的耗时（秒）
+    problems: List[str] = field(default_factory=list)    # 事件之外导致结论无效的问题
+
+    @property
+    def ok(self) -> bool:
+        return not self.missing and not self.extra and not self.problems
+
+
+def compare_events(reference: Sequence[Event], candidate: Sequence[Event],
+                   tolerance: int = EQUIVALENCE_FRAME_TOLERANCE) -> Tuple[int, List[Event], List[Event]]:
+    """按帧号顺序配对，返回 (配对数, missing, extra)"""
+    reference = sorted(reference)
+    candidate = sorted(candidate)
+    i = j = matched = 0
+    missing: List[Event] = []
+    extra: List[Event] = []
+    while i < len(reference) and j < len(candidate):
+        ref, cand = reference[i], candidate[j]
+        if abs(ref.frame_id - cand.frame_id) <= tolerance and ref.zones == cand.zones:
+            matched += 1
+            i += 1
+            j += 1
+        elif ref.frame_id <= cand.frame_id:
+            missing.append(ref)
+            i += 1
+        else:
+            extra.append(cand)
+            j += 1
+    missing.extend(reference[i:])
+    extra.extend(candidate[j:])
+    return matched, missing, extra
+
+
+def run_harness(videos: Sequence[str], modes: Optional[Sequence[str]] = None,
+                params: Optional[DetectionParams] = None,
+                tolerance: int = EQUIVALENCE_FRAME_TOLERANCE,
+                workdir: Optional[str] = None) -> List[ModeReport]:
+    """先串行处理得到基准，再依次运行各执行方式（默认全部，含再次串行以检查确定性）并对比
+
+    tolerance 按 1 倍速给出，倍速处理时乘以 speed：事件帧号只能落在采样点上，相差一个步长以内属于采样相位不同。
+    """
+    modes = list(modes or MODES)
+    unknown = [m for m in modes if m not in MODES]
+    if unknown:
+        raise ValueError(f"未知执行方式: {', '.join(unknown)}（可用: {', '.join(MODES)}）")
+    params = replace(params or DetectionParams(), throttle_clock="video")
+    tolerance *= max(1, params.speed)
+    workdir = workdir or tempfile.mkdtemp(prefix="equivalence_")
+
+    prefiltered = metrics.DROPPED_FRAMES.labels("static")
+
+    def _run(mode: str) -> Tuple[Dict[str, List[Event]], float, float]:
+        save_path = os.path.join(workdir, mode)
+        os.makedirs(save_path, exist_ok=True)
+        dropped = prefiltered.value
+        start = time.perf_counter()
+        results = MODES[mode](videos, params, save_path)
+        return results, time.perf_counter() - start, prefiltered.value - dropped
+
+    logger.info(f"一致性校验: {len(videos)} 个视频，执行方式 {', '.join(modes)}，帧号容差 {tolerance}")
+    reference, _, _ = _run(REFERENCE_MODE)
+    reports = []
+    for mode in modes:
+        results, elapsed, skipped = _run(mode)
+        problems = []
+        # 预筛选方式在当前进程内串行运行，计数器差值即跳过的帧数；全是关键帧的视频（如 MJPG）一帧都不会跳
+        if mode in PREFILTER_MODES and not skipped:
+            problems.append("未按运动矢量跳过任何帧（视频需为帧间编码），一致不能说明预筛选可靠")
+        for path in videos:
+            matched, missing, extra = compare_events(reference[path], results.get(path, []), tolerance)
+            reports.append(ModeReport(mode, path, matched, missing, extra, elapsed, list(problems)))
+    return reports
+
+
+def format_report(reports: Sequence[ModeReport]) -> List[str]:
+    lines = []
+    for r in reports:
+        status = "一致" if r.ok else "不一致"
+        line = f"[{r.mode}] {os.path.basename(r.video)}: {status}，配对 {r.matched}"
+        if r.missing:
+            line += f"，缺少帧 {[e.frame_id for e in r.missing]}"
+        if r.extra:
+            line += f"，多出帧 {[e.frame_id for e in r.extra]}"
+        for problem in r.problems:
+            line += f"，{problem}"
+        lines.append(line + f"（该方式总耗时 {r.elapsed:.2f} 秒）")
+    return lines
+
+
+# ========== 合成视频 ==========
+def h264_available() -> bool:
+    """能否用 PyAV 写 H.264（帧间编码，mvprefilter 方式只有在这类视频上才会真正跳帧）"""
+    if not mv_prefilter.available():
+        return False
+    import av
+    try:
+        av.codec.Codec("libx264", "w")
+    except Exception:
+        return False
+    return True
+
+
+def make_synthetic_video(path: str, frames: int = 300, fps: float = 25.0, size: Tuple[int, int] = (320, 240),
+                         seed: int = 0, background_seed: int = 0,
+                         events: Optional[Sequence[Tuple[int, int]]] = None,
+                         codec: str = "mjpg") -> List[Tuple[int, int]]:
+    """生成带纹理静态背景 + 若干段移动方块的视频，返回各段运动的 [起, 止) 帧
+
+    codec="mjpg" 逐帧都是关键帧，可精确定位；codec="h264"（需要 PyAV + libx264）为帧间编码、无 B 帧，
+    静止段的运动矢量为零，用于校验 mvprefilter 方式。
+    background_seed 相同的视频背景相同，可模拟同一机位的连续录像；seed 决定运动时段与传感器噪声。
+    """
+    rng = np.random.default_rng(seed)
+    w, h = size
+    background = np.random.default_rng(background_seed).integers(40, 160, (h, w, 3), dtype=np.uint8)
+    background = cv2.GaussianBlur(background, (7, 7), 0)
+    if events is None:
+        # 预热段之后均匀分布 3 段运动，每段长度随机
+        slots = np.linspace(frames * 0.15, frames * 0.9, 4).astype(int)
+        events = [(int(a), int(min(b, a + rng.integers(15, 40)))) for a, b in zip(slots, slots[1:])]
+
+    def _frames():
+        for i in range(frames):
+            noise = rng.normal(0, 2.0, background.shape)
+            frame = np.clip(background + noise, 0, 255).astype(np.uint8)
+            for start, end in events:
+                if start <= i < end:
+                    x = int((i - start) / max(1, end - start - 1) * (w - 50))
+                    cv2.rectangle(frame, (x, h // 3), (x + 40, h // 3 + 40), (230, 230, 230), -1)
+            yield frame
+
+    if codec == "h264":
+        _write_h264(path, _frames(), fps, size)
+        return list(events)
+    if codec != "mjpg":
+        raise ValueError(f"不支持的合成视频编码: {codec}")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (w, h))
+    if not writer.isOpened():
+        raise IOError(f"无法创建合成视频: {path}")
+    try:
+        for frame in _frames():
+            writer.write(frame)
+    finally:
+        writer.release()
+    return list(events)
+
+
+def _write_h264(path: str, frames, fps: float, size: Tuple[int, int]):
+    import av
+    from fractions import Fraction
+    with av.open(path, "w") as container:
+        stream = container.add_stream("libx264", rate=Fraction(fps).limit_denominator(1001))
+        stream.width, stream.height = size
+        stream.pix_fmt = "yuv420p"
+        # 固定 GOP、不用 B 帧：帧号与解码顺序一致，定位可复现
+        stream.options = {"g": "50", "bf": "0"}
+        for frame in frames:
+            container.mux(stream.encode(av.VideoFrame.from_ndarray(frame, format="bgr24")))
+        container.mux(stream.encode())
+
+
+def synthetic_frames() -> int:
+    """合成视频帧数：每段比重放帧数长一半，保证中间段的重放不从视频开头开始"""
+    return max(300, math.ceil(1.5 * EQUIVALENCE_SEGMENTS * SEGMENT_WARMUP_FRAMES))
+
+
+def make_synthetic_set(directory: str, count: int = 2, frames: Optional[int] = None) -> List[str]:
+    """同一机位的若干段合成录像（文件名按时间顺序），用于覆盖背景模型复用等跨视频行为
+
+    能写 H.264 时生成帧间编码的 .mp4，否则退回 MJPG（此时 mvprefilter 方式不会跳帧，报告中会标为不一致）。
+    """
+    frames = frames or synthetic_frames()
+    codec, ext = ("h264", "mp4") if h264_available() else ("mjpg", "avi")
+    if codec == "mjpg" and mv_prefilter.available():
+        logger.warning("无法写 H.264（缺少 libx264），合成视频退回 MJPG，mvprefilter 方式无法校验")
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"synthetic_cam_{i}.{ext}")
+        make_synthetic_video(path, frames=frames, seed=i + 1, codec=codec)
+        paths.append(path)
+    return paths
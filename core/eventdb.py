@@ -0,0 +1,288 @@
+# core/eventdb.py
+"""事件索引：所有已处理视频的截图事件写入一个 SQLite 数据库，按机位 / 时段 / 变化比例等条件毫秒级查询
+
+每行事件记录 视频路径、机位、帧号、视频内时间、录像时刻、变化比例、连通域数量与外接矩形、触发区域、
+检测参数与截图位置。录像时刻取自文件名中的日期时间（如 cam1_20261019_020000.mp4），
+文件名不含时间时按 文件修改时间 - 视频时长 估算。机位取 CAMERA_GROUPS 中匹配的分组名，未匹配时为所在目录名。
+
+写入按批提交（EVENT_DB_BATCH_SIZE 条或 EVENT_DB_FLUSH_SECONDS 秒一个事务），检测循环不必逐条等待磁盘同步；
+重新处理同一视频（或同一段）时先删除该范围内的旧事件。查询命令不加载 OpenCV：
+
+    index = EventIndex("变化截图/事件索引.db")
+    rows = index.query(camera="cam1", time_of_day=("02:00", "03:00"), min_ratio=0.1)
+"""
+import fnmatch
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, is_dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from config import CAMERA_GROUPS, EVENT_DB_BATCH_SIZE, EVENT_DB_FLUSH_SECONDS
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS params (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    json TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL,
+    camera TEXT NOT NULL,
+    frame INTEGER NOT NULL,
+    timestamp REAL NOT NULL,
+    wall_time REAL,
+    time_of_day INTEGER,
+    ratio REAL NOT NULL,
+    components INTEGER NOT NULL,
+    boxes TEXT NOT NULL,
+    zones TEXT NOT NULL,
+    track INTEGER,
+    screenshot TEXT,
+    params_id INTEGER NOT NULL REFERENCES params (id),
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_camera_time ON events (camera, wall_time);
+CREATE INDEX IF NOT EXISTS events_camera_tod ON events (camera, time_of_day);
+CREATE INDEX IF NOT EXISTS events_time ON events (wall_time);
+CREATE INDEX IF NOT EXISTS events_path ON events (path, frame);
+"""
+
+# 文件名中的日期时间：20261019_020000 / 2026-10-19 02-00-00 / 20261019T020000 等
+_FILENAME_TIME = re.compile(r"(20\d{2})[-_.]?(\d{2})[-_.]?(\d{2})[-_.T ]?(\d{2})[-_.:]?(\d{2})[-_.:]?(\d{2})")
+
+
+def camera_name(video_path: str) -> str:
+    """机位：CAMERA_GROUPS 中匹配的分组名，未匹配时为所在目录名"""
+    basename = os.path.basename(video_path)
+    for pattern, name in CAMERA_GROUPS.items():
+        if fnmatch.fnmatch(basename, pattern):
+            return name
+    return os.path.basename(os.path.dirname(os.path.abspath(video_path)))
+
+
+def recording_start(video_path: str, duration: float = 0.0) -> Optional[float]:
+    """录像开始时刻（Unix 秒）：优先取文件名中的日期时间，否则按 修改时间 - 时长 估算"""
+    match = _FILENAME_TIME.search(os.path.basename(video_path))
+    if match:
+        try:
+            return datetime(*(int(g) for g in match.groups())).timestamp()
+        except ValueError:
+            pass
+    try:
+        return os.path.getmtime(video_path) - max(0.0, duration)
+    except OSError:
+        return None
+
+
+def params_summary(params) -> Dict[str, Any]:
+    """检测参数中影响结果的部分（区域只记录名称）"""
+    summary = {}
+    for key in ("gmm_var", "fd_var", "min_interval", "change_threshold", "speed", "dedup",
+                "throttle_clock", "motion_prefilter", "capture_mode"):
+        if hasattr(params, key):
+            summary[key] = getattr(params, key)
+    pipeline = getattr(params, "pipeline", None)
+    if pipeline is not None and is_dataclass(pipeline):
+        summary["pipeline"] = asdict(pipeline)
+    zones = getattr(params, "roi_zones", None)
+    if zones:
+        summary["zones"] = [zone.name for zone in zones]
+    return summary
+
+
+def like_pattern(pattern: str) -> str:
+    """通配符 * / ? 转为 LIKE 模式（配合 ESCAPE '\\'），路径中的 % / _ 按原样匹配"""
+    escaped = pattern.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped.replace("*", "%").replace("?", "_")
+
+
+def parse_time_of_day(text: str) -> int:
+    """HH:MM[:SS] → 当天秒数"""
+    parts = [int(p) for p in text.split(":")]
+    if not 2 <= len(parts) <= 3:
+        raise ValueError(f"时刻格式应为 HH:MM: {text}")
+    hour, minute, second = (parts + [0])[:3]
+    if not (0 <= hour <= 24 and 0 <= minute < 60 and 0 <= second < 60):
+        raise ValueError(f"时刻格式应为 HH:MM: {text}")
+    return hour * 3600 + minute * 60 + second
+
+
+class EventIndex:
+    """事件数据库；每次操作使用独立连接，多个进程可同时写入（写锁由 SQLite 文件锁保证）"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._params_ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # 与任务队列相同：截图目录可能位于网络共享，保持默认的 DELETE 日志模式
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def recorder(self, video_path: str, params, start_frame: int = 0, end_frame: Optional[int] = None,
+                 duration: float = 0.0) -> "EventRecorder":
+        """为一个视频（或其中一段）创建批量写入器；该范围内的旧事件先被删除"""
+        video_path = os.path.abspath(video_path)
+        params_json = json.dumps(params_summary(params), ensure_ascii=False, sort_keys=True)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM events WHERE path = ? AND frame >= ? AND frame < ?",
+                             (video_path, start_frame, end_frame if end_frame is not None else 2 ** 62))
+                params_id = self._params_id(conn, params_json)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return EventRecorder(self, video_path, camera_name(video_path),
+                             recording_start(video_path, duration), params_id)
+
+    def _params_id(self, conn: sqlite3.Connection, params_json: str) -> int:
+        with self._lock:
+            cached = self._params_ids.get(params_json)
+        if cached is not None:
+            return cached
+        conn.execute("INSERT OR IGNORE INTO params (json) VALUES (?)", (params_json,))
+        params_id = conn.execute("SELECT id FROM params WHERE json = ?", (params_json,)).fetchone()[0]
+        with self._lock:
+            self._params_ids[params_json] = params_id
+        return params_id
+
+    def insert(self, rows: Sequence[tuple]):
+        """一个事务写入一批事件行"""
+        if not rows:
+            return
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT INTO events (path, camera, frame, timestamp, wall_time, time_of_day, ratio, components, "
+                    "boxes, zones, track, screenshot, params_id, created) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def query(self, camera: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None,
+              time_of_day: Optional[Tuple[str, str]] = None, min_ratio: Optional[float] = None,
+              zone: Optional[str] = None, path: Optional[str] = None, limit: int = 1000) -> List[Dict[str, Any]]:
+        """按条件查询事件，按录像时刻排序
+
+        since / until 为 Unix 秒；time_of_day=("02:00", "03:00") 匹配任意日期的该时段（结束早于开始表示跨越午夜）；
+        min_ratio 为变化比例下限（0~1）；zone 按区域名精确匹配；path 支持通配符 * / ?（其余字符按原样匹配）。
+        """
+        clauses, args = [], []
+        if camera is not None:
+            clauses.append("e.camera = ?")
+            args.append(camera)
+        if since is not None:
+            clauses.append("e.wall_time >= ?")
+            args.append(since)
+        if until is not None:
+            clauses.append("e.wall_time < ?")
+            args.append(until)
+        if time_of_day is not None:
+            start, end = (parse_time_of_day(t) for t in time_of_day)
+            if start <= end:
+                clauses.append("e.time_of_day >= ? AND e.time_of_day < ?")
+            else:
+                clauses.append("(e.time_of_day >= ? OR e.time_of_day < ?)")
+            args.extend((start, end))
+        if min_ratio is not None:
+            clauses.append("e.ratio >= ?")
+            args.append(min_ratio)
+        if zone is not None:
+            # zones 为 JSON 数组文本，逐个元素精确比较（区域名中的 % / _ 不作通配符）
+            clauses.append("EXISTS (SELECT 1 FROM json_each(e.zones) WHERE json_each.value = ?)")
+            args.append(zone)
+        if path is not None:
+            clauses.append("e.path LIKE ? ESCAPE '\\'")
+            args.append(like_pattern(path))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = ("SELECT e.path, e.camera, e.frame, e.timestamp, e.wall_time, e.ratio, e.components, e.boxes, "
+               "e.zones, e.track, e.screenshot, p.json FROM events e JOIN params p ON p.id = e.params_id "
+               f"{where} ORDER BY e.wall_time, e.path, e.frame LIMIT ?")
+        with self._connect() as conn:
+            rows = conn.execute(sql, args + [max(1, limit)]).fetchall()
+        return [{
+            "path": r[0], "camera": r[1], "frame": r[2], "timestamp": r[3], "wall_time": r[4], "ratio": r[5],
+            "components": r[6], "boxes": json.loads(r[7]), "zones": json.loads(r[8]), "track": r[9],
+            "screenshot": r[10], "params": json.loads(r[11])
+        } for r in rows]
+
+    def cameras(self) -> List[Tuple[str, int]]:
+        """各机位事件数"""
+        with self._connect() as conn:
+            return conn.execute("SELECT camera, COUNT(*) FROM events GROUP BY camera ORDER BY camera").fetchall()
+
+
+class EventRecorder:
+    """单个视频的批量写入器：add() 只追加到内存缓冲，满一批或超过间隔时一个事务写入"""
+
+    def __init__(self, index: EventIndex, path: str, camera: str, start_time: Optional[float], params_id: int,
+                 batch_size: int = EVENT_DB_BATCH_SIZE, flush_seconds: float = EVENT_DB_FLUSH_SECONDS):
+        self.index = index
+        self.path = path
+        self.camera = camera
+        self.start_time = start_time
+        self.params_id = params_id
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_seconds
+        self.written = 0
+        self._rows: List[tuple] = []
+        self._last_flush = time.monotonic()
+
+    def add(self, event: Dict[str, Any]):
+        """event 为 process_video 的 on_event 事件"""
+        wall_time = time_of_day = None
+        if self.start_time is not None:
+            wall_time = self.start_time + event["timestamp"]
+            moment = datetime.fromtimestamp(wall_time)
+            time_of_day = moment.hour * 3600 + moment.minute * 60 + moment.second
+        track = event.get("track")
+        self._rows.append((
+            self.path, self.camera, event["frame_id"], event["timestamp"], wall_time, time_of_day,
+            event["ratio"], len(event["boxes"]), json.dumps(event["boxes"]),
+            json.dumps(event["zones"], ensure_ascii=False), track["track"] if track else None,
+            event.get("screenshot"), self.params_id, time.time()
+        ))
+        if len(self._rows) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        rows, self._rows = self._rows, []
+        self._last_flush = time.monotonic()
+        if not rows:
+            return
+        try:
+            self.index.insert(rows)
+            self.written += len(rows)
+        except sqlite3.Error as e:
+            # 索引写入失败不影响截图本身，记录后丢弃该批
+            logger.error(f"写入事件索引失败（{len(rows)} 条）: {e}")
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
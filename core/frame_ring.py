@@ -0,0 +1,130 @@
+# core/frame_ring.py
+"""共享内存帧环：解码进程写入一次，多个检测进程零拷贝读取
+
+内存布局：[每个槽位的引用计数 int32 × slots（按 64 字节对齐）][槽位 0 帧数据][槽位 1 帧数据]...
+
+用法（生产者）：
+    ring = FrameRing(slots=8, shape=(1080, 1920, 3))
+    slot = ring.acquire()                 # 无空闲槽位时阻塞（背压）
+    cap.read(ring.buffer(slot))           # 直接解码进槽位
+    ring.publish(slot, readers=2)         # 引用计数 = 读者数
+    for q in queues: q.put((slot, frame_id))
+
+用法（消费者，ring 作为 Process 参数传入即自动附着）：
+    slot, frame_id = q.get()
+    frame = ring.buffer(slot)             # 零拷贝视图
+    ...
+    ring.release(slot)                    # 计数归零后槽位回收
+"""
+import multiprocessing as mp
+import os
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+
+_HEADER_ALIGN = 64
+
+
+class FrameRing:
+    def __init__(self, slots: int = 8, shape: Tuple[int, ...] = (1080, 1920, 3), dtype=np.uint8):
+        self.slots = slots
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.slot_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        self.header_bytes = -(-slots * 4 // _HEADER_ALIGN) * _HEADER_ALIGN
+        self.shm = shared_memory.SharedMemory(create=True, size=self.header_bytes + slots * self.slot_bytes)
+        # 创建进程负责删除共享内存（fork 出的子进程继承对象但不删除）
+        self._owner_pid = os.getpid()
+        # 锁保护引用计数；信号量计数空闲槽位
+        self._lock = mp.Lock()
+        self._free = mp.Semaphore(slots)
+        self._attach()
+        self._refcounts[:] = 0
+        self._next = 0
+
+    def _attach(self):
+        buf = self.shm.buf
+        self._refcounts = np.ndarray((self.slots,), dtype=np.int32, buffer=buf)
+        self._frames = np.ndarray((self.slots,) + self.shape, dtype=self.dtype,
+                                  buffer=buf, offset=self.header_bytes)
+
+    # 作为 multiprocessing.Process 参数传递时只序列化名称与同步原语
+    def __getstate__(self):
+        return {
+            "name": self.shm.name, "slots": self.slots, "shape": self.shape,
+            "dtype": self.dtype.str, "lock": self._lock, "free": self._free
+        }
+
+    def __setstate__(self, state):
+        self.slots = state["slots"]
+        self.shape = tuple(state["shape"])
+        self.dtype = np.dtype(state["dtype"])
+        self.slot_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        self.header_bytes = -(-self.slots * 4 // _HEADER_ALIGN) * _HEADER_ALIGN
+        self._owner_pid = None
+        self._lock = state["lock"]
+        self._free = state["free"]
+        self.shm = shared_memory.SharedMemory(name=state["name"])
+        self._attach()
+        self._next = 0
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def buffer(self, slot: int) -> np.ndarray:
+        """槽位帧数据的零拷贝视图"""
+        return self._frames[slot]
+
+    def acquire(self, timeout: Optional[float] = None) -> Optional[int]:
+        """取得一个空闲槽位用于写入；超时返回 None"""
+        if not self._free.acquire(timeout=timeout):
+            return None
+        with self._lock:
+            for i in range(self.slots):
+                slot = (self._next + i) % self.slots
+                if self._refcounts[slot] == 0:
+                    self._refcounts[slot] = -1  # 写入中
+                    self._next = slot + 1
+                    return slot
+        # 信号量与计数不一致时不应发生
+        self._free.release()
+        raise RuntimeError("FrameRing 无空闲槽位")
+
+    def publish(self, slot: int, readers: int = 1):
+        """写入完成，设置读者数；readers 为 0 时立即回收"""
+        with self._lock:
+            self._refcounts[slot] = readers
+        if readers <= 0:
+            self._recycle(slot)
+
+    def write(self, frame: np.ndarray, readers: int = 1, timeout: Optional[float] = None) -> Optional[int]:
+        """拷贝一帧进空闲槽位并发布，返回槽位号"""
+        slot = self.acquire(timeout)
+        if slot is None:
+            return None
+        np.copyto(self._frames[slot], frame)
+        self.publish(slot, readers)
+        return slot
+
+    def release(self, slot: int):
+        """读者用完槽位后调用；最后一个读者释放时槽位回收"""
+        with self._lock:
+            self._refcounts[slot] -= 1
+            done = self._refcounts[slot] <= 0
+        if done:
+            self._recycle(slot)
+
+    def _recycle(self, slot: int):
+        with self._lock:
+            self._refcounts[slot] = 0
+        self._free.release()
+
+    def close(self):
+        """解除映射（调用前需释放 buffer() 返回的视图）；创建进程同时删除共享内存"""
+        self._refcounts = None
+        self._frames = None
+        self.shm.close()
+        if self._owner_pid == os.getpid():
+            self.shm.unlink()
@@ -0,0 +1,226 @@
+# core/governor.py
+"""资源限制：与录像等生产进程共用主机时，限制检测占用的 CPU、降低调度优先级，并只在指定时段运行
+
+CPU 预算按全机百分比给出（CPU_BUDGET_PERCENT），分三层落实：
+1. 并发数：工作进程数不超过预算折合的核数；
+2. 线程数：每个工作进程的 OpenCV 线程数 = 该进程分到的核数（向下取整，至少 1）；
+3. 帧节奏：逐帧比较本进程 CPU 时间与墙钟时间，超出份额时在帧之间等待（解码线程同样计入）。
+nice / ionice 在进程启动时设置，由工作进程继承。运行时段外暂停（处理中的视频在帧之间等待，不丢弃进度）。
+实际 / 预算占用定期写入日志。
+"""
+import logging
+import math
+import os
+import shutil
+import subprocess
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence, Tuple
+
+import cv2
+
+from config import (
+    CPU_BUDGET_PERCENT,
+    PROCESS_NICE,
+    PROCESS_IO_IDLE,
+    RUN_SCHEDULE,
+    GOVERNOR_PACE_WINDOW,
+    GOVERNOR_REPORT_INTERVAL
+)
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+CPU_UTILISATION = metrics.REGISTRY.gauge("governor_cpu_percent", "最近统计周期内本进程占全机 CPU 的百分比")
+THROTTLE_SECONDS = metrics.REGISTRY.counter("governor_throttle_seconds_total", "因超出 CPU 预算在帧之间等待的时间")
+PAUSED = metrics.REGISTRY.gauge("governor_paused", "当前是否因不在运行时段内而暂停（1 为暂停）")
+
+# 每次节奏检查的最小间隔：逐帧调用的开销只有两次计时
+_PACE_CHECK_SECONDS = 0.05
+_SCHEDULE_POLL_SECONDS = 5.0
+
+
+def parse_schedule(windows: Sequence[str]) -> List[Tuple[int, int]]:
+    """解析运行时段 ["22:00-06:00", ...] 为 [(起始分钟, 结束分钟)]；结束早于起始表示跨越午夜"""
+    result = []
+    for window in windows:
+        try:
+            start, end = (part.strip() for part in window.split("-"))
+            minutes = []
+            for text in (start, end):
+                hour, minute = text.split(":")
+                if not (0 <= int(hour) <= 24 and 0 <= int(minute) < 60):
+                    raise ValueError
+                minutes.append(int(hour) * 60 + int(minute))
+        except ValueError:
+            raise ValueError(f"运行时段格式应为 HH:MM-HH:MM: {window}")
+        result.append((minutes[0], minutes[1]))
+    return result
+
+
+def _in_window(minute: int, window: Tuple[int, int]) -> bool:
+    start, end = window
+    if start <= end:
+        return start <= minute < end
+    return minute >= start or minute < end
+
+
+def lower_priority(nice: int = PROCESS_NICE, io_idle: bool = PROCESS_IO_IDLE):
+    """降低当前进程的 CPU / IO 调度优先级（之后创建的工作进程继承）；不支持的平台只记录警告"""
+    if nice > 0:
+        if hasattr(os, "nice"):
+            os.nice(nice)
+            logger.info(f"进程优先级已降低: nice +{nice}")
+        else:
+            logger.warning("当前平台不支持 nice，忽略优先级设置")
+    if io_idle:
+        ionice = shutil.which("ionice")
+        if ionice is None:
+            logger.warning("未找到 ionice，忽略 IO 优先级设置")
+            return
+        result = subprocess.run([ionice, "-c", "3", "-p", str(os.getpid())], capture_output=True, text=True)
+        if result.returncode == 0:
+            logger.info("IO 优先级已设为空闲（ionice -c 3）")
+        else:
+            logger.warning(f"设置 IO 优先级失败: {result.stderr.strip()}")
+
+
+class ResourceGovernor:
+    """单个进程内的 CPU 节奏控制与运行时段判断；同一进程内的多个检测线程共用一个实例
+
+    workers 为同一预算下的进程数（监视目录的工作进程数），每个进程分得 1 / workers 的预算。
+    """
+
+    def __init__(self, cpu_budget: float = CPU_BUDGET_PERCENT, schedule: Sequence[str] = RUN_SCHEDULE,
+                 workers: int = 1, report_interval: float = GOVERNOR_REPORT_INTERVAL,
+                 pace_window: float = GOVERNOR_PACE_WINDOW):
+        self.cpu_budget = max(0.0, min(100.0, cpu_budget))
+        self.cores = os.cpu_count() or 1
+        self.workers = max(1, workers)
+        self.schedule = parse_schedule(schedule)
+        self.report_interval = report_interval
+        self.pace_window = pace_window
+        # 本进程可用的核数（0 表示不限制）
+        self.share = self.cores * self.cpu_budget / 100 / self.workers if self.cpu_budget > 0 else 0.0
+        self._lock = threading.Lock()
+        self._window_wall, self._window_cpu = time.perf_counter(), time.process_time()
+        self._report_wall, self._report_cpu = self._window_wall, self._window_cpu
+        self._last_check = self._window_wall
+        self._throttled = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.share > 0 or bool(self.schedule)
+
+    @staticmethod
+    def limit_workers(requested: int, cpu_budget: float = CPU_BUDGET_PERCENT) -> int:
+        """按预算折合的核数限制并发进程数"""
+        if cpu_budget <= 0:
+            return max(1, requested)
+        cores = (os.cpu_count() or 1) * min(100.0, cpu_budget) / 100
+        return max(1, min(requested, math.ceil(cores)))
+
+    def configure_threads(self) -> int:
+        """按本进程份额设置 OpenCV 线程数，返回设置的线程数（不限制时为 0，保持 OpenCV 默认）"""
+        if self.share <= 0:
+            return 0
+        threads = max(1, int(self.share))
+        cv2.setNumThreads(threads)
+        return threads
+
+    def in_window(self, now: Optional[datetime] = None) -> bool:
+        if not self.schedule:
+            return True
+        now = now or datetime.now()
+        minute = now.hour * 60 + now.minute
+        return any(_in_window(minute, window) for window in self.schedule)
+
+    def next_window_start(self, now: Optional[datetime] = None) -> Optional[datetime]:
+        """下一个运行时段的开始时间（用于日志）"""
+        if not self.schedule:
+            return None
+        now = (now or datetime.now()).replace(second=0, microsecond=0)
+        starts = []
+        for start, _ in self.schedule:
+            candidate = now.replace(hour=start // 60 % 24, minute=start % 60)
+            starts.append(candidate if candidate > now else candidate + timedelta(days=1))
+        return min(starts)
+
+    def wait_for_window(self, cancel: Optional[threading.Event] = None) -> bool:
+        """不在运行时段内时阻塞等待；返回 False 表示等待期间被取消"""
+        if self.in_window():
+            return True
+        resume = self.next_window_start()
+        logger.info(f"不在运行时段内，暂停至 {resume:%H:%M}")
+        PAUSED.set(1)
+        try:
+            while not self.in_window():
+                if cancel is not None:
+                    if cancel.wait(_SCHEDULE_POLL_SECONDS):
+                        return False
+                else:
+                    time.sleep(_SCHEDULE_POLL_SECONDS)
+        finally:
+            PAUSED.set(0)
+        logger.info("进入运行时段，继续处理")
+        # 暂停期间不计入 CPU 占用统计
+        self._reset_windows()
+        return True
+
+    def pace(self, cancel: Optional[threading.Event] = None):
+        """逐帧调用：超出 CPU 份额时等待，不在运行时段内时暂停"""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if now - self._last_check < _PACE_CHECK_SECONDS:
+            return
+        self._last_check = now
+        if self.schedule and not self.wait_for_window(cancel):
+            return
+        delay = 0.0
+        with self._lock:
+            cpu = time.process_time()
+            if self.share > 0:
+                # CPU 时间按份额折合的墙钟时间超过实际经过的时间，差值即需要等待的时间
+                delay = (cpu - self._window_cpu) / self.share - (now - self._window_wall)
+                if now - self._window_wall >= self.pace_window:
+                    # 滑动统计窗口：只按最近一段时间计算，避免长期累计的欠账导致突发长时间等待
+                    self._window_wall, self._window_cpu = now, cpu
+            if now - self._report_wall >= self.report_interval:
+                self._report(now, cpu)
+        if delay > 0:
+            delay = min(delay, self.pace_window)
+            self._throttled += delay
+            THROTTLE_SECONDS.inc(delay)
+            if cancel is not None:
+                cancel.wait(delay)
+            else:
+                time.sleep(delay)
+
+    def report(self):
+        """立即输出一次实际 / 预算占用（例如每个视频结束时）"""
+        with self._lock:
+            self._report(time.perf_counter(), time.process_time())
+
+    def _report(self, now: float, cpu: float):
+        wall = now - self._report_wall
+        if wall <= 0:
+            return
+        achieved = (cpu - self._report_cpu) / wall / self.cores * 100
+        CPU_UTILISATION.set(achieved)
+        if self.share > 0:
+            budget = self.cpu_budget / self.workers
+            scope = f"本进程预算 {budget:.0f}%（共 {self.workers} 个进程）" if self.workers > 1 else f"预算 {budget:.0f}%"
+            logger.info(f"CPU 占用: 实际 {achieved:.1f}% / {scope}（全机 {self.cores} 核），"
+                        f"限速等待 {self._throttled:.1f} 秒")
+        else:
+            logger.info(f"CPU 占用: 实际 {achieved:.1f}%（全机 {self.cores} 核，未设置预算）")
+        self._report_wall, self._report_cpu = now, cpu
+        self._throttled = 0.0
+
+    def _reset_windows(self):
+        with self._lock:
+            now, cpu = time.perf_counter(), time.process_time()
+            self._window_wall, self._window_cpu = now, cpu
+            self._report_wall, self._report_cpu = now, cpu
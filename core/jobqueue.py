@@ -0,0 +1,335 @@
+# core/jobqueue.py
+"""多节点任务分发：共享存储上的 SQLite 任务表 + 限时租约
+
+多台服务器挂载同一归档目录，各自运行 JobWorker 从同一个数据库领取任务（整段视频或视频中的一段帧区间）。
+领取时写入租约到期时间，处理期间由心跳线程定期续约；节点崩溃或失联后租约过期，任务被其他节点重新领取。
+无需消息中间件，只依赖数据库文件所在共享目录的文件锁。
+"""
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterator, List, NamedTuple, Optional, Sequence
+
+from config import (
+    JOB_LEASE_SECONDS,
+    JOB_HEARTBEAT_INTERVAL,
+    JOB_MAX_ATTEMPTS,
+    JOB_POLL_INTERVAL,
+    MEMORY_BUDGET_MB,
+    SCREENSHOT_MODE,
+    SCREENSHOT_MAX_DIM,
+    SCREENSHOT_STORE
+)
+
+if TYPE_CHECKING:
+    from core.eventdb import EventIndex
+    from core.governor import ResourceGovernor
+    from core.pipeline import DetectionParams
+
+logger = logging.getLogger(__name__)
+
+JOB_STATES = ("queued", "running", "done", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL,
+    start_frame INTEGER NOT NULL DEFAULT 0,
+    end_frame INTEGER,
+    state TEXT NOT NULL DEFAULT 'queued',
+    owner TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    events INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    UNIQUE (path, start_frame)
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_until);
+"""
+
+
+class Job(NamedTuple):
+    id: int
+    path: str
+    start_frame: int
+    end_frame: Optional[int]
+    attempts: int
+
+
+def _probe_frame_count(path: str) -> int:
+    # 仅切分任务时需要；queue status 等管理命令不加载 OpenCV
+    from core.probe import probe_video
+    return probe_video(path).frame_count
+
+
+class JobQueue:
+    """共享存储上的任务表；每次操作使用独立连接，可被多个进程 / 多台机器同时访问"""
+
+    def __init__(self, db_path: str, lease_seconds: float = JOB_LEASE_SECONDS,
+                 max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # 网络文件系统不支持 WAL 所需的共享内存，保持默认的 DELETE 日志模式
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, paths: Sequence[str], segment_frames: int = 0) -> int:
+        """加入任务（已存在的同一视频 / 同一段自动忽略），返回新增任务数"""
+        now = time.time()
+        rows = []
+        for path in paths:
+            path = os.path.abspath(path)
+            if segment_frames > 0:
+                total = _probe_frame_count(path)
+                if total <= 0:
+                    logger.warning(f"无法读取帧数，按整段视频入队: {path}")
+                    rows.append((path, 0, None))
+                    continue
+                for start in range(0, total, segment_frames):
+                    end = start + segment_frames
+                    rows.append((path, start, end if end < total else None))
+            else:
+                rows.append((path, 0, None))
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO jobs (path, start_frame, end_frame, created, updated) VALUES (?, ?, ?, ?, ?)",
+                [(p, s, e, now, now) for p, s, e in rows]
+            )
+            return conn.total_changes - before
+
+    def claim(self, owner: str) -> Optional[Job]:
+        """领取一个排队中或租约已过期的任务；没有可领取的任务时返回 None"""
+        now = time.time()
+        exhausted: List[Job] = []
+        with self._connect() as conn:
+            # IMMEDIATE 事务立即获取写锁，保证同一任务不会被两个节点同时领取
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                job = None
+                while job is None:
+                    row = conn.execute(
+                        "SELECT id, path, start_frame, end_frame, attempts FROM jobs "
+                        "WHERE state = 'queued' OR (state = 'running' AND lease_until < ?) "
+                        "ORDER BY id LIMIT 1", (now,)
+                    ).fetchone()
+                    if row is None:
+                        break
+                    candidate = Job(row[0], row[1], row[2], row[3], row[4] + 1)
+                    if candidate.attempts > self.max_attempts:
+                        # 反复在处理中失联（例如解码时崩溃）的任务不再重试，同一事务内继续找下一个
+                        conn.execute("UPDATE jobs SET state = 'failed', owner = NULL, error = ?, updated = ? "
+                                     "WHERE id = ?", ("租约多次过期", now, candidate.id))
+                        exhausted.append(candidate)
+                        continue
+                    conn.execute(
+                        "UPDATE jobs SET state = 'running', owner = ?, lease_until = ?, attempts = ?, updated = ? "
+                        "WHERE id = ?", (owner, now + self.lease_seconds, candidate.attempts, now, candidate.id)
+                    )
+                    job = candidate
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        for failed in exhausted:
+            logger.warning(f"任务 {failed.id} 多次租约过期，标记为失败: {failed.path}")
+        return job
+
+    def renew(self, job_id: int, owner: str) -> bool:
+        """续约；返回 False 表示租约已被其他节点接管"""
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET lease_until = ?, updated = ? WHERE id = ? AND owner = ? AND state = 'running'",
+                (now + self.lease_seconds, now, job_id, owner)
+            )
+            return cur.rowcount == 1
+
+    def complete(self, job_id: int, owner: str, events: int) -> bool:
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET state = 'done', owner = NULL, lease_until = NULL, events = ?, error = NULL, "
+                "updated = ? WHERE id = ? AND owner = ?", (events, time.time(), job_id, owner)
+            )
+            return cur.rowcount == 1
+
+    def fail(self, job_id: int, owner: str, error: str) -> bool:
+        """记录失败；未达到最大尝试次数时重新排队"""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+                "owner = NULL, lease_until = NULL, error = ?, updated = ? WHERE id = ? AND owner = ?",
+                (self.max_attempts, error, time.time(), job_id, owner)
+            )
+            return cur.rowcount == 1
+
+    def release(self, job_id: int, owner: str) -> bool:
+        """主动放弃（节点正常停止），任务立即回到队列且不计入尝试次数"""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET state = 'queued', owner = NULL, lease_until = NULL, attempts = attempts - 1, "
+                "updated = ? WHERE id = ? AND owner = ? AND state = 'running'", (time.time(), job_id, owner)
+            )
+            return cur.rowcount == 1
+
+    def status(self) -> Dict[str, int]:
+        """各状态任务数；租约已过期的运行中任务单独统计为 expired"""
+        counts = {state: 0 for state in JOB_STATES}
+        counts["expired"] = 0
+        with self._connect() as conn:
+            for state, n in conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state"):
+                counts[state] = n
+            counts["expired"] = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE state = 'running' AND lease_until < ?", (time.time(),)
+            ).fetchone()[0]
+        return counts
+
+    def failures(self) -> List[tuple]:
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT path, start_frame, end_frame, attempts, error FROM jobs WHERE state = 'failed' ORDER BY id"
+            ).fetchall()
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class _Heartbeat(threading.Thread):
+    """处理期间定期续约；租约被接管时设置 lost，通知检测循环尽快停止"""
+
+    def __init__(self, queue: JobQueue, job: Job, owner: str, interval: float):
+        super().__init__(daemon=True, name=f"心跳-{job.id}")
+        self.queue = queue
+        self.job = job
+        self.owner = owner
+        self.interval = interval
+        self.lost = threading.Event()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            try:
+                ok = self.queue.renew(self.job.id, self.owner)
+            except sqlite3.Error as e:
+                # 共享存储短暂不可用时继续重试，租约未过期前任务仍归本节点
+                logger.warning(f"续约失败，稍后重试: {e}")
+                continue
+            if not ok:
+                logger.warning(f"任务 {self.job.id} 的租约已被其他节点接管，停止处理")
+                self.lost.set()
+                return
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+class JobWorker:
+    """一个节点上的工作循环：领取 → 检测（续约）→ 完成 / 失败，直到 stop 被设置"""
+
+    def __init__(self, queue: JobQueue, params: "DetectionParams", save_path: str,
+                 worker_id: Optional[str] = None,
+                 screenshot_mode: str = SCREENSHOT_MODE,
+                 max_dim: int = SCREENSHOT_MAX_DIM,
+                 store: str = SCREENSHOT_STORE,
+                 heartbeat_interval: float = JOB_HEARTBEAT_INTERVAL,
+                 poll_interval: float = JOB_POLL_INTERVAL,
+                 memory_budget: float = MEMORY_BUDGET_MB,
+                 governor: Optional["ResourceGovernor"] = None,
+                 event_index: Optional["EventIndex"] = None):
+        self.queue = queue
+        self.governor = governor
+        self.event_index = event_index
+        self.params = params
+        self.save_path = save_path
+        self.worker_id = worker_id or default_worker_id()
+        self.screenshot_mode = screenshot_mode
+        self.max_dim = max_dim
+        self.store = store
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval = poll_interval
+        from core.memory import MemoryMonitor
+        from core.video_processor import BackgroundModelPool
+        self.pool = BackgroundModelPool()
+        self.memory = MemoryMonitor(budget_mb=memory_budget)
+        self.memory.track_pool(self.pool)
+        self.over_budget = False
+        self.completed = 0
+
+    def run(self, stop: threading.Event, exit_when_empty: bool = False):
+        logger.info(f"工作节点 {self.worker_id} 开始领取任务: {self.queue.db_path}")
+        while not stop.is_set():
+            # 运行时段外不领取新任务，避免领取后长时间暂停占住租约
+            if self.governor is not None and not self.governor.wait_for_window(stop):
+                break
+            job = self.queue.claim(self.worker_id)
+            if job is None:
+                if exit_when_empty:
+                    break
+                stop.wait(self.poll_interval)
+                continue
+            self._run_job(job, stop)
+            if self.over_budget:
+                # 释放缓存后仍超出预算：退出进程，由进程管理器重启一个干净的工作节点
+                logger.warning(f"工作节点 {self.worker_id} 内存超出预算，退出以便重启")
+                break
+        logger.info(f"工作节点 {self.worker_id} 退出，共完成 {self.completed} 个任务")
+
+    def _run_job(self, job: Job, stop: threading.Event):
+        segment = f"[{job.start_frame}, {job.end_frame if job.end_frame is not None else '结尾'})"
+        logger.info(f"领取任务 {job.id}（第 {job.attempts} 次尝试）: {job.path} 帧 {segment}")
+        heartbeat = _Heartbeat(self.queue, job, self.worker_id, self.heartbeat_interval)
+        cancel = threading.Event()
+
+        def _watch():
+            # 节点停止或租约丢失都需要中断检测循环
+            while not cancel.is_set():
+                if stop.wait(0.5) or heartbeat.lost.is_set():
+                    cancel.set()
+        heartbeat.start()
+        watcher = threading.Thread(target=_watch, daemon=True)
+        watcher.start()
+        from core.runner import process_video
+        from core.store import ScreenshotSink
+        try:
+            summary = process_video(job.path, self.params, self.save_path,
+                                    screenshot_mode=self.screenshot_mode, max_dim=self.max_dim,
+                                    pool=self.pool, cancel=cancel,
+                                    start_frame=job.start_frame, end_frame=job.end_frame,
+                                    memory=self.memory, sink=ScreenshotSink(self.save_path, self.store),
+                                    governor=self.governor, event_index=self.event_index)
+            self.over_budget = summary.get("over_budget", False)
+        except Exception as e:
+            logger.exception(f"任务 {job.id} 处理出错: {job.path}")
+            summary = {"error": str(e), "cancelled": False, "events": 0}
+        finally:
+            lost = heartbeat.lost.is_set()
+            heartbeat.stop()
+            cancel.set()
+            watcher.join()
+
+        if lost:
+            return
+        if summary.get("cancelled"):
+            self.queue.release(job.id, self.worker_id)
+            logger.info(f"任务 {job.id} 已放回队列")
+        elif summary.get("error"):
+            self.queue.fail(job.id, self.worker_id, summary["error"])
+        elif self.queue.complete(job.id, self.worker_id, summary.get("events", 0)):
+            self.completed += 1
@@ -0,0 +1,163 @@
+# core/memory.py
+"""内存记账与预算：采样进程 RSS、统计各子系统缓存数量、记录每个视频的内存增量，超出预算时依次释放缓存
+
+长时间批处理（数千个文件、连续运行数天）中 RSS 缓慢上涨时，先看每个视频的增量与各子系统计数定位来源；
+设置 MEMORY_BUDGET_MB 后，超出预算时先执行 gc 与 malloc_trim 把空闲堆内存还给系统，
+仍超出再按注册顺序调用释放动作（缩小缓存 / 队列）。全部执行后仍然超出时由调用方决定是否重建工作进程。
+"""
+import ctypes
+import gc
+import logging
+import os
+import sys
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import MEMORY_BUDGET_MB, MEMORY_LOG_PER_VIDEO
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+RSS_BYTES = metrics.REGISTRY.gauge("memory_rss_bytes", "进程常驻内存（RSS）")
+BUFFERS = metrics.REGISTRY.gauge("memory_buffers", "各子系统持有的缓存数量", ("subsystem",))
+RELIEFS = metrics.REGISTRY.counter("memory_relief_total", "超出内存预算后执行的释放动作次数", ("action",))
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes() -> Optional[int]:
+    """当前进程 RSS（字节）；无法获取时返回 None"""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        pass
+    if os.name == "nt":
+        try:
+            from ctypes import wintypes
+
+            class _Counters(ctypes.Structure):
+                _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                    (name, ctypes.c_size_t) for name in (
+                        "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                        "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+            counters = _Counters()
+            counters.cb = ctypes.sizeof(counters)
+            handle = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+                return counters.WorkingSetSize
+        except (OSError, AttributeError):
+            pass
+        return None
+    try:
+        import resource
+        # macOS 等平台只能取得峰值（ru_maxrss，macOS 单位为字节，其余为 KB）
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return None
+
+
+def release_heap() -> bool:
+    """gc + glibc malloc_trim：把碎片化的空闲堆内存归还给系统（非 glibc 平台只执行 gc）"""
+    gc.collect()
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        return bool(ctypes.CDLL("libc.so.6").malloc_trim(0))
+    except (OSError, AttributeError):
+        return False
+
+
+def _mb(value: Optional[int]) -> str:
+    return f"{value / 1048576:.1f} MB" if value is not None else "未知"
+
+
+class MemoryMonitor:
+    """进程级内存记账：probe 返回某子系统当前持有的缓存数量，relief 在超出预算时释放该子系统的缓存"""
+
+    def __init__(self, budget_mb: float = MEMORY_BUDGET_MB, log_per_video: bool = MEMORY_LOG_PER_VIDEO,
+                 log: Optional[Callable[[str], None]] = None):
+        self.budget = int(budget_mb * 1048576) if budget_mb > 0 else 0
+        self.log_per_video = log_per_video
+        self.log = log or logger.info  # 界面传入自己的日志函数
+        self._probes: Dict[str, Callable[[], int]] = {}
+        self._reliefs: List[Tuple[str, Callable[[], None]]] = []
+        self._lock = threading.Lock()
+        self._video_start: Dict[str, Optional[int]] = {}
+
+    def register_probe(self, subsystem: str, probe: Callable[[], int]):
+        with self._lock:
+            self._probes[subsystem] = probe
+
+    def register_relief(self, action: str, relief: Callable[[], None]):
+        """释放动作按注册顺序执行，代价小（不影响后续处理结果）的应先注册"""
+        with self._lock:
+            self._reliefs.append((action, relief))
+
+    def track_pool(self, pool, subsystem: str = "background_models"):
+        """背景模型池：先缩到只保留最近一个机位，仍超出时清空（之后的视频需重新预热）"""
+        self.register_probe(subsystem, lambda: len(pool))
+        self.register_relief(f"{subsystem}_trim", lambda: pool.trim(1))
+        self.register_relief(f"{subsystem}_clear", pool.clear)
+
+    def buffer_counts(self) -> Dict[str, int]:
+        with self._lock:
+            probes = list(self._probes.items())
+        counts = {}
+        for name, probe in probes:
+            try:
+                counts[name] = int(probe())
+            except Exception:
+                continue
+            BUFFERS.labels(name).set(counts[name])
+        return counts
+
+    def sample(self) -> Optional[int]:
+        rss = rss_bytes()
+        if rss is not None:
+            RSS_BYTES.set(rss)
+        return rss
+
+    def over_budget(self, rss: Optional[int] = None) -> bool:
+        if not self.budget:
+            return False
+        rss = self.sample() if rss is None else rss
+        return rss is not None and rss > self.budget
+
+    def begin_video(self, key: str):
+        self._video_start[key] = self.sample()
+
+    def end_video(self, key: str) -> Optional[int]:
+        """记录本视频的 RSS 增量并检查预算，返回处理后的 RSS"""
+        before = self._video_start.pop(key, None)
+        rss = self.sample()
+        counts = self.buffer_counts()
+        if self.log_per_video and rss is not None:
+            delta = f"{(rss - before) / 1048576:+.1f} MB" if before is not None else "未知"
+            detail = "，".join(f"{k} {v}" for k, v in counts.items())
+            self.log(f"内存: RSS {_mb(rss)}（本视频 {delta}）" + (f"，缓存: {detail}" if detail else ""))
+        self.enforce(rss)
+        return self.sample()
+
+    def enforce(self, rss: Optional[int] = None) -> bool:
+        """超出预算时依次执行释放动作，直到回到预算以内；返回最终是否仍然超出"""
+        if not self.over_budget(rss):
+            return False
+        with self._lock:
+            reliefs = list(self._reliefs)
+        for action, relief in [("heap_trim", release_heap)] + reliefs:
+            try:
+                relief()
+            except Exception as e:
+                self.log(f"内存释放动作 {action} 失败: {e}")
+                continue
+            if relief is not release_heap:
+                release_heap()
+            RELIEFS.labels(action).inc()
+            rss = self.sample()
+            self.log(f"内存超出预算 {_mb(self.budget)}，已执行 {action}，当前 RSS {_mb(rss)}")
+            if not self.over_budget(rss):
+                return False
+        self.log(f"释放缓存后 RSS {_mb(rss)} 仍超出预算 {_mb(self.budget)}")
+        return True
@@ -0,0 +1,341 @@
+# core/metrics.py
+"""运行指标：计数器 / 仪表 / 直方图，按 Prometheus 文本格式输出
+
+无人值守运行时供外部监控报警（吞吐下降、解码卡顿、进程卡死）。指标在检测循环中直接更新，
+每次更新只是一次加锁的加法，开销远小于单帧解码。输出方式：
+    start_http_server(port)      本机 /metrics 接口
+    TextfileWriter(path)         定期写入文本文件，供 node_exporter 的 textfile 收集器读取
+"""
+import abc
+import bisect
+import glob
+import logging
+import math
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config import METRICS_TEXTFILE_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# 秒级延迟的默认分桶：覆盖单帧处理（毫秒级）到解码卡顿（秒级）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            # 无标签指标从启动起就输出 0，便于报警规则区分“没有数据”和“数值为 0”
+            self._children[()] = self._new_child()
+
+    def labels(self, *values: str):
+        """按标签值取子指标（首次访问时创建）"""
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}")
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} 带标签，需先调用 labels()")
+        return self.labels()
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """创建一个子指标（单个标签组合的取值）"""
+
+    def render(self, const_labels: str = "") -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        # 处理线程可能同时通过 labels() 新增子指标：加锁取快照，格式化在锁外进行
+        with self._lock:
+            items = list(self._children.items())
+        for key, child in sorted(items, key=lambda item: item[0]):
+            lines.extend(child.samples(self.name, self.labelnames, key, const_labels))
+        return lines
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+    def samples(self, name, labelnames, values, const_labels):
+        return [f"{name}{_format_labels(labelnames, values, const_labels)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    """只增计数器"""
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值"""
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default().dec(amount)
+
+    def set(self, value: float):
+        self._default().set(value)
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        idx = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[idx] += 1
+            self.sum += value
+
+    def samples(self, name, labelnames, values, const_labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(list(self.bounds) + [math.inf], self.counts):
+            cumulative += count
+            le = 'le="' + _format_value(bound) + '"'
+            extra = f"{const_labels},{le}" if const_labels else le
+            lines.append(f"{name}_bucket{_format_labels(labelnames, values, extra)} {cumulative}")
+        labels = _format_labels(labelnames, values, const_labels)
+        lines.append(f"{name}_sum{labels} {_format_value(self.sum)}")
+        lines.append(f"{name}_count{labels} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    """分桶直方图（桶上界升序，自动追加 +Inf）"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+
+class MetricsRegistry:
+    """指标注册表；const_labels 附加到所有样本（例如区分同一台机器上的多个工作进程）"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        self.const_labels: Dict[str, str] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        const = ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(self.const_labels.items()))
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render(const))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# ========== 检测流程指标 ==========
+FRAMES = REGISTRY.counter("detect_frames_total", "已检测的帧数")
+DROPPED_FRAMES = REGISTRY.counter("detect_dropped_frames_total", "未检测的帧数（skip: 倍速跳过，static: 运动矢量判定静止，read_error: 解码失败提前结束）",
+                                  ("reason",))
+STAGE_SECONDS = REGISTRY.histogram("detect_stage_seconds", "单帧各阶段耗时（decode / detect / trigger）", ("stage",))
+DECODE_STALLS = REGISTRY.counter("detect_decode_stalls_total", "单帧解码耗时超过卡顿阈值的次数")
+TRIGGERS = REGISTRY.counter("detect_triggers_total", "触发截图次数")
+GLOBAL_REJECTIONS = REGISTRY.counter("detect_global_rejections_total", "被判定为全局变化而忽略的帧数", ("kind",))
+LAST_FRAME_TIME = REGISTRY.gauge("detect_last_frame_timestamp_seconds", "最近一次完成检测的时间（Unix 秒），用于发现卡死")
+ACTIVE_VIDEOS = REGISTRY.gauge("detect_active_videos", "正在处理的视频数")
+VIDEOS = REGISTRY.counter("detect_videos_total", "处理结束的视频数", ("result",))
+VIDEO_FPS = REGISTRY.gauge("detect_video_fps", "最近处理完的视频的平均处理速度（视频帧/秒，含跳过的帧）")
+TRIGGERS_PER_VIDEO = REGISTRY.histogram("detect_triggers_per_video", "每个视频的触发次数",
+                                        buckets=(0, 1, 5, 10, 25, 50, 100, 250, 500, 1000))
+OPEN_ERRORS = REGISTRY.counter("video_open_errors_total", "打开视频失败次数", ("reason",))
+
+# ========== 截图写入指标 ==========
+SCREENSHOT_PENDING = REGISTRY.gauge("screenshot_pending", "正在编码 / 写入的截图数")
+SCREENSHOT_SECONDS = REGISTRY.histogram("screenshot_write_seconds", "截图编码 + 写入耗时")
+SCREENSHOT_ERRORS = REGISTRY.counter("screenshot_errors_total", "截图写入失败次数")
+
+
+def start_http_server(port: int, host: str = "127.0.0.1", registry: MetricsRegistry = REGISTRY):
+    """在后台线程提供 /metrics 接口（http.server 仅在开启接口时导入）"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            data = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="指标接口", daemon=True).start()
+    logger.info(f"指标接口: http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+def write_textfile(path: str, registry: MetricsRegistry = REGISTRY):
+    """原子写入（先写临时文件再改名），避免收集器读到半个文件"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(registry.render())
+    os.replace(tmp, path)
+
+
+class TextfileWriter(threading.Thread):
+    """后台定期写指标文件；stop() 时再写一次，保证最终数值落盘"""
+
+    def __init__(self, path: str, interval: float = METRICS_TEXTFILE_INTERVAL,
+                 registry: MetricsRegistry = REGISTRY):
+        super().__init__(name="指标文件", daemon=True)
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            self._write()
+
+    def _write(self):
+        try:
+            write_textfile(self.path, self.registry)
+        except OSError as e:
+            logger.warning(f"写入指标文件失败: {e}")
+
+    def stop(self, remove: bool = False):
+        """停止定期写入；remove=True 时删除指标文件而不是写最终数值（进程退出后不再导出陈旧数值）"""
+        self._done.set()
+        if remove:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"删除指标文件失败: {e}")
+        else:
+            self._write()
+
+
+def worker_textfile_path(path: Optional[str]) -> Optional[str]:
+    """多进程时每个进程写自己的文件（textfile 收集器会合并目录下所有 .prom 文件）"""
+    if not path:
+        return None
+    root, ext = os.path.splitext(path)
+    return f"{root}_{os.getpid()}{ext or '.prom'}"
+
+
+def sweep_worker_textfiles(path: Optional[str]) -> int:
+    """删除各工作进程遗留的指标文件，返回删除个数
+
+    正常退出的工作进程会自行删除；被强制结束（崩溃、被系统杀掉）的进程留下的文件由主进程在启动工作进程前清理，
+    此时本次运行的工作进程尚未创建，目录下匹配的文件都已陈旧。
+    """
+    if not path:
+        return 0
+    root, ext = os.path.splitext(path)
+    ext = ext or ".prom"
+    pattern = re.compile(re.escape(os.path.basename(root)) + r"_\d+" + re.escape(ext) + "$")
+    removed = 0
+    for stale in glob.glob(f"{glob.escape(root)}_*{glob.escape(ext)}"):
+        if not pattern.match(os.path.basename(stale)):
+            continue
+        try:
+            os.remove(stale)
+            removed += 1
+        except OSError as e:
+            logger.warning(f"删除遗留指标文件失败: {e}")
+    if removed:
+        logger.info(f"已删除 {removed} 个遗留的工作进程指标文件")
+    return removed
@@ -0,0 +1,236 @@
+# core/mv_prefilter.py
+"""编码运动矢量预筛选（可选，需要 PyAV）：解码器已产出的运动矢量显示 ROI 内没有运动时，跳过该帧的预处理与检测
+
+H.264 / HEVC / MPEG-4 的帧间编码帧自带运动矢量，PyAV 以 flags2=+export_mvs 解码即可取出，几乎没有额外开销。
+静止帧连 BGR 转换都省掉；连续静止时每 MV_REFRESH_FRAMES 帧仍更新一次背景模型与帧差参考帧，
+使光照缓慢变化等仍被背景模型吸收。
+
+以下情况不判为静止，照常完整检测：
+    关键帧（I 帧）及其后的第一帧
+    ROI 内有帧内编码宏块：新出现的目标无法从参考帧预测，编码器常用帧内编码，这些宏块没有运动矢量
+    （跳过块也会输出零矢量，因此帧间编码帧中未被任何矢量覆盖的宏块即帧内编码宏块）
+倍速跳帧时被跳过的各帧同样统计运动与帧内编码面积，累加后再判断采样帧是否静止。
+
+与逐帧检测仍可能不同的情况：运动矢量小于 MV_MIN_MAGNITUDE、面积小于 MV_MIN_AREA 的缓慢变化被判为静止；
+静止帧只每 MV_REFRESH_FRAMES 帧更新一次背景模型，运动开始时的背景模型与帧差参考帧比逐帧检测旧，
+截图帧号可能相差一两帧。
+
+未安装 PyAV、或文件无法用 PyAV 打开时回退到 OpenCV 逐帧检测，结果与未开启时相同。
+"""
+import importlib.util
+import logging
+from typing import Callable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from config import MV_MIN_MAGNITUDE, MV_MIN_AREA, TARGET_HEIGHT
+
+logger = logging.getLogger(__name__)
+
+_AV_PICTURE_TYPE_I = 1
+_MB_SIZE = 16  # 帧内编码判断的网格边长（H.264 / MPEG-4 宏块大小）
+_warned_missing = False
+
+
+def available() -> bool:
+    """是否安装了 PyAV（不实际导入）"""
+    return importlib.util.find_spec("av") is not None
+
+
+class MotionVectorCapture:
+    """基于 PyAV 的读取器，提供检测流程用到的 cv2.VideoCapture 接口子集，并可取出当前帧的运动矢量"""
+
+    def __init__(self, path: str):
+        import av
+        self.path = path
+        self._av = av
+        self._container = None
+        self.on_grab: Optional[Callable[[], None]] = None  # 每成功解码一帧后回调（运动预筛选累计用）
+        self._open()
+        stream = self._stream
+        self.fps = float(stream.average_rate or 0)
+        self.width = stream.codec_context.width
+        self.height = stream.codec_context.height
+        self.frame_count = stream.frames
+        if not self.frame_count and self._container.duration and self.fps > 0:
+            # 部分容器不记录帧数，按时长估算（探测得到的实际帧数会覆盖该值）
+            self.frame_count = int(self._container.duration / 1e6 * self.fps)
+
+    def _open(self):
+        if self._container is not None:
+            self._container.close()
+        self._container = self._av.open(self.path)
+        self._stream = self._container.streams.video[0]
+        self._stream.codec_context.options = {"flags2": "+export_mvs"}
+        self._stream.thread_type = "AUTO"
+        self._decoder = self._container.decode(self._stream)
+        self._frame = None
+        self._pos = 0       # 下一次 grab 得到的帧序号
+        self._msec = 0.0
+
+    def isOpened(self) -> bool:
+        return self._container is not None
+
+    def get(self, prop: int) -> float:
+        values = {
+            cv2.CAP_PROP_FRAME_COUNT: self.frame_count,
+            cv2.CAP_PROP_FPS: self.fps,
+            cv2.CAP_PROP_FRAME_WIDTH: self.width,
+            cv2.CAP_PROP_FRAME_HEIGHT: self.height,
+            cv2.CAP_PROP_POS_FRAMES: self._pos,
+            cv2.CAP_PROP_POS_MSEC: self._msec,
+        }
+        return float(values.get(prop, 0.0))
+
+    def set(self, prop: int, value: float) -> bool:
+        """只支持按帧号定位：向后定位逐帧解码丢弃（不转换颜色），向前定位重新打开"""
+        if prop != cv2.CAP_PROP_POS_FRAMES:
+            return False
+        target = max(0, int(value))
+        if target < self._pos:
+            self._open()
+        while self._pos < target:
+            if not self.grab():
+                return False
+        return True
+
+    def grab(self) -> bool:
+        try:
+            self._frame = next(self._decoder)
+        except StopIteration:
+            self._frame = None
+            return False
+        except Exception as e:
+            logger.warning(f"PyAV 解码失败 {self.path}: {e}")
+            self._frame = None
+            return False
+        self._pos += 1
+        if self._frame.time is not None:
+            self._msec = self._frame.time * 1000.0
+        if self.on_grab is not None:
+            self.on_grab()  # 包括 set() 定位时逐帧跳过的帧，供预筛选累计被跳过帧的运动
+        return True
+
+    def retrieve(self) -> Tuple[bool, Optional[np.ndarray]]:
+        if self._frame is None:
+            return False, None
+        return True, self._frame.to_ndarray(format="bgr24")
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        return self.retrieve() if self.grab() else (False, None)
+
+    def motion_vectors(self) -> Optional[np.ndarray]:
+        """当前帧的运动矢量（结构化数组）；关键帧返回 None，帧间编码帧没有运动矢量（全部宏块帧内编码）时返回 None 之外的空数组"""
+        frame = self._frame
+        if frame is None or frame.key_frame or int(frame.pict_type) == _AV_PICTURE_TYPE_I:
+            return None
+        side = frame.side_data.get("MOTION_VECTORS")
+        return side.to_ndarray() if side is not None else np.empty(0)
+
+    def release(self):
+        if self._container is not None:
+            self._container.close()
+            self._container = None
+
+
+def open_motion_capture(video_path: str) -> Optional[MotionVectorCapture]:
+    """用 PyAV 打开视频；未安装 PyAV 或打开失败时返回 None，由调用方回退到 OpenCV"""
+    global _warned_missing
+    if not available():
+        if not _warned_missing:
+            logger.warning("未安装 PyAV（pip install av），运动矢量预筛选不可用，按逐帧检测处理")
+            _warned_missing = True
+        return None
+    try:
+        return MotionVectorCapture(video_path)
+    except Exception as e:
+        logger.warning(f"PyAV 无法打开 {video_path}，按逐帧检测处理: {e}")
+        return None
+
+
+class MotionPrefilter:
+    """按 ROI 内运动宏块与帧内编码宏块的面积判断静止帧；roi_mask 可为任意分辨率，按比例映射
+
+    每次 grab（含倍速定位时跳过的帧）都累计一次，is_static() 按上次判断以来所有帧的累计结果判断当前采样帧。
+    """
+
+    def __init__(self, cap: MotionVectorCapture, roi_mask: Optional[np.ndarray] = None):
+        self.cap = cap
+        self.roi_mask = roi_mask
+        # 宏块面积换算到处理分辨率，与 MIN_AREA 同一尺度
+        scale = TARGET_HEIGHT / cap.height if TARGET_HEIGHT > 0 and cap.height > TARGET_HEIGHT else 1.0
+        self._area_scale = scale * scale
+        self._grid = (-(-max(1, cap.height) // _MB_SIZE), -(-max(1, cap.width) // _MB_SIZE))
+        self._roi_cells = None
+        if roi_mask is not None:
+            # 含任一 ROI 像素的网格计入
+            cells = cv2.resize((roi_mask > 0).astype(np.float32), self._grid[::-1], interpolation=cv2.INTER_AREA)
+            self._roi_cells = cells > 0
+        self.skipped = 0
+        self._area = 0.0
+        self._unknown = False
+        self._after_key = False
+        cap.on_grab = self.observe
+
+    def reset(self):
+        """清除累计（开始正式检测前调用，预热读取的帧不计入）"""
+        self._area = 0.0
+        self._unknown = False
+
+    def moving_area(self) -> Optional[float]:
+        """当前帧 ROI 内运动宏块与帧内编码宏块的面积（处理分辨率像素）；无法判断（关键帧）时返回 None"""
+        mvs = self.cap.motion_vectors()
+        if mvs is None:
+            return None
+        intra = self._intra_area(mvs)
+        if not len(mvs):
+            return intra
+        magnitude = np.hypot(mvs["motion_x"], mvs["motion_y"]) / np.maximum(mvs["motion_scale"], 1)
+        moving = mvs[magnitude >= MV_MIN_MAGNITUDE]
+        if self.roi_mask is not None and len(moving):
+            h, w = self.roi_mask.shape[:2]
+            xs = np.clip(moving["dst_x"].astype(np.int64) * w // max(1, self.cap.width), 0, w - 1)
+            ys = np.clip(moving["dst_y"].astype(np.int64) * h // max(1, self.cap.height), 0, h - 1)
+            moving = moving[self.roi_mask[ys, xs] > 0]
+        return float((moving["w"].astype(np.int64) * moving["h"]).sum()) * self._area_scale + intra
+
+    def _intra_area(self, mvs: np.ndarray) -> float:
+        """未被任何运动矢量覆盖的网格（帧内编码宏块）在 ROI 内的面积"""
+        gh, gw = self._grid
+        covered = np.zeros(self._grid, dtype=bool)
+        if len(mvs):
+            # dst_x / dst_y 为块中心；大于网格的块（HEVC 等）覆盖多个网格
+            half_w, half_h = mvs["w"].astype(np.int64) // 2, mvs["h"].astype(np.int64) // 2
+            x0 = np.clip((mvs["dst_x"] - half_w) // _MB_SIZE, 0, gw - 1)
+            x1 = np.clip((mvs["dst_x"] + half_w - 1) // _MB_SIZE, 0, gw - 1)
+            y0 = np.clip((mvs["dst_y"] - half_h) // _MB_SIZE, 0, gh - 1)
+            y1 = np.clip((mvs["dst_y"] + half_h - 1) // _MB_SIZE, 0, gh - 1)
+            single = (x0 == x1) & (y0 == y1)
+            covered[y0[single], x0[single]] = True
+            for a, b, c, d in zip(x0[~single], x1[~single], y0[~single], y1[~single]):
+                covered[c:d + 1, a:b + 1] = True
+        intra = ~covered
+        if self._roi_cells is not None:
+            intra &= self._roi_cells
+        return float(np.count_nonzero(intra)) * _MB_SIZE * _MB_SIZE * self._area_scale
+
+    def observe(self):
+        """每解码一帧调用一次（由读取器在 grab 后回调），累计到下一次 is_static() 判断"""
+        area = self.moving_area()
+        if area is None:
+            # 关键帧无法判断；其后的第一帧参考的是关键帧，同样不跳过
+            self._unknown = True
+            self._after_key = True
+            return
+        if self._after_key:
+            self._unknown = True
+            self._after_key = False
+        self._area += area
+
+    def is_static(self) -> bool:
+        """自上次判断以来（含倍速跳过的帧）的累计结果：运动与帧内编码面积都小于 MV_MIN_AREA 时为静止"""
+        static = not self._unknown and self._area < MV_MIN_AREA
+        self.reset()
+        self.skipped += static
+        return static
@@ -0,0 +1,445 @@
+# core/pipeline.py
+"""无界面检测流程：与界面共用预热、跳帧、背景复用与触发节流逻辑
+
+用法：
+    for event in iter_events("cam1.mp4", DetectionParams(speed=4)):
+        print(event.frame_id, event.timestamp, event.ratio, event.boxes)
+
+生成器按需拉取（消费端不取下一项时不会继续解码，天然背压），
+通过 cancel 事件或关闭生成器即可中止，视频句柄在 finally 中释放。
+"""
+import os
+import threading
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+from config import (
+    DEFAULT_GMM_VAR_THRESHOLD,
+    DEFAULT_FRAME_DIFF_THRESHOLD,
+    DEFAULT_MIN_INTERVAL,
+    DEDUP_ENABLED,
+    TARGET_HEIGHT,
+    GMM_PREHEAT_FRAMES,
+    SEGMENT_WARMUP_FRAMES,
+    BACKGROUND_REUSE,
+    METRICS_DECODE_STALL_SECONDS,
+    TRIGGER_CLOCK,
+    MV_PREFILTER_ENABLED,
+    MV_REFRESH_FRAMES,
+    CAPTURE_MODE,
+    ACTIVITY_ENABLED
+)
+from core import metrics
+from core.activity import ActivityMap
+from core.dedup import ScreenshotDeduper
+from core.mv_prefilter import MotionPrefilter, MotionVectorCapture, open_motion_capture
+from core.tracker import ObjectTracker, Track
+from core.video_processor import (VideoProcessor, BackgroundModelPool, DetectionPipeline, camera_group_key,
+                                  camera_pipeline)
+from core.zones import RoiZone, ZoneTrigger, build_zone_labels
+
+
+@dataclass
+class DetectionParams:
+    """检测参数；处理过程中修改 speed / min_interval 会在下一帧生效"""
+    gmm_var: int = DEFAULT_GMM_VAR_THRESHOLD
+    fd_var: int = DEFAULT_FRAME_DIFF_THRESHOLD
+    min_interval: float = DEFAULT_MIN_INTERVAL
+    change_threshold: Optional[float] = None     # None 表示仅按连通域面积判断
+    speed: int = 1
+    roi_zones: List[RoiZone] = field(default_factory=list)
+    zone_labels: Optional[np.ndarray] = None     # 已编码的区域标签图（优先于 roi_zones）
+    dedup: bool = DEDUP_ENABLED                  # 抑制与最近截图近似的触发
+    throttle_clock: str = TRIGGER_CLOCK          # 截图间隔按 video（视频内时间）或 wall（系统时间）计
+    motion_prefilter: bool = MV_PREFILTER_ENABLED  # 按编码运动矢量跳过静止帧（需要 PyAV，仅对视频路径生效）
+    capture_mode: str = CAPTURE_MODE             # frame: 逐帧触发截图 / track: 按目标跟踪，每个目标一张截图
+    pipeline: DetectionPipeline = field(default_factory=DetectionPipeline)  # 融合方式 / 形态学 / 连通域筛选（可按机位覆盖）
+    activity: bool = ACTIVITY_ENABLED            # 累计活动热力图与分钟活动时间线（session.activity）
+
+
+@dataclass
+class FrameResult:
+    """逐帧检测结果（界面预览 / 进度使用）"""
+    frame_id: int
+    total_frames: int
+    timestamp: float                 # 视频内时间（秒）
+    valid_change: bool
+    ratio: float
+    fg_mask: np.ndarray
+    frame: np.ndarray                # 原始解码帧（引用，未拷贝）
+    boxes: List[List[int]]           # 有效连通域 [x, y, w, h, area]（处理分辨率坐标）
+    triggered_zones: List[str]       # 非空表示本帧触发截图（按目标截图时始终为空）
+    finished_tracks: List[Track] = field(default_factory=list)  # 按目标截图：本帧结束的目标轨迹
+
+
+@dataclass
+class ChangeEvent:
+    """轻量事件记录"""
+    frame_id: int
+    timestamp: float
+    ratio: float
+    boxes: List[List[int]]
+    zones: List[str]
+    frame: Optional[np.ndarray] = None
+
+
+def open_video_capture(video_path: str) -> Tuple[Optional[cv2.VideoCapture], Optional[str]]:
+    """打开视频，返回 (cap, 错误信息)；Windows 下长路径自动加前缀重试"""
+    if not os.path.exists(video_path):
+        metrics.OPEN_ERRORS.labels("missing").inc()
+        return None, f"视频文件不存在: {video_path}"
+    try:
+        cap = cv2.VideoCapture(video_path)
+        if cap.isOpened():
+            return cap, None
+    except Exception:
+        pass
+    if os.name == 'nt':
+        try:
+            long_path = "\\\\?\\" + os.path.abspath(video_path)
+            cap = cv2.VideoCapture(long_path)
+            if cap.isOpened():
+                return cap, None
+        except Exception:
+            pass
+    metrics.OPEN_ERRORS.labels("open_failed").inc()
+    return None, f"无法打开视频: {os.path.basename(video_path)}"
+
+
+class DetectionSession:
+    """单个视频的检测会话：start() 完成打开、首帧读取与预热，frames() 逐帧产出结果
+
+    start_frame / end_frame 用于分段处理：预热使用 start_frame 之前的帧，检测范围为 [start_frame, end_frame)。
+    frame_count 为探测得到的实际帧数（core.probe），提供时代替容器头部声明的帧数。
+    """
+
+    def __init__(self, source: Union[str, cv2.VideoCapture], params: DetectionParams,
+                 pool: Optional[BackgroundModelPool] = None,
+                 cancel: Optional[threading.Event] = None,
+                 lock: Optional[threading.Lock] = None,
+                 name: Optional[str] = None,
+                 start_frame: int = 0,
+                 end_frame: Optional[int] = None,
+                 frame_count: Optional[int] = None):
+        self.params = params
+        self.frame_count = frame_count
+        self.start_frame = max(0, start_frame)
+        self.end_frame = end_frame
+        self.pool = pool
+        self.cancel = cancel
+        self.lock = lock if lock is not None else nullcontext()
+        if isinstance(source, str):
+            self.video_path = source
+            self.cap: Optional[cv2.VideoCapture] = None
+            self._owns_cap = True
+        else:
+            self.video_path = name or ""
+            self.cap = source
+            self._owns_cap = False
+        self.processor: Optional[VideoProcessor] = None
+        self.reused = False
+        self.deduper: Optional[ScreenshotDeduper] = None
+        self.prefilter: Optional[MotionPrefilter] = None
+        self.tracker: Optional[ObjectTracker] = None
+        self.activity: Optional[ActivityMap] = None
+        self.total_frames = 0
+        self.fps = 0.0
+        self._start_frame = 0
+        self._warmup_end = 0
+
+    def start(self) -> Optional[str]:
+        """打开视频并完成预热，失败时返回错误信息"""
+        if self.cap is None:
+            if self.params.motion_prefilter:
+                self.cap = open_motion_capture(self.video_path)
+            if self.cap is None:
+                self.cap, err = open_video_capture(self.video_path)
+                if err:
+                    return err
+
+        self.total_frames = self.frame_count or int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 0.0
+
+        with self.lock:
+            if self.start_frame > 0:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.start_frame)
+            ret, first_frame = self.cap.read()
+        if not ret:
+            metrics.OPEN_ERRORS.labels("first_frame").inc()
+            return f"无法读取首帧: {self.video_path}"
+
+        if TARGET_HEIGHT > 0 and first_frame.shape[0] > TARGET_HEIGHT:
+            scale = TARGET_HEIGHT / first_frame.shape[0]
+            new_w = int(first_frame.shape[1] * scale)
+            first_frame = cv2.resize(first_frame, (new_w, TARGET_HEIGHT), interpolation=cv2.INTER_AREA)
+
+        zone_labels = self.params.zone_labels
+        if zone_labels is None and self.params.roi_zones:
+            # 区域坐标按原始分辨率给出
+            h = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            w = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            zone_labels = build_zone_labels(self.params.roi_zones, (h, w))
+
+        pipeline = camera_pipeline(self.video_path, self.params.pipeline)
+        # 分段处理的中间段与前一段不连续，不复用背景模型
+        if BACKGROUND_REUSE and self.pool is not None and self.start_frame == 0:
+            group_key = camera_group_key(self.video_path, first_frame.shape[:2], zone_labels)
+            self.processor, self.reused = self.pool.acquire(
+                group_key,
+                gmm_var=self.params.gmm_var,
+                fd_var=self.params.fd_var,
+                zone_labels=zone_labels,
+                pipeline=pipeline
+            )
+        else:
+            self.processor = VideoProcessor(
+                gmm_var=self.params.gmm_var,
+                fd_var=self.params.fd_var,
+                zone_labels=zone_labels,
+                pipeline=pipeline
+            )
+            self.reused = False
+
+        processor = self.processor
+        self.tracker = ObjectTracker() if self.params.capture_mode == "track" else None
+        if self.params.activity:
+            duration = self.total_frames / self.fps if self.fps > 0 else 0.0
+            self.activity = ActivityMap(first_frame.shape[:2], background=first_frame.copy(), duration=duration)
+        if isinstance(self.cap, MotionVectorCapture):
+            self.prefilter = MotionPrefilter(self.cap, processor.roi_mask)
+        if self.reused:
+            # 同机位复用已预热的背景模型：只跳过预热本身。预热段的帧只读取不喂给模型，正式检测仍从第
+            # GMM_PREHEAT_FRAMES 帧开始，倍速采样网格与新建模型时相同，复用与否只影响背景模型的状态
+            for _ in range(GMM_PREHEAT_FRAMES - 1):  # 首帧已读取
+                with self.lock:
+                    if not self.cap.grab():
+                        break
+            self._start_frame = GMM_PREHEAT_FRAMES
+        else:
+            # === GMM 预热（不检测）===
+            # 分段处理的中间段从段首之前 SEGMENT_WARMUP_FRAMES 帧开始：先按整段视频的方式预热，
+            # 之后到段首的帧在 frames() 中照常检测但不输出，使背景模型与截图节流状态接近串行处理到该处时的状态
+            preheat_from = max(0, self.start_frame - max(SEGMENT_WARMUP_FRAMES, GMM_PREHEAT_FRAMES)) \
+                if self.start_frame > 0 else 0
+            self._warmup_end = self.start_frame
+            with self.lock:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, preheat_from)
+            # 预热阶段：读取前 N 帧，逐帧喂给 GMM
+            for _ in range(GMM_PREHEAT_FRAMES):
+                with self.lock:
+                    ret, frame = self.cap.read()
+                if not ret:
+                    break
+                _, gray = processor.preprocess_frame(frame)
+                processor.update_background(gray)
+            processor.mark_preheated()
+            # 预热结束，从预热段之后开始正式检测
+            self._start_frame = preheat_from + GMM_PREHEAT_FRAMES
+        return None
+
+    def frames(self) -> Iterator[FrameResult]:
+        """逐帧产出检测结果（需先调用 start）"""
+        params = self.params
+        processor = self.processor
+        total_frames = self.total_frames
+        end_frame = min(self.end_frame, total_frames) if self.end_frame is not None else total_frames
+        zone_trigger = ZoneTrigger(params.roi_zones, params.min_interval, params.change_threshold)
+        tracker = self.tracker
+        # 按目标截图时每个目标只输出一张，去重与截图间隔都不再需要
+        self.deduper = deduper = ScreenshotDeduper() if params.dedup and tracker is None else None
+        frame_id = self._start_frame
+        last_frame_id = frame_id
+        warmup_end = self._warmup_end
+        # 指标子项提前取出，循环内只做加法
+        decode_hist = metrics.STAGE_SECONDS.labels("decode")
+        detect_hist = metrics.STAGE_SECONDS.labels("detect")
+        trigger_hist = metrics.STAGE_SECONDS.labels("trigger")
+        skipped = metrics.DROPPED_FRAMES.labels("skip")
+        prefiltered = metrics.DROPPED_FRAMES.labels("static")
+        prefilter = self.prefilter
+        if prefilter is not None:
+            prefilter.reset()  # 预热读取的帧不计入第一帧的静止判断
+        activity = self.activity
+        static_run = 0
+        video_triggers = 0
+        video_start = time.perf_counter()
+        first_frame_id = frame_id
+        result = "closed"
+        metrics.ACTIVE_VIDEOS.inc()
+        try:
+            while frame_id < end_frame:
+                if self.cancel is not None and self.cancel.is_set():
+                    break
+
+                # 跳帧
+                t0 = time.perf_counter()
+                speed = params.speed
+                if speed > 1:
+                    next_frame = min(frame_id + speed, end_frame - 1)
+                    with self.lock:
+                        self.cap.set(cv2.CAP_PROP_POS_FRAMES, next_frame)
+                        ret, frame = self.cap.read() if prefilter is None else (self.cap.grab(), None)
+                    if next_frame > frame_id:
+                        skipped.inc(next_frame - frame_id)
+                    frame_id = next_frame + 1
+                else:
+                    with self.lock:
+                        ret, frame = self.cap.read() if prefilter is None else (self.cap.grab(), None)
+                    frame_id += 1
+                t1 = time.perf_counter()
+                decode_hist.observe(t1 - t0)
+                if t1 - t0 > METRICS_DECODE_STALL_SECONDS:
+                    metrics.DECODE_STALLS.inc()
+                if not ret:
+                    metrics.DROPPED_FRAMES.labels("read_error").inc(max(0, end_frame - frame_id + 1))
+                    break
+                timestamp = self._timestamp(frame_id)
+
+                # 运动矢量预筛选：静止帧不转换颜色、不检测；每段连续静止的第一帧及之后每 N 帧更新背景模型，
+                # 保证下一个运动帧有可用的帧差参考帧。静止段之后第一个非静止帧（含帧内编码宏块、关键帧后一帧、
+                # 倍速跳过的帧中有运动）总是完整检测
+                if prefilter is not None:
+                    static = prefilter.is_static()
+                    static_run = static_run + 1 if static else 0
+                    if static and activity is not None and frame_id > warmup_end:
+                        activity.add_static(timestamp)
+                    if static and (static_run - 1) % max(1, MV_REFRESH_FRAMES):
+                        prefiltered.inc()
+                        continue
+                    with self.lock:
+                        ret, frame = self.cap.retrieve()
+                    if not ret:
+                        # 取得了数据包但解码失败：与读帧失败同样处理，不把 None 交给预处理
+                        metrics.DROPPED_FRAMES.labels("read_error").inc(max(0, end_frame - frame_id + 1))
+                        break
+                    if static:
+                        _, gray = processor.preprocess_frame(frame)
+                        processor.refresh_background(gray, stride=frame_id - last_frame_id)
+                        last_frame_id = frame_id
+                        prefiltered.inc()
+                        continue
+
+                # 预处理 + 检测（按实际采样步长换算学习率）
+                _, gray = processor.preprocess_frame(frame)
+                valid_change, fg_mask, change_ratio = processor.detect_change(gray, stride=frame_id - last_frame_id)
+                last_frame_id = frame_id
+                t2 = time.perf_counter()
+                detect_hist.observe(t2 - t1)
+                if processor.last_rejection is not None:
+                    metrics.GLOBAL_REJECTIONS.labels(processor.last_rejection).inc()
+
+                # 触发判断（各区域独立节流）
+                zone_trigger.min_interval = params.min_interval
+                # 按视频内时间节流：截图数量只取决于画面内容，不随倍速、机器快慢或并行方式变化
+                now = timestamp if params.throttle_clock == "video" else time.time()
+                finished: List[Track] = []
+                if tracker is not None:
+                    if frame_id > warmup_end:
+                        zones = zone_trigger.qualifying(processor, valid_change, change_ratio)
+                        finished = tracker.update(frame_id, timestamp, processor.components if zones else [],
+                                                  zones, frame, fg_mask.shape, change_ratio)
+                    triggered = []
+                else:
+                    triggered = zone_trigger.evaluate(processor, valid_change, change_ratio, now)
+                if triggered and deduper is not None and deduper.is_duplicate(gray, processor.components):
+                    triggered = []
+                trigger_hist.observe(time.perf_counter() - t2)
+                if frame_id <= warmup_end:
+                    # 分段预热：截图节流与去重状态按上一段末尾的触发更新，本段不输出这些帧
+                    continue
+                metrics.FRAMES.inc()
+                metrics.LAST_FRAME_TIME.set(time.time())
+                if triggered or finished:
+                    video_triggers += len(finished) or 1
+                    metrics.TRIGGERS.inc(len(finished) or 1)
+                if activity is not None:
+                    activity.update(fg_mask, timestamp, change_ratio, valid_change,
+                                    len(finished) or (1 if triggered else 0))
+
+                yield FrameResult(
+                    frame_id=frame_id,
+                    total_frames=total_frames,
+                    timestamp=timestamp,
+                    valid_change=valid_change,
+                    ratio=change_ratio,
+                    fg_mask=fg_mask,
+                    frame=frame,
+                    boxes=processor.components,
+                    triggered_zones=triggered,
+                    finished_tracks=finished
+                )
+            result = "cancelled" if self.cancel is not None and self.cancel.is_set() else "done"
+        finally:
+            metrics.ACTIVE_VIDEOS.dec()
+            metrics.VIDEOS.labels(result).inc()
+            metrics.TRIGGERS_PER_VIDEO.observe(video_triggers)
+            elapsed = time.perf_counter() - video_start
+            if elapsed > 0:
+                metrics.VIDEO_FPS.set((last_frame_id - first_frame_id) / elapsed)
+            self.close()
+
+    def flush_tracks(self) -> List[Track]:
+        """按目标截图：视频结束（或中止）后取出仍在画面中的目标轨迹"""
+        if self.tracker is None:
+            return []
+        finished = self.tracker.flush()
+        metrics.TRIGGERS.inc(len(finished))
+        return finished
+
+    def close(self):
+        """释放自行打开的视频句柄"""
+        if self._owns_cap and self.cap is not None:
+            with self.lock:
+                if self.cap.isOpened():
+                    self.cap.release()
+            self.cap = None
+
+    def _timestamp(self, frame_id: int) -> float:
+        pos_msec = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+        if pos_msec > 0:
+            return pos_msec / 1000.0
+        # frame_id 为已读取的帧数，刚读出的帧序号为 frame_id - 1（与 POS_MSEC 一致：第 0 帧为 0 秒）
+        return (frame_id - 1) / self.fps if self.fps > 0 else 0.0
+
+
+def iter_events(source: Union[str, cv2.VideoCapture], params: Optional[DetectionParams] = None,
+                pool: Optional[BackgroundModelPool] = None,
+                cancel: Optional[threading.Event] = None,
+                with_frames: bool = False) -> Iterator[ChangeEvent]:
+    """逐个产出触发事件；with_frames=True 时附带原始帧引用"""
+    session = DetectionSession(source, params or DetectionParams(), pool=pool, cancel=cancel)
+    err = session.start()
+    if err:
+        session.close()
+        raise IOError(err)
+    for result in session.frames():
+        if result.triggered_zones:
+            yield ChangeEvent(
+                frame_id=result.frame_id,
+                timestamp=result.timestamp,
+                ratio=result.ratio,
+                boxes=result.boxes,
+                zones=result.triggered_zones,
+                frame=result.frame if with_frames else None
+            )
+        for track in result.finished_tracks:
+            yield _track_event(track, with_frames)
+    for track in session.flush_tracks():
+        yield _track_event(track, with_frames)
+
+
+def _track_event(track: Track, with_frames: bool) -> ChangeEvent:
+    """按目标截图：以目标面积最大的一帧作为事件"""
+    return ChangeEvent(
+        frame_id=track.best_frame_id,
+        timestamp=track.best_time,
+        ratio=track.best_ratio,
+        boxes=[track.best_box],
+        zones=track.zones or [""],
+        frame=track.best_frame if with_frames else None
+    )
@@ -0,0 +1,231 @@
+# core/probe.py
+"""视频元数据探测：时长、帧率、实际帧数、分辨率、编码与 GOP，结果按 (路径, 大小, 修改时间) 持久缓存
+
+FLV / MKV / 可变帧率文件的 CAP_PROP_FRAME_COUNT 经常不准，导致检测循环提前结束或反复读失败。
+探测以原始包模式（CAP_PROP_FORMAT = -1）逐包读取，只解复用不解码，实际帧数与关键帧间隔都由包计数得到；
+不解码但仍要把整个文件读一遍，耗时取决于文件大小与存储读取速度（NAS 上的 GB 级录像需要数秒到数十秒）。
+原始包模式不可用时退回容器头部信息。
+
+    index = ProbeIndex(os.path.join(save_path, PROBE_INDEX_NAME))
+    infos = probe_all(paths, index)       # 线程池并行，未变化的文件直接取缓存；全部探测完才返回
+    probes = ProbePrefetch(paths, index)  # 后台探测，处理第 i 个视频前只等待 probes.get(i)
+"""
+import json
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+
+from config import PROBE_WORKERS
+
+logger = logging.getLogger(__name__)
+
+ProbeKey = Tuple[str, int, int]
+
+
+def probe_key(path: str) -> ProbeKey:
+    """(绝对路径, 大小, 修改时间 ns)：文件被追加或替换后重新探测"""
+    st = os.stat(path)
+    return os.path.abspath(path), st.st_size, st.st_mtime_ns
+
+
+@dataclass
+class VideoInfo:
+    path: str
+    size: int
+    mtime_ns: int
+    fps: float = 0.0
+    frame_count: int = 0            # 实际帧数（逐包计数；退回头部信息时与 header_frames 相同）
+    header_frames: int = 0          # 容器头部声明的帧数
+    duration: float = 0.0           # 秒
+    width: int = 0
+    height: int = 0
+    codec: str = ""
+    gop: int = 0                    # 关键帧平均间隔（帧），0 表示未知
+    error: Optional[str] = None
+
+    @property
+    def key(self) -> ProbeKey:
+        return self.path, self.size, self.mtime_ns
+
+    @property
+    def header_mismatch(self) -> bool:
+        return self.error is None and self.frame_count != self.header_frames
+
+
+def _fourcc(value: float) -> str:
+    code = int(value)
+    return "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00 ") if code > 0 else ""
+
+
+def probe_video(path: str) -> VideoInfo:
+    """探测单个视频；失败时 error 非空（不抛出异常）"""
+    try:
+        abs_path, size, mtime_ns = probe_key(path)
+    except OSError as e:
+        return VideoInfo(os.path.abspath(path), 0, 0, error=f"无法访问: {e}")
+    info = VideoInfo(abs_path, size, mtime_ns)
+
+    raw = True
+    cap = cv2.VideoCapture(abs_path, cv2.CAP_FFMPEG, [cv2.CAP_PROP_FORMAT, -1])
+    if not cap.isOpened():
+        # 非 FFmpeg 后端（或旧版 OpenCV）无法读取原始包，退回普通打开方式，只取头部信息
+        raw = False
+        cap = cv2.VideoCapture(abs_path)
+        if not cap.isOpened():
+            info.error = f"无法打开视频: {os.path.basename(path)}"
+            return info
+    try:
+        info.fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        info.header_frames = max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+        info.width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        info.height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        info.codec = _fourcc(cap.get(cv2.CAP_PROP_FOURCC))
+        if not raw:
+            info.frame_count = info.header_frames
+            info.duration = info.frame_count / info.fps if info.fps > 0 else 0.0
+            return info
+
+        count = keyframes = 0
+        last_msec = 0.0
+        while cap.grab():
+            count += 1
+            if cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME) > 0:
+                keyframes += 1
+            last_msec = cap.get(cv2.CAP_PROP_POS_MSEC)
+        info.frame_count = count
+        info.gop = round(count / keyframes) if keyframes else 0
+        # 可变帧率时以最后一帧的时间戳为准
+        frame_time = 1.0 / info.fps if info.fps > 0 else 0.0
+        info.duration = last_msec / 1000.0 + frame_time if last_msec > 0 else count * frame_time
+    finally:
+        cap.release()
+    return info
+
+
+class ProbeIndex:
+    """元数据索引（JSON Lines，追加写入，同一文件以最后一行为准）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._infos: Dict[ProbeKey, VideoInfo] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        info = VideoInfo(**json.loads(line))
+                    except (ValueError, TypeError):
+                        continue  # 容忍异常退出时写了一半的行，以及旧版本字段
+                    self._infos[info.key] = info
+
+    def __len__(self) -> int:
+        return len(self._infos)
+
+    def get(self, path: str) -> Optional[VideoInfo]:
+        try:
+            return self._infos.get(probe_key(path))
+        except OSError:
+            return None
+
+    def add(self, infos: Sequence[VideoInfo]):
+        # 打开失败的结果不缓存：可能只是文件仍在写入或存储暂时不可用
+        infos = [info for info in infos if info.error is None]
+        if not infos:
+            return
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                for info in infos:
+                    f.write(json.dumps(asdict(info), ensure_ascii=False) + "\n")
+            for info in infos:
+                self._infos[info.key] = info
+
+
+def probe_all(paths: Sequence[str], index: Optional[ProbeIndex] = None,
+              workers: int = PROBE_WORKERS) -> List[VideoInfo]:
+    """按输入顺序返回各视频的元数据；已在索引中且未变化的文件不再探测"""
+    results: List[Optional[VideoInfo]] = [index.get(p) if index is not None else None for p in paths]
+    todo = [i for i, info in enumerate(results) if info is None]
+    if todo:
+        # OpenCV 读取时释放 GIL，线程池即可并行
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(todo)))) as executor:
+            for i, info in zip(todo, executor.map(probe_video, [paths[i] for i in todo])):
+                results[i] = info
+        if index is not None:
+            index.add([results[i] for i in todo])
+    for info in results:
+        if info.header_mismatch:
+            logger.info(f"容器声明帧数与实际不符: {info.path}（声明 {info.header_frames}，实际 {info.frame_count}）")
+    logger.info(f"元数据探测: {len(paths)} 个视频，新探测 {len(todo)} 个，缓存命中 {len(paths) - len(todo)} 个")
+    return results
+
+
+class ProbePrefetch:
+    """后台按输入顺序探测，处理不必等待全部文件读完：get(i) 只等第 i 个视频，其余文件在处理期间逐包计数"""
+
+    def __init__(self, paths: Sequence[str], index: Optional[ProbeIndex] = None, workers: int = PROBE_WORKERS):
+        self.paths = list(paths)
+        self.index = index
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="探测")
+        self._futures: List[Future] = []
+        cached = 0
+        for path in self.paths:
+            info = index.get(path) if index is not None else None
+            if info is None:
+                future = self._executor.submit(self._probe, path)
+            else:
+                future = Future()
+                future.set_result(info)
+                cached += 1
+            self._futures.append(future)
+        logger.info(f"元数据探测: {len(self.paths)} 个视频，后台探测 {len(self.paths) - cached} 个，缓存命中 {cached} 个")
+
+    def _probe(self, path: str) -> VideoInfo:
+        info = probe_video(path)
+        if self.index is not None:
+            self.index.add([info])
+        return info
+
+    def get(self, i: int) -> VideoInfo:
+        """第 i 个视频的元数据（尚未探测完时等待）"""
+        info = self._futures[i].result()
+        if info.header_mismatch:
+            logger.info(f"容器声明帧数与实际不符: {info.path}（声明 {info.header_frames}，实际 {info.frame_count}）")
+        return info
+
+    def _frames_per_byte(self) -> float:
+        known = [f.result() for f in self._futures if f.done() and not f.cancelled()]
+        known = [info for info in known if info.frame_count and info.size]
+        return sum(info.frame_count for info in known) / sum(info.size for info in known) if known else 0.0
+
+    def estimated_frames(self, i: int, rate: Optional[float] = None) -> int:
+        """已探测的返回实际帧数；未探测完的按已探测文件的每字节帧数与文件大小估算（没有可参照的文件时为 0）"""
+        future = self._futures[i]
+        if future.done() and not future.cancelled():
+            return future.result().frame_count
+        rate = self._frames_per_byte() if rate is None else rate
+        if rate <= 0:
+            return 0
+        try:
+            return round(os.path.getsize(self.paths[i]) * rate)
+        except OSError:
+            return 0
+
+    def estimated_total(self, stop: Optional[int] = None) -> int:
+        """前 stop 个视频（默认全部）的帧数之和，未探测完的按大小估算"""
+        rate = self._frames_per_byte()
+        return sum(self.estimated_frames(i, rate) for i in range(len(self.paths) if stop is None else stop))
+
+    def close(self):
+        """放弃尚未开始的探测（已开始的文件读完后结束）"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def format_eta(seconds: float) -> str:
+    seconds = max(0, int(seconds))
+    hours, rest = divmod(seconds, 3600)
+    return f"{hours}:{rest // 60:02d}:{rest % 60:02d}" if hours else f"{rest // 60:02d}:{rest % 60:02d}"
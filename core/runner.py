@@ -0,0 +1,205 @@
+# core/runner.py
+"""无界面单视频处理：检测 + 截图写入，供命令行、监视目录守护进程等复用"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Optional, TextIO
+
+from config import SCREENSHOT_MODE, SCREENSHOT_MAX_DIM, SCREENSHOT_STORE, TRACK_RECORD_SUFFIX
+from core.eventdb import EventIndex, recording_start
+from core.governor import ResourceGovernor
+from core.memory import MemoryMonitor
+from core.pipeline import DetectionParams, DetectionSession
+from core.screenshot import render_screenshot, safe_basename
+from core.store import ScreenshotSink, ScreenshotWriter
+from core.tracker import Track
+from core.video_processor import BackgroundModelPool
+
+logger = logging.getLogger(__name__)
+
+
+def process_video(video_path: str, params: DetectionParams, save_path: str,
+                  screenshot_mode: str = SCREENSHOT_MODE,
+                  max_dim: int = SCREENSHOT_MAX_DIM,
+                  pool: Optional[BackgroundModelPool] = None,
+                  cancel: Optional[threading.Event] = None,
+                  start_frame: int = 0,
+                  end_frame: Optional[int] = None,
+                  on_event: Optional[Callable[[dict], None]] = None,
+                  on_progress: Optional[Callable[[int, int], None]] = None,
+                  memory: Optional[MemoryMonitor] = None,
+                  sink: Optional[ScreenshotSink] = None,
+                  frame_count: Optional[int] = None,
+                  governor: Optional[ResourceGovernor] = None,
+                  event_index: Optional[EventIndex] = None) -> dict:
+    """处理单个视频（或其中 [start_frame, end_frame) 一段）并保存截图，返回处理摘要（失败时包含 error）
+
+    on_event(event) 在每张截图写入后调用；on_progress(帧号, 总帧数) 每处理一帧调用一次。
+    提供 memory 时记录本视频的内存增量并检查预算，摘要中 over_budget 表示释放缓存后仍超出预算。
+    sink 为截图输出后端，默认按 SCREENSHOT_STORE 写入 save_path；frame_count 为探测得到的实际帧数。
+    按目标截图（params.capture_mode="track"）时每个目标在离开后保存一张截图，事件附带 track 轨迹记录，
+    轨迹记录同时写入 save_path 下的 {视频名}_目标.jsonl。
+    governor 为资源限制：逐帧按 CPU 预算控制节奏，不在运行时段内时在帧之间暂停。
+    event_index 为事件索引：截图事件按批写入，重新处理时先删除该视频（该段）的旧事件。
+    params.activity 开启时在 save_path 下写出活动热力图与分钟活动时间线（摘要 activity 为写入的文件）。
+    """
+    start = time.time()
+    summary = {"path": video_path, "frames": 0, "events": 0, "suppressed": 0, "error": None, "cancelled": False}
+    logger.info(f"开始处理视频: {video_path}")
+    if memory is not None:
+        memory.begin_video(video_path)
+
+    session = DetectionSession(video_path, params, pool=pool, cancel=cancel,
+                               start_frame=start_frame, end_frame=end_frame, frame_count=frame_count)
+    err = session.start()
+    if err:
+        session.close()
+        logger.error(err)
+        summary["error"] = err
+        _finish_memory(memory, video_path, summary)
+        return summary
+    if session.reused:
+        logger.info(f"复用同机位背景模型，跳过预热: {os.path.basename(video_path)}")
+
+    video_basename = os.path.splitext(os.path.basename(video_path))[0]
+    sink = sink or ScreenshotSink(save_path, SCREENSHOT_STORE)
+    try:
+        # 先于事件索引打开：失败时不删除该视频的旧事件（如已有归档损坏无法追加）
+        writer = sink.open(video_basename, part=start_frame)
+    except Exception as e:
+        session.close()
+        err = f"打开截图输出失败: {e}"
+        logger.error(err)
+        summary["error"] = err
+        _finish_memory(memory, video_path, summary)
+        return summary
+    recorder = None
+    if event_index is not None:
+        duration = session.total_frames / session.fps if session.fps > 0 else 0.0
+        try:
+            recorder = event_index.recorder(video_path, params, start_frame, end_frame, duration)
+        except Exception as e:
+            logger.error(f"打开事件索引失败，本视频不写入索引: {e}")
+    if recorder is not None:
+        user_callback = on_event
+
+        def on_event(event: dict):
+            recorder.add(event)
+            if user_callback is not None:
+                user_callback(event)
+    track_file = _open_track_file(save_path, video_basename, start_frame) if session.tracker is not None else None
+    try:
+        with writer:
+            for result in session.frames():
+                summary["frames"] += 1
+                if governor is not None:
+                    governor.pace(cancel)
+                if on_progress is not None:
+                    on_progress(result.frame_id, result.total_frames)
+                for track in result.finished_tracks:
+                    _save_track(track, writer, track_file, summary, screenshot_mode, max_dim, on_event)
+                if result.triggered_zones:
+                    _save_frame(result, writer, summary, screenshot_mode, max_dim, on_event)
+            for track in session.flush_tracks():
+                _save_track(track, writer, track_file, summary, screenshot_mode, max_dim, on_event)
+    finally:
+        if track_file is not None:
+            track_file.close()
+        if recorder is not None:
+            recorder.close()
+
+    if session.activity is not None:
+        summary["activity"] = save_activity(session, save_path, video_basename, start_frame)
+    summary["cancelled"] = cancel is not None and cancel.is_set()
+    if session.deduper is not None:
+        summary["suppressed"] = session.deduper.suppressed
+    summary["elapsed"] = round(time.time() - start, 3)
+    logger.info(f"视频处理完成: {video_path}，截图 {summary['events']} 张，用时 {summary['elapsed']:.1f} 秒")
+    if governor is not None and governor.enabled:
+        governor.report()
+    _finish_memory(memory, video_path, summary)
+    return summary
+
+
+def _save_frame(result, writer: ScreenshotWriter, summary: dict, screenshot_mode: str, max_dim: int,
+                on_event: Optional[Callable[[dict], None]]):
+    image = render_screenshot(result.frame, result.boxes, result.fg_mask.shape,
+                              mode=screenshot_mode, max_dim=max_dim)
+    try:
+        location = writer.write(result.frame_id, result.timestamp, result.ratio, image,
+                                result.triggered_zones)
+    except Exception as e:
+        logger.error(f"保存截图失败: {str(e)}")
+        return
+    summary["events"] += 1
+    logger.info(f"截图已保存: {location}")
+    if on_event is not None:
+        on_event({
+            "frame_id": result.frame_id,
+            "timestamp": round(result.timestamp, 3),
+            "ratio": round(result.ratio, 6),
+            "boxes": [[int(v) for v in box] for box in result.boxes],
+            "zones": [z for z in result.triggered_zones if z],
+            "screenshot": location
+        })
+
+
+def _save_track(track: Track, writer: ScreenshotWriter, track_file: Optional[TextIO], summary: dict,
+                screenshot_mode: str, max_dim: int, on_event: Optional[Callable[[dict], None]]):
+    """保存目标面积最大的一帧，并追加轨迹记录"""
+    image = render_screenshot(track.best_frame, [track.best_box], track.proc_shape,
+                              mode=screenshot_mode, max_dim=max_dim)
+    track.best_frame = None  # 截图已生成，尽早释放帧拷贝
+    record = track.record()
+    try:
+        record["screenshot"] = writer.write(track.best_frame_id, track.best_time, track.best_ratio, image,
+                                            track.zones)
+    except Exception as e:
+        logger.error(f"保存截图失败: {str(e)}")
+        record["screenshot"] = None
+    if track_file is not None:
+        track_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        track_file.flush()
+    if record["screenshot"] is None:
+        return
+    summary["events"] += 1
+    logger.info(f"目标 {track.id} 截图已保存: {record['screenshot']}"
+                f"（{track.enter_time:.1f}s - {track.exit_time:.1f}s，{track.hits} 帧）")
+    if on_event is not None:
+        on_event({
+            "frame_id": track.best_frame_id,
+            "timestamp": record["best_time"],
+            "ratio": record["best_ratio"],
+            "boxes": [record["best_box"]],
+            "zones": record["zones"],
+            "screenshot": record["screenshot"],
+            "track": record
+        })
+
+
+def save_activity(session: DetectionSession, save_path: str, video_basename: str, part: int = 0) -> list:
+    """写出活动热力图与时间线，返回写入的文件路径（失败时记录错误并返回空列表）"""
+    activity = session.activity
+    duration = session.total_frames / session.fps if session.fps > 0 else 0.0
+    try:
+        paths = activity.save(save_path, video_basename, part, recording_start(session.video_path, duration))
+    except Exception as e:
+        logger.error(f"保存活动热力图失败: {str(e)}")
+        return []
+    logger.info(f"活动热力图已保存: {paths[0]}（{activity.frames} 帧）")
+    return paths
+
+
+def _open_track_file(save_path: str, video_basename: str, part: int) -> TextIO:
+    """每个视频（分段处理时每段）一个轨迹记录文件，重新处理时覆盖"""
+    name = safe_basename(video_basename) + (f"_{part}" if part else "") + TRACK_RECORD_SUFFIX
+    return open(os.path.join(save_path, name), "w", encoding="utf-8")
+
+
+def _finish_memory(memory: Optional[MemoryMonitor], video_path: str, summary: dict):
+    if memory is None:
+        return
+    summary["rss"] = memory.end_video(video_path)
+    summary["over_budget"] = memory.over_budget(summary["rss"])
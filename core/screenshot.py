@@ -0,0 +1,113 @@
+# core/screenshot.py
+import math
+import time
+import cv2
+import numpy as np
+from typing import List, Sequence, Tuple
+from config import (
+    SCREENSHOT_MODE,
+    SCREENSHOT_CROP_PADDING,
+    SCREENSHOT_MAX_DIM,
+    SCREENSHOT_JPEG_QUALITY,
+    SCREENSHOT_SHEET_TILE_HEIGHT,
+    SCREENSHOT_SHEET_COLS
+)
+from core import metrics
+from core.dedup import union_box
+
+# 输出模式：完整画面 / 变化区域裁剪 / 拼图（全景 + 各变化区域）
+SCREENSHOT_MODES = ("full", "crop", "sheet")
+
+
+def _scale_boxes(boxes: Sequence[Sequence[int]], frame_shape: Tuple[int, int],
+                 proc_shape: Tuple[int, int]) -> List[List[int]]:
+    """处理分辨率下的 [x, y, w, h, ...] 换算到原始帧坐标"""
+    sy = frame_shape[0] / proc_shape[0]
+    sx = frame_shape[1] / proc_shape[1]
+    return [[int(b[0] * sx), int(b[1] * sy), int(math.ceil(b[2] * sx)), int(math.ceil(b[3] * sy))] for b in boxes]
+
+
+def _padded(frame: np.ndarray, box: Sequence[int], padding: int) -> np.ndarray:
+    """按外接矩形加边距裁剪（返回视图，不拷贝）"""
+    h, w = frame.shape[:2]
+    x, y, bw, bh = box[:4]
+    x0, y0 = max(0, x - padding), max(0, y - padding)
+    x1, y1 = min(w, x + bw + padding), min(h, y + bh + padding)
+    return frame[y0:y1, x0:x1]
+
+
+def limit_size(image: np.ndarray, max_dim: int) -> np.ndarray:
+    """长边超过 max_dim 时等比缩小（max_dim ≤ 0 不限制）"""
+    h, w = image.shape[:2]
+    if max_dim <= 0 or max(h, w) <= max_dim:
+        return image
+    scale = max_dim / max(h, w)
+    return cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+
+def make_contact_sheet(tiles: Sequence[np.ndarray], cols: int = SCREENSHOT_SHEET_COLS,
+                       tile_height: int = SCREENSHOT_SHEET_TILE_HEIGHT) -> np.ndarray:
+    """把若干图块缩放到同一高度后按网格拼接"""
+    resized = []
+    for tile in tiles:
+        h, w = tile.shape[:2]
+        new_w = max(1, int(w * tile_height / h))
+        resized.append(cv2.resize(tile, (new_w, tile_height), interpolation=cv2.INTER_AREA))
+    cols = max(1, min(cols, len(resized)))
+    rows = [resized[i:i + cols] for i in range(0, len(resized), cols)]
+    sheet_w = max(sum(t.shape[1] for t in row) for row in rows)
+    sheet = np.zeros((tile_height * len(rows), sheet_w, 3), np.uint8)
+    for r, row in enumerate(rows):
+        x = 0
+        for tile in row:
+            sheet[r * tile_height:(r + 1) * tile_height, x:x + tile.shape[1]] = tile
+            x += tile.shape[1]
+    return sheet
+
+
+def render_screenshot(frame: np.ndarray, boxes: Sequence[Sequence[int]], proc_shape: Tuple[int, int],
+                      mode: str = SCREENSHOT_MODE, padding: int = SCREENSHOT_CROP_PADDING,
+                      max_dim: int = SCREENSHOT_MAX_DIM) -> np.ndarray:
+    """按输出模式生成截图图像；boxes 为处理分辨率（proc_shape）下的连通域外接矩形"""
+    if mode == "full" or not boxes:
+        return limit_size(frame, max_dim)
+    scaled = _scale_boxes(boxes, frame.shape[:2], proc_shape[:2])
+    if mode == "crop":
+        return limit_size(_padded(frame, union_box(scaled), padding), max_dim)
+    if mode == "sheet":
+        tiles = [frame] + [_padded(frame, box, padding) for box in scaled]
+        return limit_size(make_contact_sheet(tiles), max_dim)
+    raise ValueError(f"未知截图模式: {mode}")
+
+
+def safe_basename(video_basename: str) -> str:
+    """去除视频名中的特殊字符，用作输出文件名前缀"""
+    return "".join(c for c in video_basename if c.isalnum() or c in (' ', '-', '_')).rstrip()
+
+
+def screenshot_filename(video_basename: str, frame_num: int) -> str:
+    """截图文件名：{视频名}_frame_{帧号}.jpg（去除文件名中的特殊字符）"""
+    return f"{safe_basename(video_basename)}_frame_{frame_num}.jpg"
+
+
+def encode_jpeg(image: np.ndarray, quality: int = SCREENSHOT_JPEG_QUALITY, name: str = "") -> np.ndarray:
+    ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise IOError(f"JPEG 编码失败: {name}")
+    return buf
+
+
+def write_jpeg(path: str, image: np.ndarray, quality: int = SCREENSHOT_JPEG_QUALITY) -> int:
+    """编码并写入 JPEG（支持中文路径），返回写入字节数"""
+    start = time.perf_counter()
+    metrics.SCREENSHOT_PENDING.inc()
+    try:
+        buf = encode_jpeg(image, quality, path)
+        buf.tofile(path)
+    except Exception:
+        metrics.SCREENSHOT_ERRORS.inc()
+        raise
+    finally:
+        metrics.SCREENSHOT_PENDING.dec()
+    metrics.SCREENSHOT_SECONDS.observe(time.perf_counter() - start)
+    return buf.size
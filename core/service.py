@@ -0,0 +1,420 @@
+# core/service.py
+"""本机 HTTP 任务服务：其他系统无需安装界面即可提交视频检测，并查询进度、实时接收截图事件
+
+    POST   /jobs                提交任务 {"path", "gmm_var", "fd_var", "min_interval", "threshold", "speed",
+                                 "zones", "dedup", "throttle_clock", "capture_mode", "activity", "mode", "max_dim"}，返回 202 {"id"}；排队已满返回 503
+    GET    /jobs                任务列表
+    GET    /jobs/<id>           状态与进度
+    GET    /jobs/<id>/events    事件流：Accept: text/event-stream（或 ?format=sse）为 SSE，否则为 JSON Lines
+    DELETE /jobs/<id>           取消任务
+    GET    /metrics             运行指标（Prometheus 文本格式）
+
+固定数量的工作线程 + 有界排队队列：并发处理数与排队长度都有上限，过载时直接拒绝而不是无限堆积。
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence
+from urllib.parse import parse_qs, urlparse
+
+from config import (
+    SCREENSHOT_MODE,
+    SCREENSHOT_MAX_DIM,
+    SCREENSHOT_STORE,
+    SERVICE_MAX_WORKERS,
+    SERVICE_QUEUE_SIZE,
+    SERVICE_JOB_HISTORY,
+    SERVICE_JOB_HISTORY_RELIEF,
+    SERVICE_ALLOWED_DIRS,
+    MEMORY_BUDGET_MB
+)
+from core import metrics
+from core.eventdb import EventIndex
+from core.governor import ResourceGovernor
+from core.memory import MemoryMonitor
+from core.pipeline import DetectionParams
+from core.runner import process_video
+from core.screenshot import SCREENSHOT_MODES
+from core.store import ScreenshotSink
+from core.video_processor import BackgroundModelPool
+from core.zones import zone_from_dict
+
+logger = logging.getLogger(__name__)
+
+SSE_KEEPALIVE_SECONDS = 15.0
+
+QUEUE_DEPTH = metrics.REGISTRY.gauge("service_queue_depth", "排队等待处理的任务数")
+SUBMISSIONS = metrics.REGISTRY.counter("service_submissions_total", "任务提交次数（accepted / rejected / invalid）",
+                                       ("result",))
+
+
+class ServiceFull(Exception):
+    """排队队列已满"""
+
+
+class Job:
+    """单个检测任务的状态；events 只追加，流式接口按下标增量读取"""
+
+    FINISHED = ("done", "failed", "cancelled")
+
+    def __init__(self, path: str, params: DetectionParams, screenshot_mode: str, max_dim: int):
+        self.id = uuid.uuid4().hex[:12]
+        self.path = path
+        self.params = params
+        self.screenshot_mode = screenshot_mode
+        self.max_dim = max_dim
+        self.state = "queued"
+        self.frame_id = 0
+        self.total_frames = 0
+        self.events: List[dict] = []
+        self.error: Optional[str] = None
+        self.submitted = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.cancel = threading.Event()
+        self.cond = threading.Condition()
+
+    @property
+    def is_finished(self) -> bool:
+        return self.state in self.FINISHED
+
+    def add_event(self, event: dict):
+        with self.cond:
+            self.events.append(event)
+            self.cond.notify_all()
+
+    def set_progress(self, frame_id: int, total_frames: int):
+        # 进度只供状态查询，无需唤醒等待中的事件流
+        self.frame_id = frame_id
+        self.total_frames = total_frames
+
+    def set_state(self, state: str, error: Optional[str] = None):
+        with self.cond:
+            self.state = state
+            self.error = error
+            if state == "running":
+                self.started = time.time()
+            elif self.is_finished:
+                self.finished = time.time()
+            self.cond.notify_all()
+
+    def to_dict(self) -> dict:
+        progress = self.frame_id / self.total_frames if self.total_frames else 0.0
+        return {
+            "id": self.id,
+            "path": self.path,
+            "state": self.state,
+            "progress": round(min(1.0, progress), 4) if self.state != "done" else 1.0,
+            "frame": self.frame_id,
+            "total_frames": self.total_frames,
+            "events": len(self.events),
+            "error": self.error,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished
+        }
+
+
+def _parse_bool(value) -> bool:
+    """只接受 JSON 布尔值或字符串 "true" / "false"（bool("false") 为 True，不能直接转换）"""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in ("true", "false"):
+        return value.strip().lower() == "true"
+    raise ValueError(f"应为 true 或 false: {value!r}")
+
+
+def params_from_request(body: dict, defaults: DetectionParams) -> DetectionParams:
+    """请求中的参数覆盖服务默认参数；threshold 与命令行一致，单位为 %"""
+    changes = {}
+    for key, cast in (("gmm_var", int), ("fd_var", int), ("min_interval", float), ("speed", int),
+                      ("dedup", _parse_bool), ("activity", _parse_bool)):
+        if body.get(key) is not None:
+            changes[key] = cast(body[key])
+    if "speed" in changes:
+        changes["speed"] = max(1, changes["speed"])
+    if body.get("threshold") is not None:
+        changes["change_threshold"] = float(body["threshold"]) / 100
+    if body.get("throttle_clock") is not None:
+        if body["throttle_clock"] not in ("video", "wall"):
+            raise ValueError(f"未知计时方式: {body['throttle_clock']}")
+        changes["throttle_clock"] = body["throttle_clock"]
+    if body.get("capture_mode") is not None:
+        if body["capture_mode"] not in ("frame", "track"):
+            raise ValueError(f"未知截图方式: {body['capture_mode']}")
+        changes["capture_mode"] = body["capture_mode"]
+    if body.get("zones") is not None:
+        changes["roi_zones"] = [zone_from_dict(item, idx) for idx, item in enumerate(body["zones"], start=1)]
+        changes["zone_labels"] = None
+    return replace(defaults, **changes)
+
+
+class JobService:
+    """固定工作线程池 + 有界排队队列；每个工作线程保留自己的背景模型池"""
+
+    def __init__(self, save_path: str, defaults: Optional[DetectionParams] = None,
+                 max_workers: int = SERVICE_MAX_WORKERS,
+                 queue_size: int = SERVICE_QUEUE_SIZE,
+                 screenshot_mode: str = SCREENSHOT_MODE,
+                 max_dim: int = SCREENSHOT_MAX_DIM,
+                 store: str = SCREENSHOT_STORE,
+                 allowed_dirs: Sequence[str] = SERVICE_ALLOWED_DIRS,
+                 history: int = SERVICE_JOB_HISTORY,
+                 relief_history: int = SERVICE_JOB_HISTORY_RELIEF,
+                 memory_budget: float = MEMORY_BUDGET_MB,
+                 governor: Optional[ResourceGovernor] = None,
+                 event_index: Optional[EventIndex] = None):
+        self.save_path = save_path
+        self.governor = governor  # 各工作线程共用：CPU 预算按整个服务进程计算
+        self.event_index = event_index
+        self.defaults = defaults or DetectionParams()
+        self.screenshot_mode = screenshot_mode
+        self.max_dim = max_dim
+        self.sink = ScreenshotSink(save_path, store)
+        self.allowed_dirs = [os.path.realpath(d) for d in allowed_dirs]
+        self.history = history
+        self.relief_history = min(history, relief_history)
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[Optional[Job]]" = queue.Queue(maxsize=max(1, queue_size))
+        # 各线程的背景模型池在线程启动时注册；已结束任务的事件列表可在超出预算时丢弃
+        self.memory = MemoryMonitor(budget_mb=memory_budget)
+        self.memory.register_probe("queued_jobs", self._queue.qsize)
+        self.memory.register_probe("retained_events", lambda: sum(len(j.events) for j in self.list_jobs()))
+        self.memory.register_relief("job_history", self._drop_history)
+        self._workers = [threading.Thread(target=self._worker_loop, name=f"检测线程-{i}", daemon=True)
+                         for i in range(max(1, max_workers))]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, body: dict) -> Job:
+        """校验并加入排队队列；参数错误抛出 ValueError，队列已满抛出 ServiceFull"""
+        path = body.get("path")
+        if not isinstance(path, str) or not path:
+            raise ValueError("缺少视频路径 path")
+        path = os.path.realpath(path)
+        if self.allowed_dirs and not any(os.path.commonpath([path, d]) == d for d in self.allowed_dirs):
+            raise PermissionError(f"不允许访问该路径: {path}")
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"视频文件不存在: {path}")
+        mode = body.get("mode") or self.screenshot_mode
+        if mode not in SCREENSHOT_MODES:
+            raise ValueError(f"未知截图模式: {mode}")
+        try:
+            params = params_from_request(body, self.defaults)
+            max_dim = int(body.get("max_dim", self.max_dim))
+        except (TypeError, KeyError) as e:
+            raise ValueError(f"参数格式错误: {e}")
+
+        job = Job(path, params, mode, max_dim)
+        with self._lock:
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                SUBMISSIONS.labels("rejected").inc()
+                raise ServiceFull(f"排队任务已达上限 {self._queue.maxsize}")
+            self.jobs[job.id] = job
+            self._trim_history()
+        SUBMISSIONS.labels("accepted").inc()
+        QUEUE_DEPTH.set(self._queue.qsize())
+        logger.info(f"收到任务 {job.id}: {path}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list_jobs(self) -> List[Job]:
+        with self._lock:
+            return list(self.jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self.get(job_id)
+        if job is not None and not job.is_finished:
+            job.cancel.set()
+            if job.state == "queued":
+                job.set_state("cancelled")
+        return job
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def shutdown(self):
+        """取消未完成的任务并等待工作线程退出"""
+        for job in self.list_jobs():
+            job.cancel.set()
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+
+    def _drop_history(self):
+        """超出内存预算时把已结束任务缩减到 relief_history 个；最近结束的任务仍可查询"""
+        with self._lock:
+            self._trim_history(self.relief_history)
+
+    def _trim_history(self, keep: Optional[int] = None):
+        """按提交顺序清除最早的已结束任务，只保留 keep 个（默认 history）"""
+        keep = self.history if keep is None else keep
+        finished = [job_id for job_id, job in self.jobs.items() if job.is_finished]
+        for job_id in finished[:max(0, len(finished) - keep)]:
+            del self.jobs[job_id]
+
+    def _worker_loop(self):
+        pool = BackgroundModelPool()
+        self.memory.track_pool(pool, f"background_models_{threading.current_thread().name}")
+        while True:
+            job = self._queue.get()
+            QUEUE_DEPTH.set(self._queue.qsize())
+            if job is None:
+                return
+            if job.cancel.is_set():
+                job.set_state("cancelled")
+                continue
+            job.set_state("running")
+            try:
+                summary = process_video(job.path, job.params, self.save_path,
+                                        screenshot_mode=job.screenshot_mode, max_dim=job.max_dim,
+                                        pool=pool, cancel=job.cancel,
+                                        on_event=job.add_event, on_progress=job.set_progress,
+                                        memory=self.memory, sink=self.sink, governor=self.governor,
+                                        event_index=self.event_index)
+            except Exception as e:
+                logger.exception(f"任务 {job.id} 处理出错")
+                job.set_state("failed", str(e))
+                continue
+            if summary["error"]:
+                job.set_state("failed", summary["error"])
+            elif summary["cancelled"]:
+                job.set_state("cancelled")
+            else:
+                job.set_state("done")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # HTTP/1.0：流式响应以关闭连接结束，无需分块编码
+    server_version = "ChangeDetection/1.0"
+    service: JobService = None
+
+    def log_message(self, fmt, *args):
+        logger.debug("%s - %s", self.address_string(), fmt % args)
+
+    def _send_json(self, status: int, payload, headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _route(self):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        return parts, parse_qs(url.query)
+
+    def do_POST(self):
+        parts, _ = self._route()
+        if parts != ["jobs"]:
+            return self._send_json(404, {"error": "未知接口"})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(body, dict):
+                raise ValueError("请求体应为 JSON 对象")
+            job = self.service.submit(body)
+        except ServiceFull as e:
+            return self._send_json(503, {"error": str(e)}, {"Retry-After": "5"})
+        except PermissionError as e:
+            SUBMISSIONS.labels("invalid").inc()
+            return self._send_json(403, {"error": str(e)})
+        except FileNotFoundError as e:
+            SUBMISSIONS.labels("invalid").inc()
+            return self._send_json(404, {"error": str(e)})
+        except ValueError as e:
+            SUBMISSIONS.labels("invalid").inc()
+            return self._send_json(400, {"error": str(e)})
+        self._send_json(202, job.to_dict(), {"Location": f"/jobs/{job.id}"})
+
+    def do_GET(self):
+        parts, query = self._route()
+        if parts == ["metrics"]:
+            data = metrics.REGISTRY.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        if parts == ["jobs"]:
+            return self._send_json(200, {"queued": self.service.queue_depth(),
+                                         "jobs": [job.to_dict() for job in self.service.list_jobs()]})
+        if len(parts) < 2 or parts[0] != "jobs":
+            return self._send_json(404, {"error": "未知接口"})
+        job = self.service.get(parts[1])
+        if job is None:
+            return self._send_json(404, {"error": "任务不存在"})
+        if len(parts) == 2:
+            return self._send_json(200, job.to_dict())
+        if len(parts) == 3 and parts[2] == "events":
+            sse = query.get("format", [""])[0] == "sse" or "text/event-stream" in self.headers.get("Accept", "")
+            try:
+                self._stream_events(job, sse)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # 客户端提前断开
+            return
+        self._send_json(404, {"error": "未知接口"})
+
+    def do_DELETE(self):
+        parts, _ = self._route()
+        job = self.service.cancel(parts[1]) if len(parts) == 2 and parts[0] == "jobs" else None
+        if job is None:
+            return self._send_json(404, {"error": "任务不存在"})
+        self._send_json(200, job.to_dict())
+
+    def _stream_events(self, job: Job, sse: bool):
+        """先补发已有事件，再随检测进度推送新事件，任务结束后发送结束标记并关闭连接"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream" if sse else "application/x-ndjson")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        sent = 0
+        while True:
+            with job.cond:
+                if sent >= len(job.events) and not job.is_finished:
+                    job.cond.wait(SSE_KEEPALIVE_SECONDS)
+                pending = job.events[sent:]
+                finished = job.is_finished and sent + len(pending) >= len(job.events)
+            for event in pending:
+                self._write_event("change", event, sse)
+            sent += len(pending)
+            if finished:
+                self._write_event("end", job.to_dict(), sse)
+                return
+            if not pending:
+                # 保活：长时间无事件时防止代理断开连接
+                self.wfile.write(b": keepalive\n\n" if sse else b"\n")
+                self.wfile.flush()
+
+    def _write_event(self, kind: str, payload: dict, sse: bool):
+        if sse:
+            data = json.dumps(payload, ensure_ascii=False)
+            self.wfile.write(f"event: {kind}\ndata: {data}\n\n".encode("utf-8"))
+        else:
+            self.wfile.write(json.dumps({"type": kind, **payload}, ensure_ascii=False).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+
+def make_server(service: JobService, host: str, port: int) -> ThreadingHTTPServer:
+    handler = type("JobHandler", (_Handler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
@@ -0,0 +1,175 @@
+# core/store.py
+"""截图输出后端：逐张 JPEG 文件（files），或每个视频一个只追加的归档（tar）
+
+NAS 上大量创建 / 列举小文件很慢，tar 后端把一个视频的所有截图顺序追加到 {视频名}.tar，
+同时在 {视频名}.tar.idx 中逐行记录 帧号 / 视频内时间 / 变化比例 / 数据偏移 / 长度。
+归档是标准 tar，可直接用 tar 工具解开；按索引偏移读取单张截图无需扫描整个归档。
+"""
+import abc
+import io
+import json
+import logging
+import os
+import tarfile
+import time
+from typing import Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from config import SCREENSHOT_JPEG_QUALITY
+from core import metrics
+from core.screenshot import encode_jpeg, safe_basename, screenshot_filename, write_jpeg
+
+logger = logging.getLogger(__name__)
+
+STORE_KINDS = ("files", "tar")
+INDEX_SUFFIX = ".idx"
+
+
+class ScreenshotWriter(abc.ABC):
+    """单个视频（或视频中的一段）的截图写入器"""
+
+    @abc.abstractmethod
+    def write(self, frame_id: int, timestamp: float, ratio: float, image: np.ndarray,
+              zones: Sequence[str] = ()) -> str:
+        """写入一张截图，返回其位置（文件路径或 归档#成员名）"""
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _FileWriter(ScreenshotWriter):
+    def __init__(self, save_path: str, video_basename: str, quality: int):
+        self.save_path = save_path
+        self.video_basename = video_basename
+        self.quality = quality
+
+    def write(self, frame_id, timestamp, ratio, image, zones=()):
+        path = os.path.join(self.save_path, screenshot_filename(self.video_basename, frame_id))
+        write_jpeg(path, image, self.quality)
+        return path
+
+
+class _TarWriter(ScreenshotWriter):
+    def __init__(self, archive_path: str, video_basename: str, quality: int):
+        self.archive_path = archive_path
+        self.video_basename = video_basename
+        self.quality = quality
+        # 重新处理同一视频时追加到已有归档，不清除上次的截图与索引；同名成员导出时以后写入的为准。
+        # 旧归档无法解析时抛出 tarfile.ReadError，不覆盖
+        index_path = archive_path + INDEX_SUFFIX
+        if os.path.exists(archive_path):
+            logger.info(f"追加到已有截图归档: {archive_path}")
+        self._tar = tarfile.open(archive_path, "a", format=tarfile.GNU_FORMAT)
+        self._index = open(index_path, "a", encoding="utf-8")
+        if self._index.tell() > 0:
+            with open(index_path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._index.write("\n")  # 上次中途退出留下半行：另起一行，不与新索引行拼接
+
+    def write(self, frame_id, timestamp, ratio, image, zones=()):
+        start = time.perf_counter()
+        metrics.SCREENSHOT_PENDING.inc()
+        try:
+            data = encode_jpeg(image, self.quality, self.archive_path).tobytes()
+            info = tarfile.TarInfo(screenshot_filename(self.video_basename, frame_id))
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self._tar.addfile(info, io.BytesIO(data))
+            # addfile 写入的是 TarInfo 的副本，数据偏移需由写入后的位置减去按块补齐的数据长度得到
+            blocks = -(-info.size // tarfile.BLOCKSIZE)
+            offset = self._tar.offset - blocks * tarfile.BLOCKSIZE
+            entry = {
+                "frame": frame_id, "timestamp": round(timestamp, 3), "ratio": round(ratio, 6),
+                "zones": [z for z in zones if z], "name": info.name,
+                "offset": offset, "size": info.size
+            }
+            # 索引行在数据写入之后追加：中途退出时索引只会少于归档，不会指向不存在的数据
+            self._index.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._index.flush()
+        except Exception:
+            metrics.SCREENSHOT_ERRORS.inc()
+            raise
+        finally:
+            metrics.SCREENSHOT_PENDING.dec()
+        metrics.SCREENSHOT_SECONDS.observe(time.perf_counter() - start)
+        return f"{self.archive_path}#{info.name}"
+
+    def close(self):
+        if self._tar is not None:
+            self._tar.close()
+            self._index.close()
+            self._tar = None
+
+
+class ScreenshotSink:
+    """截图输出后端；每个视频调用一次 open() 获得写入器"""
+
+    def __init__(self, save_path: str, kind: str = "files", quality: int = SCREENSHOT_JPEG_QUALITY):
+        if kind not in STORE_KINDS:
+            raise ValueError(f"未知截图存储方式: {kind}")
+        self.save_path = save_path
+        self.kind = kind
+        self.quality = quality
+
+    def open(self, video_basename: str, part: int = 0) -> ScreenshotWriter:
+        """part 为分段处理的起始帧：同一视频的不同段写入不同归档，多节点并行时互不干扰"""
+        if self.kind == "files":
+            return _FileWriter(self.save_path, video_basename, self.quality)
+        safe_name = safe_basename(video_basename)
+        name = f"{safe_name}_{part}.tar" if part else f"{safe_name}.tar"
+        return _TarWriter(os.path.join(self.save_path, name), video_basename, self.quality)
+
+
+# ========== 读取 / 导出 ==========
+def read_index(archive_path: str) -> List[dict]:
+    """读取归档索引；索引缺失时扫描归档重建（只有帧号，没有时间与变化比例）"""
+    index_path = archive_path + INDEX_SUFFIX
+    entries = []
+    if os.path.exists(index_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue  # 容忍异常退出时写了一半的行
+        return entries
+    with tarfile.open(archive_path, "r") as tar:
+        for info in tar:
+            frame = info.name.rsplit("_frame_", 1)[-1].split(".")[0]
+            entries.append({
+                "frame": int(frame) if frame.isdigit() else None, "timestamp": None, "ratio": None,
+                "zones": [], "name": info.name, "offset": info.offset_data, "size": info.size
+            })
+    return entries
+
+
+def iter_images(archive_path: str, entries: Optional[Sequence[dict]] = None) -> Iterator[tuple]:
+    """按索引偏移直接读取，产出 (索引项, JPEG 字节)"""
+    entries = read_index(archive_path) if entries is None else entries
+    with open(archive_path, "rb") as f:
+        for entry in entries:
+            f.seek(entry["offset"])
+            yield entry, f.read(entry["size"])
+
+
+def extract(archive_path: str, out_dir: str, frames: Optional[Sequence[int]] = None) -> int:
+    """把归档中的截图（或指定帧）导出为单独的 JPEG 文件，返回导出数量"""
+    entries = read_index(archive_path)
+    if frames is not None:
+        wanted = set(frames)
+        entries = [e for e in entries if e["frame"] in wanted]
+    os.makedirs(out_dir, exist_ok=True)
+    count = 0
+    for entry, data in iter_images(archive_path, entries):
+        with open(os.path.join(out_dir, os.path.basename(entry["name"])), "wb") as f:
+            f.write(data)
+        count += 1
+    return count
@@ -0,0 +1,126 @@
+# core/tracker.py
+"""轻量目标跟踪：把逐帧连通域按 IoU / 质心距离串成轨迹，每个目标只输出一张面积最大时的截图
+
+逐帧触发模式下，一个人走过画面会在 min_interval 限制内反复截图；按目标截图时，
+目标离开（超过 TRACK_MAX_GAP_SECONDS 视频时间未再匹配到）或视频结束后才输出一次，
+附带进入 / 离开时间、出现帧数、最佳帧等轨迹记录，便于按目标检索。
+"""
+import math
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import TRACK_IOU_THRESHOLD, TRACK_MAX_DISTANCE, TRACK_MAX_GAP_SECONDS, TRACK_MIN_HITS
+
+
+@dataclass
+class Track:
+    id: int
+    enter_frame: int
+    enter_time: float
+    exit_frame: int
+    exit_time: float
+    box: List[int]                   # 最近一次匹配的连通域 [x, y, w, h, area]（处理分辨率）
+    best_frame_id: int
+    best_time: float
+    best_box: List[int]
+    best_ratio: float
+    best_frame: Optional[np.ndarray] = None   # 面积最大时的原始帧（拷贝，同一帧上的多个轨迹共用一份，只读）
+    proc_shape: Tuple[int, int] = (0, 0)      # 处理分辨率，用于把 best_box 换算到原始帧
+    zones: List[str] = field(default_factory=list)
+    hits: int = 1
+
+    def record(self) -> dict:
+        """轨迹记录（不含图像）"""
+        return {
+            "track": self.id,
+            "enter_frame": self.enter_frame, "exit_frame": self.exit_frame,
+            "enter_time": round(self.enter_time, 3), "exit_time": round(self.exit_time, 3),
+            "duration": round(self.exit_time - self.enter_time, 3),
+            "hits": self.hits,
+            "best_frame": self.best_frame_id, "best_time": round(self.best_time, 3),
+            "best_box": [int(v) for v in self.best_box], "best_ratio": round(self.best_ratio, 6),
+            "zones": [z for z in self.zones if z]
+        }
+
+
+def _iou(a: Sequence[int], b: Sequence[int]) -> float:
+    x0, y0 = max(a[0], b[0]), max(a[1], b[1])
+    x1, y1 = min(a[0] + a[2], b[0] + b[2]), min(a[1] + a[3], b[1] + b[3])
+    inter = max(0, x1 - x0) * max(0, y1 - y0)
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _distance(a: Sequence[int], b: Sequence[int]) -> float:
+    return math.hypot(a[0] + a[2] / 2 - b[0] - b[2] / 2, a[1] + a[3] / 2 - b[1] - b[3] / 2)
+
+
+class ObjectTracker:
+    """贪心匹配：先按 IoU 从大到小配对，剩余的再按质心距离配对，未匹配的连通域开始新轨迹"""
+
+    def __init__(self, iou_threshold: float = TRACK_IOU_THRESHOLD, max_distance: float = TRACK_MAX_DISTANCE,
+                 max_gap: float = TRACK_MAX_GAP_SECONDS, min_hits: int = TRACK_MIN_HITS):
+        self.iou_threshold = iou_threshold
+        self.max_distance = max_distance
+        self.max_gap = max_gap
+        self.min_hits = min_hits
+        self.active: List[Track] = []
+        self._next_id = 1
+
+    def update(self, frame_id: int, timestamp: float, boxes: Sequence[Sequence[int]], zones: Sequence[str],
+               frame: np.ndarray, proc_shape: Tuple[int, int], ratio: float) -> List[Track]:
+        """加入本帧连通域，返回本帧结束的轨迹（已过滤出现次数不足的）"""
+        unmatched_tracks = list(range(len(self.active)))
+        unmatched_boxes = list(range(len(boxes)))
+        pairs = []
+        for score_fn, accept in ((lambda t, b: _iou(t.box, b), lambda s: s >= self.iou_threshold),
+                                 (lambda t, b: -_distance(t.box, b), lambda s: -s <= self.max_distance)):
+            candidates = sorted(((score_fn(self.active[t], boxes[b]), t, b)
+                                 for t in unmatched_tracks for b in unmatched_boxes), reverse=True)
+            for score, t, b in candidates:
+                if accept(score) and t in unmatched_tracks and b in unmatched_boxes:
+                    pairs.append((t, b))
+                    unmatched_tracks.remove(t)
+                    unmatched_boxes.remove(b)
+
+        improved: List[Tuple[Track, Sequence[int]]] = []
+        for t, b in pairs:
+            track = self.active[t]
+            track.box = list(boxes[b])
+            track.exit_frame, track.exit_time = frame_id, timestamp
+            track.hits += 1
+            track.zones = sorted(set(track.zones) | set(zones))
+            if boxes[b][4] > track.best_box[4]:
+                improved.append((track, boxes[b]))
+        for b in unmatched_boxes:
+            track = Track(self._next_id, frame_id, timestamp, frame_id, timestamp, list(boxes[b]),
+                          frame_id, timestamp, list(boxes[b]), ratio, proc_shape=tuple(proc_shape[:2]),
+                          zones=sorted(set(zones)))
+            improved.append((track, boxes[b]))
+            self._next_id += 1
+            self.active.append(track)
+        if improved:
+            # 解码器可能复用帧缓冲，需要拷贝；本帧更新的所有轨迹共用一份拷贝
+            shared = frame.copy()
+            for track, box in improved:
+                self._set_best(track, frame_id, timestamp, box, shared, ratio)
+
+        finished = [t for t in self.active if timestamp - t.exit_time > self.max_gap]
+        if finished:
+            self.active = [t for t in self.active if timestamp - t.exit_time <= self.max_gap]
+        return [t for t in finished if t.hits >= self.min_hits]
+
+    def flush(self) -> List[Track]:
+        """视频结束：返回所有未结束的轨迹"""
+        finished, self.active = self.active, []
+        return [t for t in finished if t.hits >= self.min_hits]
+
+    @staticmethod
+    def _set_best(track: Track, frame_id: int, timestamp: float, box: Sequence[int],
+                  frame: np.ndarray, ratio: float):
+        track.best_frame_id, track.best_time = frame_id, timestamp
+        track.best_box = list(box)
+        track.best_ratio = ratio
+        track.best_frame = frame
@@ -1,28 +1,143 @@
 # core/video_processor.py
 import cv2
+import fnmatch
+import hashlib
+import logging
+import math
+import os
 import numpy as np
-from typing import Optional, Tuple
-from config import MIN_AREA, TARGET_HEIGHT, GMM_PREHEAT_FRAMES
+from collections import OrderedDict
+from dataclasses import dataclass, fields, replace
+from typing import Dict, List, Optional, Tuple
+from config import (
+    MIN_AREA,
+    FUSION_MODE,
+    MORPH_ENABLED,
+    MORPH_KERNEL_SIZE,
+    COMPONENT_MAX_AREA,
+    TARGET_HEIGHT,
+    GMM_PREHEAT_FRAMES,
+    GMM_HISTORY,
+    CHANGE_TILE_SIZE,
+    CHANGE_TILE_MAX_ACTIVE,
+    GLOBAL_REJECT_ENABLED,
+    GLOBAL_BRIGHTNESS_DELTA,
+    GLOBAL_CHANGE_FRACTION,
+    GLOBAL_SHIFT_PIXELS,
+    GLOBAL_FALLBACK,
+    GLOBAL_UNIFORM_GRID,
+    GLOBAL_UNIFORM_CELLS,
+    BACKGROUND_POOL_SIZE,
+    CAMERA_GROUPS,
+    CAMERA_PIPELINES
+)
+
+logger = logging.getLogger(__name__)
+
+FUSION_MODES = ("and", "or", "gmm", "diff")
+
+
+@dataclass(frozen=True)
+class DetectionPipeline:
+    """检测阶段配置：前景融合方式 → 形态学（可选）→ 连通域面积筛选"""
+    fusion: str = FUSION_MODE
+    morphology: bool = MORPH_ENABLED
+    kernel_size: int = MORPH_KERNEL_SIZE
+    min_area: int = MIN_AREA
+    max_area: int = COMPONENT_MAX_AREA     # 0 表示不限制
+
+    def __post_init__(self):
+        if self.fusion not in FUSION_MODES:
+            raise ValueError(f"未知融合方式: {self.fusion}（可用: {', '.join(FUSION_MODES)}）")
+        if self.kernel_size < 1 or self.kernel_size % 2 == 0:
+            raise ValueError(f"形态学核边长应为正奇数: {self.kernel_size}")
+
+    @property
+    def uses_gmm(self) -> bool:
+        return self.fusion != "diff"
+
+    @property
+    def uses_diff(self) -> bool:
+        return self.fusion != "gmm"
+
+    def describe(self) -> str:
+        morph = f"开闭运算 {self.kernel_size}x{self.kernel_size}" if self.morphology else "无形态学"
+        area = f"面积 ≥ {self.min_area}" + (f" 且 ≤ {self.max_area}" if self.max_area > 0 else "")
+        return f"融合 {self.fusion}，{morph}，{area}"
+
+
+def camera_pipeline(video_path: str, base: DetectionPipeline) -> DetectionPipeline:
+    """按文件名匹配 CAMERA_PIPELINES，返回该机位的检测阶段配置（未匹配时为 base）"""
+    basename = os.path.basename(video_path)
+    names = {f.name for f in fields(DetectionPipeline)}
+    for pattern, overrides in CAMERA_PIPELINES.items():
+        if fnmatch.fnmatch(basename, pattern):
+            unknown = set(overrides) - names
+            if unknown:
+                raise ValueError(f"CAMERA_PIPELINES[{pattern!r}] 包含未知项: {', '.join(sorted(unknown))}")
+            return replace(base, **overrides)
+    return base
 
 
 class VideoProcessor:
-    def __init__(self, gmm_var: int, fd_var: int, roi_mask: Optional[np.ndarray] = None):
+    def __init__(self, gmm_var: int, fd_var: int, roi_mask: Optional[np.ndarray] = None,
+                 zone_labels: Optional[np.ndarray] = None,
+                 pipeline: Optional[DetectionPipeline] = None):
         self.gmm_var = gmm_var
         self.fd_var = fd_var
+        self.pipeline = pipeline or DetectionPipeline()
+        # 多区域标签图（0 为区域外，1..N 为各区域）；提供时 ROI 取所有区域的并集
+        self.zone_labels = zone_labels
+        if roi_mask is None and zone_labels is not None:
+            roi_mask = np.where(zone_labels > 0, 255, 0).astype(np.uint8)
         self.roi_mask = roi_mask
+        self.zone_count = int(zone_labels.max()) if zone_labels is not None else 0
         self.reset()
 
     def reset(self):
         """重置内部状态"""
         self.gmm = cv2.createBackgroundSubtractorMOG2(
-            history=100,
+            history=GMM_HISTORY,
             varThreshold=self.gmm_var,
             detectShadows=False
         )
         self.prev_gray = None
-        self.kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+        self._diff_buffer: Optional[np.ndarray] = None
+        self._apply_pipeline()
         self._preheated = False
         self._cached_roi_mask = None
+        self._cached_zone_labels = None
+        self._zone_pixels = None
+        self.zone_ratios: Optional[np.ndarray] = None     # 各区域变化比例（下标 = 区域编号）
+        self.zone_max_areas: Optional[np.ndarray] = None  # 各区域内最大连通域面积
+        self._model_frames = 0  # 背景模型已覆盖的原始帧数
+        self.global_rejections: Dict[str, int] = {"brightness": 0, "shake": 0, "global": 0}
+        self.last_rejection: Optional[str] = None
+        self._unexplained_warned = False
+        self.components: List[List[int]] = []  # 有效连通域 [x, y, w, h, area]
+
+    def begin_video(self):
+        """切换到同机位的下一个视频：保留背景模型，仅清除帧差参考帧"""
+        self.prev_gray = None
+        self.global_rejections = {"brightness": 0, "shake": 0, "global": 0}
+        self.last_rejection = None
+        self._unexplained_warned = False
+
+    def update_params(self, gmm_var: int, fd_var: int, pipeline: Optional[DetectionPipeline] = None):
+        """复用背景模型时同步最新参数（无需重建 GMM）"""
+        if gmm_var != self.gmm_var:
+            self.gmm_var = gmm_var
+            self.gmm.setVarThreshold(gmm_var)
+        self.fd_var = fd_var
+        if pipeline is not None and pipeline != self.pipeline:
+            self.pipeline = pipeline
+            self._apply_pipeline()
+
+    def _apply_pipeline(self):
+        size = self.pipeline.kernel_size
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (size, size))
+        # 开运算 + 闭运算共四次腐蚀 / 膨胀，输出像素只受该半径内输入像素影响
+        self._morph_reach = 4 * (size // 2) if self.pipeline.morphology else 0
 
     def preprocess_frame(self, frame: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
         """调整分辨率 + 灰度 + ROI"""
@@ -39,6 +154,12 @@ class VideoProcessor:
                 self._cached_roi_mask = cv2.resize(self.roi_mask, (gray.shape[1], gray.shape[0]), interpolation=cv2.INTER_NEAREST)
             gray = cv2.bitwise_and(gray, gray, mask=self._cached_roi_mask)
 
+        if self.zone_labels is not None and (self._cached_zone_labels is None
+                                             or self._cached_zone_labels.shape[:2] != gray.shape[:2]):
+            self._cached_zone_labels = cv2.resize(self.zone_labels, (gray.shape[1], gray.shape[0]),
+                                                  interpolation=cv2.INTER_NEAREST)
+            self._zone_pixels = np.bincount(self._cached_zone_labels.ravel(), minlength=self.zone_count + 1)
+
         return frame, gray
 
     def preheat(self, gray: np.ndarray):
@@ -46,37 +167,136 @@ class VideoProcessor:
         if self._preheated:
             return
         for _ in range(GMM_PREHEAT_FRAMES):
-            self.gmm.apply(gray)
+            self.update_background(gray)
+        self._preheated = True
+
+    def mark_preheated(self):
+        """外部已逐帧完成预热时调用"""
         self._preheated = True
 
-    def detect_change(self, gray: np.ndarray) -> Tuple[bool, np.ndarray, float]:
-        """检测变化（需在 preheat 后调用）"""
+    @property
+    def preheated(self) -> bool:
+        return self._preheated
+
+    def update_background(self, gray: np.ndarray, stride: int = 1) -> np.ndarray:
+        """更新背景模型并返回原始前景掩码
+
+        stride 为与上一采样帧相隔的原始帧数。跳帧时按 stride 放大学习率，
+        使背景模型在真实时间上的适应速度与逐帧处理一致（与 OpenCV 默认
+        学习率 1/min(2*n, history) 的换算方式相同）。
+        """
+        stride = max(1, int(stride))
+        self._model_frames += stride
+        if stride == 1:
+            return self.gmm.apply(gray)
+        learning_rate = min(1.0, stride / min(2 * self._model_frames, GMM_HISTORY))
+        return self.gmm.apply(gray, learningRate=learning_rate)
+
+    def refresh_background(self, gray: np.ndarray, stride: int = 1):
+        """静止帧（预筛选跳过检测）只更新背景模型与帧差参考帧"""
+        self.update_background(gray, stride)
+        self.prev_gray = gray.copy()
+
+    def rebase_background(self, gray: np.ndarray, stride: int = 1):
+        """以当前帧重建背景（学习率 1.0），用于全局光照/镜头突变之后"""
+        self._model_frames += max(1, int(stride))
+        self.gmm.apply(gray, learningRate=1.0)
+
+    def classify_global_change(self, gray: np.ndarray, diff_mask: np.ndarray,
+                               fallback: str = GLOBAL_FALLBACK) -> Optional[str]:
+        """判别整幅画面的全局变化，返回 brightness / shake / global，局部变化返回 None
+
+        大面积变化只有检测到亮度突变或整体平移时才确定为全局变化；两者都没有时按 fallback 处理
+        （见 GLOBAL_FALLBACK），此时返回 None 表示照常检测。
+        """
+        roi = self._cached_roi_mask
+        total = cv2.countNonZero(roi) if roi is not None else gray.size
+        changed = cv2.countNonZero(diff_mask)  # 灰度图已按 ROI 置零，ROI 外没有帧差
+        if total == 0 or changed / total < GLOBAL_CHANGE_FRACTION:
+            return None
+
+        mean_now = cv2.mean(gray, mask=roi)[0]
+        mean_prev = cv2.mean(self.prev_gray, mask=roi)[0]
+        if abs(mean_now - mean_prev) >= GLOBAL_BRIGHTNESS_DELTA:
+            return "brightness"
+
+        # 相位相关（1/4 分辨率）判断整体平移
+        small_prev = cv2.resize(self.prev_gray, None, fx=0.25, fy=0.25, interpolation=cv2.INTER_AREA)
+        small_now = cv2.resize(gray, None, fx=0.25, fy=0.25, interpolation=cv2.INTER_AREA)
+        (dx, dy), _ = cv2.phaseCorrelate(np.float32(small_prev), np.float32(small_now))
+        if math.hypot(dx, dy) * 4 >= GLOBAL_SHIFT_PIXELS:
+            return "shake"
+
+        reject = fallback == "reject" or (fallback == "uniform" and self._change_is_uniform(diff_mask, roi))
+        if not self._unexplained_warned:
+            # 每个视频只提示一次，避免近景目标持续出现时刷屏
+            self._unexplained_warned = True
+            logger.warning(f"大面积变化（占 {changed / total:.0%}）未检测到亮度突变或镜头平移，"
+                           f"{'按全局变化忽略' if reject else '照常检测'}（GLOBAL_FALLBACK={fallback}）")
+        return "global" if reject else None
+
+    def _change_is_uniform(self, diff_mask: np.ndarray, roi: Optional[np.ndarray]) -> bool:
+        """变化是否遍布画面：按网格统计各格（ROI 内）的变化占比，足够多的格子都有大量变化"""
+        grid = (max(1, GLOBAL_UNIFORM_GRID),) * 2
+        changed = cv2.resize((diff_mask > 0).astype(np.float32), grid, interpolation=cv2.INTER_AREA)
+        area = cv2.resize((roi > 0).astype(np.float32), grid, interpolation=cv2.INTER_AREA) if roi is not None \
+            else np.ones(grid, dtype=np.float32)
+        cells = area > 0
+        if not cells.any():
+            return False
+        busy = changed[cells] >= area[cells] * (GLOBAL_CHANGE_FRACTION / 2)
+        return busy.mean() >= GLOBAL_UNIFORM_CELLS
+
+    def detect_change(self, gray: np.ndarray, stride: int = 1) -> Tuple[bool, np.ndarray, float]:
+        """检测变化（需在 preheat 后调用；stride 为实际采样步长）"""
+        self.last_rejection = None
+        self.components = []
+        if self._cached_zone_labels is not None:
+            self._update_zone_stats(None, None)  # 先清零，提前返回时不残留上一帧结果
         if self.prev_gray is None:
             self.prev_gray = gray.copy()
             return False, np.zeros_like(gray), 0.0
 
-        # GMM
-        gmm_mask = self.gmm.apply(gray)
-        _, gmm_mask = cv2.threshold(gmm_mask, 254, 255, cv2.THRESH_BINARY)
-
-        # 帧差
-        frame_diff = cv2.absdiff(gray, self.prev_gray)
-        _, diff_mask = cv2.threshold(frame_diff, self.fd_var, 255, cv2.THRESH_BINARY)
-
-        # 融合 + 形态学
-        fg_mask = cv2.bitwise_and(gmm_mask, diff_mask) 
-        #fg_mask = cv2.bitwise_or(gmm_mask, diff_mask) #改用 OR 融合策略（提升灵敏度）但会能引入更多噪点 → 有必要可通过增大 MIN_AREA 或形态学来抑制
-        fg_mask = cv2.morphologyEx(fg_mask, cv2.MORPH_OPEN, self.kernel)
-        fg_mask = cv2.morphologyEx(fg_mask, cv2.MORPH_CLOSE, self.kernel)
-
-        # 判断有效变化
-        valid_change = False
-        if cv2.countNonZero(fg_mask) > 0:
-            _, _, stats, _ = cv2.connectedComponentsWithStats(fg_mask, connectivity=8)
-            for i in range(1, len(stats)):
-                if stats[i, cv2.CC_STAT_AREA] >= MIN_AREA:
-                    valid_change = True
-                    break
+        pipeline = self.pipeline
+        # 帧差（全局变化判别同样需要；中间结果写入复用的缓冲区）
+        diff_mask = None
+        if pipeline.uses_diff or GLOBAL_REJECT_ENABLED:
+            if self._diff_buffer is None or self._diff_buffer.shape != gray.shape:
+                self._diff_buffer = np.empty_like(gray)
+            buffer = self._diff_buffer
+            cv2.absdiff(gray, self.prev_gray, dst=buffer)
+            # 仅帧差融合时帧差掩码即为输出，需要独立的数组
+            _, diff_mask = cv2.threshold(buffer, self.fd_var, 255, cv2.THRESH_BINARY,
+                                         dst=None if pipeline.fusion == "diff" else buffer)
+
+        # 全局变化：重建背景，不产生事件
+        if GLOBAL_REJECT_ENABLED:
+            reason = self.classify_global_change(gray, diff_mask)
+            if reason is not None:
+                self.rebase_background(gray, stride)
+                self.global_rejections[reason] += 1
+                self.last_rejection = reason
+                self.prev_gray = gray.copy()
+                return False, np.zeros_like(gray), 0.0
+
+        # 融合：MOG2 关闭阴影检测时输出只有 0 / 255，无需再二值化，直接在其输出上原地合并
+        if pipeline.fusion == "diff":
+            fused = diff_mask
+        else:
+            gmm_mask = self.update_background(gray, stride)
+            if pipeline.fusion == "and":
+                fused = cv2.bitwise_and(gmm_mask, diff_mask, dst=gmm_mask)
+            elif pipeline.fusion == "or":
+                fused = cv2.bitwise_or(gmm_mask, diff_mask, dst=gmm_mask)
+            else:
+                fused = gmm_mask
+
+        # 形态学 + 连通域（面积筛选后的连通域即有效变化）
+        fg_mask, cc_labels = self._postprocess(fused)
+        valid_change = bool(self.components)
+
+        if self._cached_zone_labels is not None:
+            self._update_zone_stats(fg_mask, cc_labels)
 
         self.prev_gray = gray.copy()
 
@@ -86,5 +306,169 @@ class VideoProcessor:
         ratio = change_pixels / total if total > 0 else 0.0
 
         return valid_change, fg_mask, ratio
-    
-    
\ No newline at end of file
+
+    def _morphology(self, mask: np.ndarray) -> np.ndarray:
+        if not self.pipeline.morphology:
+            return mask
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, self.kernel)
+        return cv2.morphologyEx(mask, cv2.MORPH_CLOSE, self.kernel)
+
+    def _area_ok(self, areas: np.ndarray) -> np.ndarray:
+        ok = areas >= self.pipeline.min_area
+        if self.pipeline.max_area > 0:
+            ok &= areas <= self.pipeline.max_area
+        return ok
+
+    def _postprocess(self, fused: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """开闭运算（可选）+ 连通域，返回 (前景掩码, 连通域标签图) 并设置 components
+
+        变化集中在小块区域时只处理活动块所在矩形（外扩形态学影响半径），结果拼回整帧，与整帧处理逐像素一致。
+        """
+        rects = self._active_rects(fused)
+        if rects is None:
+            fg_mask = self._morphology(fused)
+            cc_labels = None
+            if cv2.countNonZero(fg_mask) > 0:
+                _, cc_labels, stats, _ = cv2.connectedComponentsWithStats(fg_mask, connectivity=8)
+                stats = stats[1:]
+                self.components = stats[self._area_ok(stats[:, cv2.CC_STAT_AREA]), :5].tolist()
+            return fg_mask, cc_labels
+
+        fg_mask = np.zeros_like(fused)
+        # 整帧标签图只有区域统计需要
+        cc_labels = np.zeros(fused.shape, np.int32) if rects and self._cached_zone_labels is not None else None
+        next_label = 0
+        components = []
+        for x, y, w, h in rects:
+            part = self._morphology(fused[y:y + h, x:x + w])
+            fg_mask[y:y + h, x:x + w] = part
+            n, labels, stats, _ = cv2.connectedComponentsWithStats(part, connectivity=8)
+            if n <= 1:
+                continue
+            # 各矩形的标签依次编号，拼成整帧标签图
+            if cc_labels is not None:
+                cc_labels[y:y + h, x:x + w] = np.where(labels > 0, labels + next_label, 0)
+            next_label += n - 1
+            stats = stats[1:]
+            stats[:, cv2.CC_STAT_LEFT] += x
+            stats[:, cv2.CC_STAT_TOP] += y
+            components.extend(stats[self._area_ok(stats[:, cv2.CC_STAT_AREA]), :5].tolist())
+        self.components = sorted(components, key=lambda c: (c[1], c[0]))
+        return fg_mask, cc_labels if next_label else None
+
+    def _active_rects(self, fused: np.ndarray) -> Optional[List[Tuple[int, int, int, int]]]:
+        """活动块分组后的处理矩形 [(x, y, w, h)]；返回 None 表示应整帧处理"""
+        tile = CHANGE_TILE_SIZE
+        if tile <= 0:
+            return None
+        h, w = fused.shape[:2]
+        th, tw = -(-h // tile), -(-w // tile)
+        if h % tile or w % tile:
+            padded = np.zeros((th * tile, tw * tile), np.uint8)
+            padded[:h, :w] = fused
+        else:
+            padded = fused
+        # 每块的最大值（reshape 后先按行、再按列归约，比一次归约两个轴快一个数量级）：非零即为活动块
+        active = padded.reshape(th, tile, tw * tile).max(axis=1).reshape(th, tw, tile).max(axis=2)
+        count = cv2.countNonZero(active)
+        if count == 0:
+            return []
+        if count > CHANGE_TILE_MAX_ACTIVE * th * tw:
+            return None
+
+        # 相邻活动块归为一组，每组外扩覆盖形态学影响半径；外扩后重叠的矩形合并，保证各矩形边缘处的结果与整帧一致
+        halo = -(-self._morph_reach // tile)
+        _, _, stats, _ = cv2.connectedComponentsWithStats(active, connectivity=8)
+        boxes = [[x - halo, y - halo, x + bw + halo, y + bh + halo] for x, y, bw, bh, _ in stats[1:].tolist()]
+        merged = True
+        while merged:
+            merged = False
+            result: List[List[int]] = []
+            for box in boxes:
+                for other in result:
+                    if box[0] < other[2] and other[0] < box[2] and box[1] < other[3] and other[1] < box[3]:
+                        other[:] = [min(box[0], other[0]), min(box[1], other[1]),
+                                    max(box[2], other[2]), max(box[3], other[3])]
+                        merged = True
+                        break
+                else:
+                    result.append(box)
+            boxes = result
+
+        rects = []
+        for x0, y0, x1, y1 in boxes:
+            px0, py0 = max(0, x0 * tile), max(0, y0 * tile)
+            px1, py1 = min(w, x1 * tile), min(h, y1 * tile)
+            rects.append((px0, py0, px1 - px0, py1 - py0))
+        return rects
+
+    def _update_zone_stats(self, fg_mask: Optional[np.ndarray], cc_labels: Optional[np.ndarray]):
+        """单次遍历得到各区域变化比例与区域内最大连通域面积（bincount 向量化）"""
+        bins = self.zone_count + 1
+        if cc_labels is None:
+            self.zone_ratios = np.zeros(bins)
+            self.zone_max_areas = np.zeros(bins, np.int64)
+            return
+        fg = fg_mask > 0
+        zone_ids = self._cached_zone_labels[fg]
+        changed = np.bincount(zone_ids, minlength=bins)
+        self.zone_ratios = changed / np.maximum(self._zone_pixels, 1)
+        # (连通域, 区域) 联合计数 → 每个连通域落在每个区域内的面积
+        cc_ids = cc_labels[fg]
+        n_cc = int(cc_ids.max()) + 1
+        joint = np.bincount(cc_ids.astype(np.int64) * bins + zone_ids, minlength=n_cc * bins).reshape(n_cc, bins)[1:]
+        if self.pipeline.max_area > 0:
+            # 超过面积上限的连通域不计入各区域
+            joint[joint.sum(axis=1) > self.pipeline.max_area] = 0
+        self.zone_max_areas = joint.max(axis=0) if len(joint) else np.zeros(bins, np.int64)
+
+
+def camera_group_key(video_path: str, frame_shape: Tuple[int, int],
+                     roi_mask: Optional[np.ndarray] = None) -> Tuple[str, Tuple[int, int], str]:
+    """机位分组键：用户配置的分组名（或 auto）+ 处理分辨率 + ROI（或区域标签图）指纹"""
+    group = "auto"
+    basename = os.path.basename(video_path)
+    for pattern, name in CAMERA_GROUPS.items():
+        if fnmatch.fnmatch(basename, pattern):
+            group = name
+            break
+    roi_digest = hashlib.md5(roi_mask.tobytes()).hexdigest() if roi_mask is not None else ""
+    return group, tuple(frame_shape[:2]), roi_digest
+
+
+class BackgroundModelPool:
+    """同机位背景模型池：缓存已预热的 VideoProcessor，供后续视频直接复用"""
+
+    def __init__(self, max_groups: int = BACKGROUND_POOL_SIZE):
+        self.max_groups = max_groups
+        self._pool: "OrderedDict[tuple, VideoProcessor]" = OrderedDict()
+
+    def acquire(self, key: tuple, gmm_var: int, fd_var: int,
+                roi_mask: Optional[np.ndarray] = None,
+                zone_labels: Optional[np.ndarray] = None,
+                pipeline: Optional[DetectionPipeline] = None) -> Tuple[VideoProcessor, bool]:
+        """返回 (processor, 是否复用)；复用时背景模型已预热，无需再次预热"""
+        processor = self._pool.get(key)
+        if processor is not None and processor.preheated:
+            self._pool.move_to_end(key)
+            processor.update_params(gmm_var, fd_var, pipeline)
+            processor.begin_video()
+            return processor, True
+
+        processor = VideoProcessor(gmm_var=gmm_var, fd_var=fd_var, roi_mask=roi_mask, zone_labels=zone_labels,
+                                   pipeline=pipeline)
+        self._pool[key] = processor
+        while len(self._pool) > self.max_groups:
+            self._pool.popitem(last=False)
+        return processor, False
+
+    def __len__(self) -> int:
+        return len(self._pool)
+
+    def trim(self, keep: int):
+        """只保留最近使用的 keep 个分组（内存超限时调用）"""
+        while len(self._pool) > max(0, keep):
+            self._pool.popitem(last=False)
+
+    def clear(self):
+        self._pool.clear()
@@ -0,0 +1,385 @@
+# core/watcher.py
+"""监视目录守护进程：新录像写完后自动排队检测，已完成的文件记入持久台账
+
+文件“写完”的判定：Linux 本地目录收到 IN_CLOSE_WRITE / IN_MOVED_TO 事件，
+或（网络共享等不支持 inotify 的场景）连续 WATCH_STABLE_SECONDS 秒大小与修改时间不变。
+"""
+import ctypes
+import json
+import logging
+import multiprocessing.util
+import os
+import select
+import signal
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from config import (
+    VIDEO_EXTENSIONS,
+    WATCH_POLL_INTERVAL,
+    WATCH_STABLE_SECONDS,
+    WATCH_MAX_WORKERS,
+    WATCH_MAX_ATTEMPTS,
+    SCREENSHOT_MODE,
+    SCREENSHOT_MAX_DIM,
+    SCREENSHOT_STORE,
+    MEMORY_BUDGET_MB,
+    MEMORY_WORKER_MAX_TASKS,
+    CPU_BUDGET_PERCENT,
+    RUN_SCHEDULE
+)
+from core import metrics
+from core.eventdb import EventIndex
+from core.governor import ResourceGovernor
+from core.memory import MemoryMonitor
+from core.pipeline import DetectionParams
+from core.runner import process_video
+from core.store import ScreenshotSink
+from core.video_processor import BackgroundModelPool
+
+logger = logging.getLogger(__name__)
+
+FileKey = Tuple[str, int, int]
+
+
+def file_key(path: str, st: Optional[os.stat_result] = None) -> FileKey:
+    """(绝对路径, 大小, 修改时间 ns)：文件被追加或替换后视为新文件"""
+    st = st or os.stat(path)
+    return os.path.abspath(path), st.st_size, st.st_mtime_ns
+
+
+class Ledger:
+    """已处理文件台账（JSON Lines，追加写入），重启后据此跳过已完成文件
+
+    处理失败同样追加一行（带 error），用于在重启后延续失败次数；累计失败 max_attempts 次的文件才视为已处理。
+    """
+
+    def __init__(self, path: str, max_attempts: int = WATCH_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max(1, max_attempts)
+        self._done: Set[FileKey] = set()
+        self._failures: Dict[FileKey, int] = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        item = json.loads(line)
+                        key = (item["path"], item["size"], item["mtime_ns"])
+                    except (ValueError, KeyError):
+                        continue  # 容忍异常退出时写了一半的行
+                    if item.get("error"):
+                        self._failures[key] = self._failures.get(key, 0) + 1
+                    else:
+                        self._done.add(key)
+
+    def __contains__(self, key: FileKey) -> bool:
+        return key in self._done or self._failures.get(key, 0) >= self.max_attempts
+
+    def failures(self, key: FileKey) -> int:
+        return self._failures.get(key, 0)
+
+    def record(self, key: FileKey, summary: dict):
+        item = {
+            "path": key[0], "size": key[1], "mtime_ns": key[2],
+            "events": summary.get("events", 0),
+            "error": summary.get("error"),
+            "finished_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        if item["error"]:
+            self._failures[key] = self._failures.get(key, 0) + 1
+        else:
+            self._done.add(key)
+
+
+class _Inotify:
+    """最小 inotify 封装（ctypes 调用 libc）；不可用时由调用方回退到轮询"""
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self, dirs: Sequence[str]):
+        self._libc = ctypes.CDLL("libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self._dirs: Dict[int, str] = {}
+        for d in dirs:
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(d), self.IN_CLOSE_WRITE | self.IN_MOVED_TO)
+            if wd < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), f"无法监视目录: {d}")
+            self._dirs[wd] = d
+
+    def read(self, timeout: float) -> List[str]:
+        """等待事件（最多 timeout 秒），返回写完 / 移入的视频文件路径（截图、索引等其他输出不返回）"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        paths = []
+        offset = 0
+        while offset + self._EVENT.size <= len(data):
+            wd, _, _, name_len = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = data[offset:offset + name_len].rstrip(b"\0")
+            offset += name_len
+            if wd in self._dirs and name and os.fsdecode(name).lower().endswith(VIDEO_EXTENSIONS):
+                paths.append(os.path.join(self._dirs[wd], os.fsdecode(name)))
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """找出目录中已写完的视频文件（inotify 优先，轮询兜底）"""
+
+    def __init__(self, dirs: Sequence[str], stable_seconds: float = WATCH_STABLE_SECONDS,
+                 poll_interval: float = WATCH_POLL_INTERVAL, use_inotify: bool = True):
+        self.dirs = [os.path.abspath(d) for d in dirs]
+        self.stable_seconds = stable_seconds
+        self.poll_interval = poll_interval
+        self._candidates: Dict[str, Tuple[int, int, float]] = {}  # 路径 → (大小, mtime, 稳定起始时间)
+        self._closed: Set[str] = set()
+        self._emitted: Set[FileKey] = set()
+        self._inotify: Optional[_Inotify] = None
+        if use_inotify and os.name == 'posix':
+            try:
+                self._inotify = _Inotify(self.dirs)
+            except OSError as e:
+                logger.warning(f"inotify 不可用，改用轮询: {e}")
+
+    def poll(self) -> List[str]:
+        """等待一个轮询周期，返回本轮判定为写完的新文件"""
+        if self._inotify is not None:
+            self._closed.update(self._inotify.read(self.poll_interval))
+        else:
+            time.sleep(self.poll_interval)
+
+        now = time.time()
+        ready = []
+        seen = set()
+        for d in self.dirs:
+            try:
+                entries = list(os.scandir(d))
+            except OSError as e:
+                logger.warning(f"扫描目录失败 {d}: {e}")
+                continue
+            for entry in entries:
+                if not entry.is_file() or not entry.name.lower().endswith(VIDEO_EXTENSIONS):
+                    continue
+                path = entry.path
+                seen.add(path)
+                st = entry.stat()
+                key = file_key(path, st)
+                if key in self._emitted:
+                    continue
+                size, mtime = st.st_size, st.st_mtime_ns
+                prev = self._candidates.get(path)
+                if prev is None or prev[:2] != (size, mtime):
+                    # 稳定起始时间取最后修改时间：启动时已存在的旧文件无需再等待
+                    self._candidates[path] = (size, mtime, min(now, st.st_mtime))
+                since = self._candidates[path][2]
+                if path in self._closed or now - since >= self.stable_seconds:
+                    self._closed.discard(path)
+                    del self._candidates[path]
+                    self._emitted.add(key)
+                    ready.append(path)
+        # 已删除的文件不再跟踪；写完事件只保留仍在等待的候选文件（已派发或已删除的不再保留，集合不随运行时间增长）
+        for path in list(self._candidates):
+            if path not in seen:
+                del self._candidates[path]
+        self._closed.intersection_update(self._candidates)
+        return sorted(ready)
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+
+# 每个工作进程保留自己的背景模型池，同机位文件落到同一进程时可跳过预热
+_worker_pool: Optional[BackgroundModelPool] = None
+_worker_memory: Optional[MemoryMonitor] = None
+_worker_governor: Optional[ResourceGovernor] = None
+_worker_events: Optional[EventIndex] = None
+
+
+def _init_worker(metrics_textfile: Optional[str] = None, memory_budget: float = 0,
+                 log_setup: Optional[Callable[[], None]] = None,
+                 cpu_budget: float = 0, schedule: Sequence[str] = (), workers: int = 1,
+                 event_db: Optional[str] = None):
+    # 停止信号由主进程处理；工作进程完成当前视频后随执行器退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if log_setup is not None and not logging.getLogger().handlers:
+        log_setup()  # spawn 方式启动的进程不继承主进程的日志配置
+    if metrics_textfile:
+        # 各工作进程写自己的指标文件，以 pid 标签区分
+        metrics.REGISTRY.const_labels["pid"] = str(os.getpid())
+        writer = metrics.TextfileWriter(metrics.worker_textfile_path(metrics_textfile))
+        writer.start()
+        # 进程池的工作进程以 os._exit 结束、不执行 atexit，退出时的清理须登记为 multiprocessing 终结器；
+        # 按任务数 / 内存预算重建后旧进程的文件随之删除，不再导出已不更新的数值
+        multiprocessing.util.Finalize(None, writer.stop, kwargs={"remove": True}, exitpriority=10)
+    global _worker_pool, _worker_memory, _worker_governor, _worker_events
+    _worker_pool = BackgroundModelPool()
+    _worker_memory = MemoryMonitor(budget_mb=memory_budget)
+    _worker_memory.track_pool(_worker_pool)
+    # 各工作进程分得 1 / workers 的 CPU 预算
+    _worker_governor = ResourceGovernor(cpu_budget, schedule, workers=workers)
+    _worker_governor.configure_threads()
+    _worker_events = EventIndex(event_db) if event_db else None
+
+
+def _process_in_worker(video_path: str, params: DetectionParams, save_path: str,
+                       screenshot_mode: str, max_dim: int, store: str) -> dict:
+    try:
+        return process_video(video_path, params, save_path, screenshot_mode=screenshot_mode,
+                             max_dim=max_dim, pool=_worker_pool, memory=_worker_memory, governor=_worker_governor,
+                             event_index=_worker_events,
+                             sink=ScreenshotSink(save_path, store))
+    except Exception as e:
+        logger.exception(f"处理出错: {video_path}")
+        return {"path": video_path, "events": 0, "error": str(e), "cancelled": False}
+
+
+class WatchDaemon:
+    """监视一个或多个目录，把写完的新视频交给有限并发的无界面检测进程"""
+
+    def __init__(self, dirs: Sequence[str], params: DetectionParams, save_path: str, ledger_path: str,
+                 max_workers: int = WATCH_MAX_WORKERS,
+                 screenshot_mode: str = SCREENSHOT_MODE,
+                 max_dim: int = SCREENSHOT_MAX_DIM,
+                 store: str = SCREENSHOT_STORE,
+                 stable_seconds: float = WATCH_STABLE_SECONDS,
+                 poll_interval: float = WATCH_POLL_INTERVAL,
+                 metrics_textfile: Optional[str] = None,
+                 memory_budget: float = MEMORY_BUDGET_MB,
+                 max_tasks_per_worker: int = MEMORY_WORKER_MAX_TASKS,
+                 cpu_budget: float = CPU_BUDGET_PERCENT,
+                 schedule: Sequence[str] = RUN_SCHEDULE,
+                 event_db: Optional[str] = None,
+                 log_setup: Optional[Callable[[], None]] = None):
+        self.dirs = list(dirs)
+        self.event_db = event_db
+        self.cpu_budget = cpu_budget
+        self.schedule = list(schedule)
+        # 主进程只判断运行时段（时段外不派发新文件），CPU 节奏由各工作进程控制
+        self.governor = ResourceGovernor(0, self.schedule)
+        self.metrics_textfile = metrics_textfile
+        self.memory_budget = memory_budget
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.log_setup = log_setup
+        self._recycle = False
+        self.params = params
+        self.save_path = save_path
+        self.ledger = Ledger(ledger_path)
+        self.max_workers = ResourceGovernor.limit_workers(max_workers, cpu_budget)
+        if self.max_workers < max_workers:
+            logger.info(f"CPU 预算 {cpu_budget:.0f}%：并发数由 {max_workers} 降为 {self.max_workers}")
+        self.screenshot_mode = screenshot_mode
+        self.max_dim = max_dim
+        self.store = store
+        self.watcher = FolderWatcher(self.dirs, stable_seconds=stable_seconds, poll_interval=poll_interval)
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        kwargs = {}
+        if self.max_tasks_per_worker > 0:
+            if sys.version_info >= (3, 11):
+                kwargs["max_tasks_per_child"] = self.max_tasks_per_worker
+            else:
+                logger.warning("当前 Python 版本不支持按任务数重建工作进程（需要 3.11+），仅在超出内存预算时重建")
+                self.max_tasks_per_worker = 0
+        return ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                   initargs=(self.metrics_textfile, self.memory_budget, self.log_setup,
+                                             self.cpu_budget, self.schedule, self.max_workers, self.event_db),
+                                   **kwargs)
+
+    def run(self, stop: threading.Event):
+        """阻塞运行直到 stop 被设置；已开始的文件处理完后才退出"""
+        logger.info(f"开始监视目录: {', '.join(self.dirs)}（并发 {self.max_workers}）")
+        pending: List[FileKey] = []
+        in_flight = {}
+        was_in_window = True
+        metrics.sweep_worker_textfiles(self.metrics_textfile)
+        executor = self._new_executor()
+        try:
+            while not stop.is_set():
+                for path in self.watcher.poll():
+                    try:
+                        key = file_key(path)
+                    except OSError:
+                        continue
+                    if key in self.ledger or key in pending or key in in_flight.values():
+                        continue
+                    logger.info(f"发现新录像: {path}")
+                    pending.append(key)
+
+                # 需要重建工作进程时暂停派发，等进行中的视频完成；运行时段外同样不派发
+                in_window = self.governor.in_window()
+                if in_window != was_in_window:
+                    logger.info("进入运行时段，继续派发" if in_window else "不在运行时段内，暂停派发新录像")
+                    was_in_window = in_window
+                while in_window and pending and len(in_flight) < self.max_workers and not self._recycle:
+                    key = pending.pop(0)
+                    future = executor.submit(_process_in_worker, key[0], self.params, self.save_path,
+                                             self.screenshot_mode, self.max_dim, self.store)
+                    in_flight[future] = key
+
+                if in_flight:
+                    done, _ = wait(list(in_flight), timeout=0, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        key = in_flight.pop(future)
+                        if self._finish(key, future):
+                            pending.append(key)
+
+                if self._recycle and not in_flight:
+                    logger.info("工作进程内存超出预算或异常退出，重建进程池")
+                    executor.shutdown(wait=True)
+                    metrics.sweep_worker_textfiles(self.metrics_textfile)  # 旧进程均已退出，清理被强制结束者的文件
+                    executor = self._new_executor()
+                    self._recycle = False
+        finally:
+            logger.info(f"停止监视，等待 {len(in_flight)} 个进行中的视频完成")
+            for future in list(in_flight):
+                self._finish(in_flight.pop(future), future)
+            executor.shutdown(wait=True)
+            self.watcher.close()
+
+    def _finish(self, key: FileKey, future) -> bool:
+        """记录处理结果；返回 True 表示处理失败但尚未用完尝试次数，应重新排队"""
+        try:
+            summary = future.result()
+        except Exception as e:
+            logger.error(f"处理进程异常: {key[0]}: {e}")
+            if isinstance(e, BrokenProcessPool):
+                self._recycle = True  # 工作进程被强制结束（如内存不足被系统杀掉），进程池已不可用
+            summary = {"path": key[0], "events": 0, "error": str(e) or type(e).__name__, "cancelled": False}
+        if summary.get("over_budget"):
+            self._recycle = True
+        if summary.get("cancelled"):
+            return False
+        self.ledger.record(key, summary)
+        if not summary.get("error"):
+            return False
+        failures = self.ledger.failures(key)
+        if failures >= self.ledger.max_attempts:
+            logger.error(f"处理失败 {failures} 次，不再重试: {key[0]}")
+            return False
+        logger.warning(f"处理失败（第 {failures} 次，最多 {self.ledger.max_attempts} 次），稍后重试: {key[0]}")
+        return True
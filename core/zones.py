@@ -0,0 +1,104 @@
+# core/zones.py
+import json
+import cv2
+import numpy as np
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+
+class RoiZone(NamedTuple):
+    """命名关注区域；threshold / min_interval 为 None 时沿用全局设置"""
+    name: str
+    points: List[Tuple[float, float]]
+    threshold: Optional[float] = None
+    min_interval: Optional[float] = None
+
+
+def build_zone_labels(zones: Sequence[RoiZone], shape: Tuple[int, int]) -> Optional[np.ndarray]:
+    """把 N 个多边形编码进一张标签图：0 为区域外，i 为第 i 个区域（重叠处后者覆盖前者）"""
+    if not zones:
+        return None
+    if len(zones) > 255:
+        raise ValueError("最多支持 255 个关注区域")
+    labels = np.zeros(shape[:2], np.uint8)
+    for idx, zone in enumerate(zones, start=1):
+        pts = np.array([[int(x), int(y)] for x, y in zone.points], dtype=np.int32)
+        cv2.fillPoly(labels, [pts], idx)
+    return labels
+
+
+def load_zones(path: str) -> List[RoiZone]:
+    """从 JSON 读取区域列表：[{"name", "points": [[x, y], ...], "threshold", "min_interval"}, ...]"""
+    with open(path, 'r', encoding='utf-8') as f:
+        items = json.load(f)
+    return [zone_from_dict(item, idx) for idx, item in enumerate(items, start=1)]
+
+
+def zone_from_dict(item: dict, index: int = 1) -> RoiZone:
+    points = [(float(x), float(y)) for x, y in item["points"]]
+    if len(points) < 3:
+        raise ValueError(f"区域 {item.get('name', index)} 至少需要3个点")
+    return RoiZone(
+        name=str(item.get("name", f"区域{index}")),
+        points=points,
+        threshold=item.get("threshold"),
+        min_interval=item.get("min_interval")
+    )
+
+
+class ZoneTrigger:
+    """按区域独立判断触发（阈值 + 截图间隔），一次检测得到所有区域的结果"""
+
+    def __init__(self, zones: Sequence[RoiZone], min_interval: float,
+                 change_threshold: Optional[float] = None):
+        self.zones = list(zones)
+        self.min_interval = min_interval
+        self.change_threshold = change_threshold
+        self._last_saved: Dict[int, float] = {}
+
+    def reset(self):
+        self._last_saved.clear()
+
+    def evaluate(self, processor, valid_change: bool, change_ratio: float, now: float) -> List[str]:
+        """返回本帧触发的区域名列表；未设置区域时整幅画面视为一个名为空串的区域"""
+        triggered = []
+        for key, name, interval in self._candidates(processor, valid_change, change_ratio):
+            if not self._interval_ok(key, now, interval):
+                continue
+            self._last_saved[key] = now
+            triggered.append(name)
+        return triggered
+
+    def qualifying(self, processor, valid_change: bool, change_ratio: float) -> List[str]:
+        """本帧满足面积 / 阈值条件的区域名列表（不考虑截图间隔，供按目标截图使用）"""
+        return [name for _, name, _ in self._candidates(processor, valid_change, change_ratio)]
+
+    def _candidates(self, processor, valid_change: bool, change_ratio: float) -> List[Tuple[int, str, float]]:
+        """满足面积与阈值条件的区域 (节流键, 区域名, 截图间隔)"""
+        if not self.zones or processor.zone_ratios is None:
+            if valid_change and self._ratio_ok(change_ratio, self.change_threshold):
+                return [(0, "", self.min_interval)]
+            return []
+
+        candidates = []
+        for idx, zone in enumerate(self.zones, start=1):
+            if processor.zone_max_areas[idx] < processor.pipeline.min_area:
+                continue
+            threshold = zone.threshold if zone.threshold is not None else self.change_threshold
+            if not self._ratio_ok(processor.zone_ratios[idx], threshold):
+                continue
+            interval = zone.min_interval if zone.min_interval is not None else self.min_interval
+            candidates.append((idx, zone.name, interval))
+        return candidates
+
+    @staticmethod
+    def _ratio_ok(ratio: float, threshold: Optional[float]) -> bool:
+        return threshold is None or ratio >= threshold
+
+    def _interval_ok(self, key: int, now: float, interval: float) -> bool:
+        # 按视频内时间计时时 now 从 0 开始，首次触发不能受默认值限制
+        last = self._last_saved.get(key)
+        if last is None:
+            return True
+        # 按整数毫秒比较：不同解码器给出的时间戳有浮点舍入差异（2.8 与 2.8000000000000003），
+        # 恰好相隔一个间隔的帧不能因此在一种解码器上触发、在另一种上被丢弃
+        return round((now - last) * 1000) >= round(interval * 1000)
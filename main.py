@@ -5,11 +5,22 @@ import os
 # 将当前目录加入路径（便于直接运行）
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from ui.main_window import GMMVideoDetector
-import tkinter as tk
-
 if __name__ == "__main__":
+    # 带参数时进入命令行（无界面）模式，不加载 Tk
+    if len(sys.argv) > 1:
+        from cli import main as cli_main
+        sys.exit(cli_main())
+
+    import tkinter as tk
+
+    # 先显示窗口，再加载 OpenCV / PIL 等较重的模块
     root = tk.Tk()
+    root.title("视频画面变化检测")
+    loading = tk.Label(root, text="正在加载…", padx=40, pady=20)
+    loading.pack()
+    root.update()
+
+    from ui.main_window import GMMVideoDetector
+    loading.destroy()
     app = GMMVideoDetector(root)
     root.mainloop()
-    
\ No newline at end of file
@@ -2,7 +2,7 @@
 import cv2
 import numpy as np
 import tkinter as tk
-from tkinter import filedialog, ttk, messagebox
+from tkinter import filedialog, ttk, messagebox, simpledialog
 import os
 import threading
 import time
@@ -20,9 +20,26 @@ from config import (
     SPEED_LEVELS,
     DEFAULT_GMM_VAR_THRESHOLD,
     DEFAULT_FRAME_DIFF_THRESHOLD,
-    GMM_PREHEAT_FRAMES
+    DEDUP_ENABLED,
+    CAPTURE_MODE,
+    ACTIVITY_ENABLED,
+    SCREENSHOT_MODE,
+    SCREENSHOT_MAX_DIM,
+    SCREENSHOT_STORE,
+    PROBE_INDEX_NAME,
+    EVENT_DB_ENABLED,
+    EVENT_DB_NAME
 )
-from core.video_processor import VideoProcessor
+from core.eventdb import EventIndex, EventRecorder
+from core.memory import MemoryMonitor
+from core.video_processor import BackgroundModelPool
+from core.pipeline import DetectionParams, DetectionSession, open_video_capture
+from core.probe import ProbeIndex, ProbePrefetch, format_eta
+from core.runner import save_activity
+from core.screenshot import SCREENSHOT_MODES, render_screenshot
+from core.store import STORE_KINDS, ScreenshotSink, ScreenshotWriter
+from core.tracker import Track
+from core.zones import RoiZone, build_zone_labels
 
 
 class GMMVideoDetector:
@@ -39,6 +56,10 @@ class GMMVideoDetector:
         self.root.configure(bg="#f0f0f0")
         self.setup_dpi_awareness()
         self.background_mode_var = tk.BooleanVar(value=False)
+        self.dedup_var = tk.BooleanVar(value=DEDUP_ENABLED)
+        self.track_mode_var = tk.BooleanVar(value=CAPTURE_MODE == "track")
+        self.activity_var = tk.BooleanVar(value=ACTIVITY_ENABLED)
+        self.event_db_var = tk.BooleanVar(value=EVENT_DB_ENABLED)
 
         # 保存控件引用
         self.control_btn = None
@@ -78,24 +99,40 @@ class GMMVideoDetector:
         self.processing = False
         self.paused = False
         self.roi_selected = False
-        self.roi_points: List[Tuple[float, float]] = []
+        self.roi_zones: List[RoiZone] = []
         self.change_threshold = DEFAULT_CHANGE_THRESHOLD
-        self.save_path = os.path.join(os.getcwd(), "变化截图")
-        self.ensure_directory_exists(self.save_path)
+        self.save_path = os.path.join(os.getcwd(), "变化截图")  # 开始处理时才创建
         self.last_change_time = 0
         self.min_interval = DEFAULT_MIN_INTERVAL
+        self.screenshot_mode = SCREENSHOT_MODE
+        self.screenshot_max_dim = SCREENSHOT_MAX_DIM
+        self.screenshot_store = SCREENSHOT_STORE
         self.preview_frame: Optional[np.ndarray] = None
         self.roi_mask: Optional[np.ndarray] = None
+        self.roi_labels: Optional[np.ndarray] = None
         self.speed_levels = SPEED_LEVELS
         self.current_speed = 1
         self.gmm_var = tk.IntVar(value = DEFAULT_GMM_VAR_THRESHOLD)
         self.fd_var = tk.IntVar(value = DEFAULT_FRAME_DIFF_THRESHOLD)
         self.target_height = TARGET_HEIGHT
         self.cap: Optional[cv2.VideoCapture] = None
+        self.background_pool = BackgroundModelPool()
 
         # 线程安全
         self.ui_queue = queue.Queue()
         self.cap_lock = threading.Lock()
+        # 预览 / 进度等高频更新只保留最新一次，避免界面繁忙时队列中堆积整帧图像
+        self._ui_latest = {}
+        self._ui_latest_lock = threading.Lock()
+        self._preview_photo = None
+
+        # 内存记账：每个视频结束后记录 RSS 增量，超出预算时释放缓存
+        self.memory = MemoryMonitor(log=self.log_message)
+        self.event_recorder: Optional[EventRecorder] = None
+        self.memory.register_probe("ui_queue", self.ui_queue.qsize)
+        self.memory.register_probe("preview_frames", lambda: int(getattr(self, '_last_displayed_frame', None) is not None))
+        self.memory.register_relief("preview_cache", self._drop_preview_cache)
+        self.memory.track_pool(self.background_pool)
 
         # UI
         self.root.after(50, self.process_ui_queue)
@@ -315,7 +352,7 @@ class GMMVideoDetector:
         self.threshold_entry.bind("<Return>", self.validate_threshold_input)
 
         # 截图最小间隔
-        ttk.Label(param_frame, text="截图最小间隔 (秒)").pack(anchor=tk.W, pady=(0, int(2 * self.dpi_scale)))
+        ttk.Label(param_frame, text="截图最小间隔 (视频内秒)").pack(anchor=tk.W, pady=(0, int(2 * self.dpi_scale)))
         intv_f = ttk.Frame(param_frame)
         intv_f.pack(fill=tk.X, pady=(0, int(8 * self.dpi_scale)))
         self.interval_entry_var = tk.StringVar(value=f"{self.min_interval:.1f}")
@@ -349,6 +386,36 @@ class GMMVideoDetector:
         self.save_path_btn = ttk.Button(path_f1, text="更改", command=self.change_save_path, width=int(6 * self.dpi_scale))
         self.save_path_btn.pack(side=tk.RIGHT)
 
+        # 输出模式与尺寸
+        mode_names = {"full": "完整画面", "crop": "变化区域裁剪", "sheet": "拼图（全景+变化区域）"}
+        self.screenshot_mode_names = [mode_names[m] for m in SCREENSHOT_MODES]
+        ttk.Label(save_frame, text="截图内容:").pack(anchor=tk.W, pady=(0, int(2 * self.dpi_scale)))
+        self.screenshot_mode_var = tk.StringVar(value=mode_names[self.screenshot_mode])
+        self.screenshot_mode_combo = ttk.Combobox(
+            save_frame, textvariable=self.screenshot_mode_var, values=self.screenshot_mode_names,
+            state="readonly", font=("SimHei", self.scaled_font_size)
+        )
+        self.screenshot_mode_combo.pack(fill=tk.X, pady=(0, int(5 * self.dpi_scale)))
+        self.screenshot_mode_combo.bind("<<ComboboxSelected>>", self.update_screenshot_mode)
+        ttk.Label(save_frame, text="截图长边上限 (像素):").pack(anchor=tk.W, pady=(0, int(2 * self.dpi_scale)))
+        self.max_dim_var = tk.StringVar(value=str(self.screenshot_max_dim) if self.screenshot_max_dim > 0 else "不限制")
+        self.max_dim_combo = ttk.Combobox(
+            save_frame, textvariable=self.max_dim_var, values=["不限制", "1920", "1280", "960", "640"],
+            state="readonly", font=("SimHei", self.scaled_font_size)
+        )
+        self.max_dim_combo.pack(fill=tk.X, pady=(0, int(5 * self.dpi_scale)))
+        self.max_dim_combo.bind("<<ComboboxSelected>>", self.update_max_dim)
+        store_names = {"files": "单独 JPEG 文件", "tar": "每个视频一个归档（适合 NAS）"}
+        self.store_names = [store_names[k] for k in STORE_KINDS]
+        ttk.Label(save_frame, text="存储方式:").pack(anchor=tk.W, pady=(0, int(2 * self.dpi_scale)))
+        self.store_var = tk.StringVar(value=store_names[self.screenshot_store])
+        self.store_combo = ttk.Combobox(
+            save_frame, textvariable=self.store_var, values=self.store_names,
+            state="readonly", font=("SimHei", self.scaled_font_size)
+        )
+        self.store_combo.pack(fill=tk.X)
+        self.store_combo.bind("<<ComboboxSelected>>", self.update_store)
+
         # 占位行
         ttk.Label(settings_scrollable_frame, text="").grid(row=row, column=0, pady=int(10 * self.dpi_scale))
 
@@ -415,6 +482,30 @@ class GMMVideoDetector:
             variable=self.background_mode_var,
             command=self.toggle_background_mode
         ).pack(anchor=tk.W, padx=int(5 * self.dpi_scale))
+        ttk.Checkbutton(
+            bg_mode_frame,
+            text="相似截图去重（减少重复截图）",
+            variable=self.dedup_var,
+            command=self.toggle_dedup
+        ).pack(anchor=tk.W, padx=int(5 * self.dpi_scale))
+        ttk.Checkbutton(
+            bg_mode_frame,
+            text="按目标截图（每个移动目标一张）",
+            variable=self.track_mode_var,
+            command=self.toggle_track_mode
+        ).pack(anchor=tk.W, padx=int(5 * self.dpi_scale))
+        ttk.Checkbutton(
+            bg_mode_frame,
+            text="输出活动热力图与时间线",
+            variable=self.activity_var,
+            command=self.toggle_activity
+        ).pack(anchor=tk.W, padx=int(5 * self.dpi_scale))
+        ttk.Checkbutton(
+            bg_mode_frame,
+            text="写入事件索引（可按机位 / 时段查询）",
+            variable=self.event_db_var,
+            command=self.toggle_event_db
+        ).pack(anchor=tk.W, padx=int(5 * self.dpi_scale))
         self.style.configure(
             "TCheckbutton",
             font=("SimHei", self.scaled_font_size),
@@ -447,11 +538,12 @@ class GMMVideoDetector:
 • 左键：添加顶点
 • 右键：删除最后一个点
 • R 键：重置所有点
+• 点【添加为区域】：保存当前多边形为命名区域，可单独设置阈值与截图间隔（可添加多个）
 • 点【确认选择】：确认 ROI区域（需 ≥3 个点）
 - ROI 将以绿色多边形显示在预览画面
 ③ 配置参数（【参数设置】标签页）
 - 【画面变化阈值】：默认 5%。值越小越敏感。
-- 【截图最小间隔】：默认 1 秒，避免连续截图。
+- 【截图最小间隔】：默认 1 秒（按视频内时间计算，与处理倍速、电脑快慢无关），避免连续截图。
 - 【GMM 敏感度】：默认 25。值越大，越不敏感（可减少“车走后地面误报”）。
 - 【帧间差分阈值】：默认 30。值越大，越忽略微小运动（可抑制噪点）。
 ④ 设置保存路径
@@ -464,7 +556,8 @@ class GMMVideoDetector:
 - 支持【暂停】/【停止】操作
 - 支持打开/关闭视频预览
 ⑥ 查看结果
-- 截图自动保存为：`视频名_frame_帧号_时间戳.jpg`
+- 截图自动保存为：`视频名_frame_帧号.jpg`，可在【截图保存】中选择完整画面、变化区域裁剪或拼图，并限制截图长边
+- 勾选【按目标截图】后，每个移动目标离开画面时只保存一张目标最大时的截图（不再按截图间隔重复保存）
 - 日志文件位于“检测日志”文件夹，记录所有操作与错误
 如有问题，请查看日志文件或联系开发者（geckotao@hotmail.com）。
 """
@@ -516,7 +609,8 @@ class GMMVideoDetector:
             self.fd_scale, self.fd_label,
             self.threshold_scale, self.threshold_entry, self.threshold_label,
             self.interval_scale, self.interval_entry, self.interval_label,
-            self.save_path_entry, self.save_path_btn
+            self.save_path_entry, self.save_path_btn,
+            self.screenshot_mode_combo, self.max_dim_combo, self.store_combo
         ]
         self.file_widgets = [
             self.add_btn, self.clear_btn, self.remove_btn, self.preview_btn,
@@ -540,6 +634,22 @@ class GMMVideoDetector:
     def safe_ui_call(self, func, *args, **kwargs):
         self.ui_queue.put(lambda: func(*args, **kwargs))
 
+    def safe_ui_call_latest(self, key: str, func, *args, **kwargs):
+        """同一 key 在界面线程执行前只保留最新的一次调用（队列中每个 key 至多一项）"""
+        with self._ui_latest_lock:
+            pending = key in self._ui_latest
+            self._ui_latest[key] = (func, args, kwargs)
+        if not pending:
+            self.ui_queue.put(lambda: self._run_latest(key))
+
+    def _run_latest(self, key: str):
+        with self._ui_latest_lock:
+            func, args, kwargs = self._ui_latest.pop(key)
+        func(*args, **kwargs)
+
+    def _drop_preview_cache(self):
+        self._last_displayed_frame = None
+
     def on_preview_resize(self, event=None):
         if not event or event.width < 50 or event.height < 50:
             return
@@ -552,7 +662,7 @@ class GMMVideoDetector:
         if frame is None:
             self.video_label.config(image='', text="无视频预览", foreground="gray")
             return
-        self._last_displayed_frame = frame.copy()
+        self._last_displayed_frame = frame  # 调用方每次传入新数组，无需再拷贝
         container = self.video_label.master
         container.update_idletasks()
         dw, dh = container.winfo_width(), container.winfo_height()
@@ -564,15 +674,27 @@ class GMMVideoDetector:
         scale = min(dw / w, dh / h)
         new_w, new_h = int(w * scale), int(h * scale)
         resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_AREA)
-        if self.roi_selected and self.roi_points:
+        if self.roi_selected and self.roi_zones:
             orig_h, orig_w = self.preview_frame.shape[:2]
-            sx, sy = new_w / orig_w, new_h / orig_h
-            pts = np.array([[int(x * sx), int(y * sy)] for x, y in self.roi_points], dtype=np.int32)
-            cv2.polylines(resized, [pts], True, (0, 255, 0), thickness=2)
+            self.draw_zones(resized, new_w / orig_w, new_h / orig_h)
         img = Image.fromarray(resized)
-        imgtk = ImageTk.PhotoImage(image=img)
-        self.video_label.config(image=imgtk, text="")
-        self.video_label.image = imgtk
+        photo = self._preview_photo
+        if photo is not None and (photo.width(), photo.height()) == (new_w, new_h):
+            # 尺寸不变时复用同一个 Tk 图像，避免每帧新建 / 销毁 PhotoImage
+            photo.paste(img)
+        else:
+            photo = self._preview_photo = ImageTk.PhotoImage(image=img)
+            self.video_label.config(image=photo, text="")
+            self.video_label.image = photo
+
+    def draw_zones(self, img: np.ndarray, sx: float, sy: float):
+        """在图像上绘制所有关注区域（多区域时标注区域名）"""
+        for zone in self.roi_zones:
+            pts = np.array([[int(x * sx), int(y * sy)] for x, y in zone.points], dtype=np.int32)
+            cv2.polylines(img, [pts], True, (0, 255, 0), thickness=2)
+            if len(self.roi_zones) > 1:
+                cv2.putText(img, zone.name, (int(pts[0][0]), int(pts[0][1]) + 15),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
 
     def _disable_non_control_widgets(self):
         for w in self.parameter_widgets + self.file_widgets:
@@ -633,6 +755,7 @@ class GMMVideoDetector:
             messagebox.showwarning("警告", "请先添加视频文件")
             return
 
+        self.ensure_directory_exists(self.save_path)
         try:
             test_file = os.path.join(self.save_path, f"test_{int(time.time())}.tmp")
             with open(test_file, 'w') as f:
@@ -698,6 +821,20 @@ class GMMVideoDetector:
         self.interval_entry_var.set(f"{v:.1f}")
         self.log_message(f"截图最小间隔设置为 {v:.1f}秒")
 
+    def update_screenshot_mode(self, event=None):
+        index = self.screenshot_mode_names.index(self.screenshot_mode_var.get())
+        self.screenshot_mode = SCREENSHOT_MODES[index]
+        self.log_message(f"截图内容设置为 {self.screenshot_mode_var.get()}")
+
+    def update_max_dim(self, event=None):
+        value = self.max_dim_var.get()
+        self.screenshot_max_dim = int(value) if value.isdigit() else 0
+        self.log_message(f"截图长边上限设置为 {value}")
+
+    def update_store(self, event=None):
+        self.screenshot_store = STORE_KINDS[self.store_names.index(self.store_var.get())]
+        self.log_message(f"截图存储方式设置为 {self.store_var.get()}")
+
     def update_gmm_threshold(self, value):
         v = int(float(value))
         self.gmm_var.set(v)
@@ -745,12 +882,18 @@ class GMMVideoDetector:
         self.roi_photo = None
 
         roi_points: List[Tuple[float, float]] = []
+        zones: List[RoiZone] = []
         lines, circles = [], []
 
         def draw_roi():
             for item in lines + circles:
                 canvas.delete(item)
             lines.clear(); circles.clear()
+            # 已完成的区域
+            for zone in zones:
+                flat = [c * self.roi_scale_factor for p in zone.points for c in p]
+                lines.append(canvas.create_polygon(*flat, outline="orange", fill="", width=2))
+                lines.append(canvas.create_text(flat[0] + 4, flat[1] + 4, text=zone.name, anchor="nw", fill="orange"))
             if len(roi_points) == 0: return
             scaled = [(x * self.roi_scale_factor, y * self.roi_scale_factor) for x, y in roi_points]
             for i, (x, y) in enumerate(scaled):
@@ -827,15 +970,43 @@ class GMMVideoDetector:
         btn_frame = ttk.Frame(roi_window)
         btn_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=5)
 
+        def add_zone():
+            if len(roi_points) < 3:
+                messagebox.showerror("错误", "至少需要3个点才能构成多边形", parent=roi_window)
+                return
+            name = simpledialog.askstring("区域名称", "请输入区域名称:", parent=roi_window,
+                                          initialvalue=f"区域{len(zones) + 1}")
+            if not name:
+                return
+            threshold = simpledialog.askfloat("区域阈值", "该区域画面变化阈值 (%)，取消则沿用全局设置:",
+                                              parent=roi_window, minvalue=0.1, maxvalue=50)
+            interval = simpledialog.askfloat("区域间隔", "该区域截图最小间隔 (秒)，取消则沿用全局设置:",
+                                             parent=roi_window, minvalue=0.1, maxvalue=10)
+            zones.append(RoiZone(
+                name=name,
+                points=list(roi_points),
+                threshold=threshold / 100 if threshold is not None else None,
+                min_interval=interval
+            ))
+            roi_points.clear()
+            draw_roi()
+
         def confirm():
             if len(roi_points) >= 3:
-                self.roi_points = roi_points
+                # 当前未保存的多边形：单区域时沿用原有行为，多区域时按默认名加入
+                zones.append(RoiZone(name="ROI" if not zones else f"区域{len(zones) + 1}", points=list(roi_points)))
+            if zones:
+                self.roi_zones = list(zones)
                 self.roi_selected = True
                 self.roi_button.config(text="取消选取", command=self.cancel_roi)
                 self.create_roi_mask()
                 roi_window.destroy()
-                self.log_message(f"已选择ROI区域，{len(roi_points)}个顶点")
-                self.info_label.config(text=f"已选择ROI区域，{len(roi_points)}个顶点")
+                self.log_message(f"已选择ROI区域，共 {len(zones)} 个区域")
+                for zone in zones:
+                    threshold = f"{zone.threshold * 100:.1f}%" if zone.threshold is not None else "全局"
+                    interval = f"{zone.min_interval:.1f}秒" if zone.min_interval is not None else "全局"
+                    self.log_message(f"  区域[{zone.name}]: {len(zone.points)}个顶点, 阈值 {threshold}, 间隔 {interval}")
+                self.info_label.config(text=f"已选择ROI区域，共 {len(zones)} 个区域")
             else:
                 messagebox.showerror("错误", "至少需要3个点才能构成多边形")
 
@@ -844,11 +1015,13 @@ class GMMVideoDetector:
 
         ttk.Button(btn_frame, text="确认选择", command=confirm).pack(side=tk.RIGHT, padx=(5,0))
         ttk.Button(btn_frame, text="取消", command=cancel).pack(side=tk.RIGHT)
+        ttk.Button(btn_frame, text="添加为区域", command=add_zone).pack(side=tk.LEFT)
 
     def cancel_roi(self):
         self.roi_selected = False
-        self.roi_points = []
+        self.roi_zones = []
         self.roi_mask = None
+        self.roi_labels = None
         self.roi_button.config(text="选择ROI区域", command=self.select_roi)
         self.roi_status_label.config(text="未选取关注区域", foreground="gray")
         if self.preview_frame is not None:
@@ -857,14 +1030,14 @@ class GMMVideoDetector:
         self.info_label.config(text="已取消ROI区域选择", foreground="gray")
 
     def create_roi_mask(self, target_size: Optional[Tuple[int, int]] = None):
-        if not self.roi_selected or not self.roi_points or self.preview_frame is None:
+        if not self.roi_selected or not self.roi_zones or self.preview_frame is None:
             self.roi_mask = None
+            self.roi_labels = None
             return
         try:
-            h, w = self.preview_frame.shape[:2]
-            mask = np.zeros((h, w), np.uint8)
-            pts = np.array([[int(x), int(y)] for x, y in self.roi_points], dtype=np.int32)
-            cv2.fillPoly(mask, [pts], 255)
+            labels = build_zone_labels(self.roi_zones, self.preview_frame.shape[:2])
+            mask = np.where(labels > 0, 255, 0).astype(np.uint8)
+            self.roi_labels = labels
             self.roi_mask = mask
             area_ratio = cv2.countNonZero(mask) / mask.size * 100
             self.roi_status_label.config(text=f"已选取ROI区域 ({area_ratio:.1f}% 画面)", foreground="red")
@@ -873,36 +1046,29 @@ class GMMVideoDetector:
             self.log_message(f"创建ROI掩码失败: {str(e)}")
             messagebox.showerror("错误", f"创建ROI掩码失败: {str(e)}")
             self.roi_mask = None
+            self.roi_labels = None
 
     # ==================== 视频处理（优化后）====================
     def safe_video_capture(self, video_path: str) -> Tuple[Optional[cv2.VideoCapture], Optional[str]]:
-        if not os.path.exists(video_path):
-            return None, f"视频文件不存在: {video_path}"
-        try:
-            cap = cv2.VideoCapture(video_path)
-            if cap.isOpened():
-                return cap, None
-        except Exception:
-            pass
-        if os.name == 'nt':
-            try:
-                long_path = "\\\\?\\" + os.path.abspath(video_path)
-                cap = cv2.VideoCapture(long_path)
-                if cap.isOpened():
-                    return cap, None
-            except Exception:
-                pass
-        return None, f"无法打开视频: {os.path.basename(video_path)}"
+        return open_video_capture(video_path)
 
     def process_videos(self):
+        probes = None
         try:
             current_index = self.current_video_index
+            # 后台探测各视频的实际帧数，每个视频开始前只等待它自己的结果；进度与剩余时间按帧数计算，
+            # 尚未探测完的视频按文件大小估算
+            probes = ProbePrefetch(self.video_paths, ProbeIndex(os.path.join(self.save_path, PROBE_INDEX_NAME)))
+            event_index = None
+            eta_start = time.time()
+            eta_base = None
             while current_index < len(self.video_paths):
                 if not self.processing:
                     break
                 video_path = self.video_paths[current_index]
                 self.safe_ui_call(self.progress_label.config, text=f"正在处理第 {current_index + 1} 个视频")
                 self.log_message(f"开始处理视频: {video_path}")
+                self.memory.begin_video(video_path)
 
                 if self.cap is not None:
                     with self.cap_lock:
@@ -919,119 +1085,145 @@ class GMMVideoDetector:
                         self.current_video_index = current_index
                     continue
 
-                total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
-
-                with self.cap_lock:
-                    ret, first_frame = self.cap.read()
-                if not ret:
-                    self.log_message(f"无法读取首帧: {video_path}")
+                params = DetectionParams(
+                    gmm_var=self.gmm_var.get(),
+                    fd_var=self.fd_var.get(),
+                    min_interval=self.min_interval,
+                    speed=self.current_speed,
+                    roi_zones=self.roi_zones if self.roi_selected else [],
+                    zone_labels=self.roi_labels if self.roi_selected else None,
+                    dedup=self.dedup_var.get(),
+                    capture_mode="track" if self.track_mode_var.get() else "frame",
+                    activity=self.activity_var.get()
+                )
+                info = probes.get(current_index)
+                if info.header_mismatch:
+                    self.log_message(f"{os.path.basename(info.path)}: 容器声明 {info.header_frames} 帧，实际 {info.frame_count} 帧")
+                frames_before = probes.estimated_total(current_index)
+                all_frames = max(1, probes.estimated_total())
+                if eta_base is None:
+                    eta_start, eta_base = time.time(), frames_before
+                session = DetectionSession(self.cap, params, pool=self.background_pool,
+                                           lock=self.cap_lock, name=video_path,
+                                           frame_count=info.frame_count or None)
+                err = session.start()
+                if err:
+                    self.log_message(err)
                     if self.processing:
                         current_index += 1
                         self.current_video_index = current_index
                     continue
+                if session.reused:
+                    self.log_message(f"复用同机位背景模型，跳过预热: {os.path.basename(video_path)}")
 
-                if self.target_height > 0 and first_frame.shape[0] > self.target_height:
-                    scale = self.target_height / first_frame.shape[0]
-                    new_w = int(first_frame.shape[1] * scale)
-                    first_frame = cv2.resize(first_frame, (new_w, self.target_height), interpolation=cv2.INTER_AREA)
-
-                roi_for_processor = self.roi_mask if self.roi_selected else None
-                processor = VideoProcessor(
-                    gmm_var=self.gmm_var.get(),
-                    fd_var=self.fd_var.get(),
-                    roi_mask=roi_for_processor
-                )
-                # === GMM 预热（不检测）===
-                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                # 预热阶段：读取前 N 帧，逐帧喂给 GMM
-                for i in range(GMM_PREHEAT_FRAMES):
-                    with self.cap_lock:
-                        ret, frame = self.cap.read()
-                        if not ret:
+                video_basename = os.path.splitext(os.path.basename(video_path))[0]
+                writer = ScreenshotSink(self.save_path, self.screenshot_store).open(video_basename)
+                if self.event_db_var.get():
+                    duration = session.total_frames / session.fps if session.fps > 0 else 0.0
+                    try:
+                        if event_index is None:
+                            event_index = EventIndex(os.path.join(self.save_path, EVENT_DB_NAME))
+                        self.event_recorder = event_index.recorder(video_path, params, duration=duration)
+                    except Exception as e:
+                        self.log_message(f"打开事件索引失败，本视频不写入索引: {str(e)}")
+                frames = session.frames()
+                try:
+                    for result in frames:
+                        if not self.processing:
                             break
-                    # 预处理（resize + ROI）
-                    _, gray = processor.preprocess_frame(frame)
-                    # 直接喂给 GMM 背景模型（每帧一次）
-                    processor.gmm.apply(gray)
-
-                # 预热结束，从第 GMM_PREHEAT_FRAMES 帧开始正式检测
-                frame_id = GMM_PREHEAT_FRAMES
-
-                last_saved_time = 0
-
-                while frame_id < total_frames:
-                    if not self.processing:
-                        break
-                    if self.paused:
-                        time.sleep(0.05)
-                        continue
-
-                    # ✅ 优化跳帧
-                    if self.current_speed > 1:
-                        next_frame = min(frame_id + self.current_speed, total_frames - 1)
-                        self.cap.set(cv2.CAP_PROP_POS_FRAMES, next_frame)
-                        with self.cap_lock:
-                            ret, frame = self.cap.read()
-                        frame_id = next_frame + 1
+                        frame, fg_mask = result.frame, result.fg_mask
+                        frame_id, total_frames = result.frame_id, result.total_frames
+
+                        # ===== 触发截图 =====
+                        if result.triggered_zones:
+                            if len(self.roi_zones) > 1:
+                                self.log_message(f"区域触发: {', '.join(result.triggered_zones)} (帧 {frame_id})")
+                            image = render_screenshot(frame, result.boxes, fg_mask.shape,
+                                                      mode=self.screenshot_mode, max_dim=self.screenshot_max_dim)
+                            self.save_screenshot(writer, image, result)
+                        for track in result.finished_tracks:
+                            self.save_track_screenshot(writer, track)
+
+                        if not self.background_mode_var.get():
+                            now_time = time.time()
+                            if not hasattr(self, '_last_preview_update_time'):
+                                self._last_preview_update_time = now_time
+                            if now_time - self._last_preview_update_time >= PREVIEW_UPDATE_INTERVAL:
+                                # 确保 frame 是 resize 后的，且与 fg_mask 同高宽
+                                h, w = fg_mask.shape
+                                if frame.shape[:2] != (h, w):
+                                    # 安全 resize frame 到 fg_mask 尺寸（理论上不应发生，但防御性编程）
+                                    frame = cv2.resize(frame, (w, h), interpolation=cv2.INTER_AREA)
+                                color_mask = np.zeros_like(frame)
+                                color_mask[:, :, 2] = fg_mask
+                                marked = cv2.addWeighted(frame, 1, color_mask, 0.5, 0)
+                                if self.roi_selected and self.roi_zones:
+                                    h, w = frame.shape[:2]
+                                    if self.preview_frame is not None:
+                                        orig_h, orig_w = self.preview_frame.shape[:2]
+                                        self.draw_zones(marked, w / orig_w, h / orig_h)
+                                cv2.putText(
+                                    marked,
+                                    f"Change: {result.ratio*100:.1f}% | Speed: {self.current_speed}x",
+                                    (10, 30),
+                                    cv2.FONT_HERSHEY_SIMPLEX,
+                                    0.5,
+                                    (0, 0, 255),
+                                    1
+                                )
+                                rgb_marked = cv2.cvtColor(marked, cv2.COLOR_BGR2RGB)
+                                self.safe_ui_call_latest("preview", self.display_frame, rgb_marked)
+                                self._last_preview_update_time = now_time
+
+                        done_frames = frames_before + frame_id
+                        overall_progress = min(100.0, done_frames / all_frames * 100)
+                        eta = ""
+                        if done_frames > eta_base:
+                            remaining = (time.time() - eta_start) / (done_frames - eta_base) * (all_frames - done_frames)
+                            eta = f"，剩余约 {format_eta(remaining)}"
+                        self.safe_ui_call_latest(
+                            "progress", self._show_progress, overall_progress,
+                            f"第{current_index + 1}个[{frame_id}/{total_frames}]，共{len(self.video_paths)}个视频{eta}"
+                        )
+
+                        # 暂停时不再拉取下一帧；继续后同步可能修改过的倍速与截图间隔
+                        pause_start = time.time()
+                        while self.paused and self.processing:
+                            time.sleep(0.05)
+                        eta_start += time.time() - pause_start  # 暂停时间不计入剩余时间估算
+                        params.speed = self.current_speed
+                        params.min_interval = self.min_interval
+                    # 停止时同样保存已出现目标的截图
+                    for track in session.flush_tracks():
+                        self.save_track_screenshot(writer, track)
+                finally:
+                    frames.close()
+                    writer.close()
+                    if self.event_recorder is not None:
+                        self.event_recorder.close()
+                        self.event_recorder = None
+
+                if session.activity is not None:
+                    paths = save_activity(session, self.save_path, video_basename)
+                    if paths:
+                        self.log_message(f"活动热力图已保存: {paths[0]}")
                     else:
-                        with self.cap_lock:
-                            ret, frame = self.cap.read()
-                        frame_id += 1
-
-                    if not ret:
-                        break
-                    # ===== 预处理 =====
-                    _, gray = processor.preprocess_frame(frame)
-                    # ===== 检测变化（传入学习率）=====
-                    valid_change, fg_mask, change_ratio = processor.detect_change(gray)
-                    # ===== 判断是否触发截图 =====
-                    now = time.time()
-                    if valid_change and (now - last_saved_time) > self.min_interval:
-                        last_saved_time = now
-                        video_basename = os.path.splitext(os.path.basename(video_path))[0]
-                        self.save_screenshot(frame.copy(), video_basename, frame_id)
-
-                    if not self.background_mode_var.get():
-                        now_time = time.time()
-                        if not hasattr(self, '_last_preview_update_time'):
-                            self._last_preview_update_time = now_time
-                        if now_time - self._last_preview_update_time >= PREVIEW_UPDATE_INTERVAL:
-                            # 确保 frame 是 resize 后的，且与 fg_mask 同高宽
-                            h, w = fg_mask.shape
-                            if frame.shape[:2] != (h, w):
-                                # 安全 resize frame 到 fg_mask 尺寸（理论上不应发生，但防御性编程）
-                                frame = cv2.resize(frame, (w, h), interpolation=cv2.INTER_AREA)
-                            color_mask = np.zeros_like(frame)
-                            color_mask[:, :, 2] = fg_mask
-                            marked = cv2.addWeighted(frame, 1, color_mask, 0.5, 0)
-                            if self.roi_selected and self.roi_points:
-                                h, w = frame.shape[:2]
-                                if self.preview_frame is not None:
-                                    orig_h, orig_w = self.preview_frame.shape[:2]
-                                    sx, sy = w / orig_w, h / orig_h
-                                    pts = np.array([[int(x * sx), int(y * sy)] for x, y in self.roi_points], dtype=np.int32)
-                                    cv2.polylines(marked, [pts], True, (0, 255, 0), 2)
-                            cv2.putText(
-                                marked,
-                                f"Change: {change_ratio*100:.1f}% | Speed: {self.current_speed}x",
-                                (10, 30),
-                                cv2.FONT_HERSHEY_SIMPLEX,
-                                0.5,
-                                (0, 0, 255),
-                                1
-                            )
-                            rgb_marked = cv2.cvtColor(marked, cv2.COLOR_BGR2RGB)
-                            self.safe_ui_call(self.display_frame, rgb_marked)
-                            self._last_preview_update_time = now_time
-
-                    overall_progress = ((current_index + (frame_id / total_frames)) / len(self.video_paths)) * 100
-                    self.safe_ui_call(self.total_percent_label.config, text=f"{overall_progress:.1f}%")
-                    self.safe_ui_call(self.progress_var.set, overall_progress)
-                    self.safe_ui_call(
-                        self.progress_label.config,
-                        text=f"第{current_index + 1}个[{frame_id}/{total_frames}]，共{len(self.video_paths)}个视频"
+                        self.log_message("保存活动热力图失败")
+
+                if session.deduper is not None and session.deduper.suppressed:
+                    self.log_message(f"相似截图已抑制: {session.deduper.suppressed} 张")
+
+                rejected = session.processor.global_rejections
+                if any(rejected.values()):
+                    self.log_message(
+                        f"全局变化已抑制: 亮度突变 {rejected['brightness']} 帧, "
+                        f"镜头抖动 {rejected['shake']} 帧, 其他全局变化 {rejected['global']} 帧"
                     )
 
+                rss = self.memory.end_video(video_path)
+                if self.memory.over_budget(rss):
+                    self.log_message("释放缓存后内存仍超出预算，建议分批处理或重启程序")
+
                 if self.processing:
                     current_index += 1
                     self.current_video_index = current_index
@@ -1050,6 +1242,8 @@ class GMMVideoDetector:
             self.log_message(f"处理出错: {e}\n{traceback.format_exc()}")
             self.safe_ui_call(messagebox.showerror, "错误", str(e))
         finally:
+            if probes is not None:
+                probes.close()
             if self.cap is not None:
                 with self.cap_lock:
                     if self.cap.isOpened():
@@ -1062,6 +1256,26 @@ class GMMVideoDetector:
         self.log_message(f"后台模式已{mode}")
         self.info_label.config(text=f"后台模式已{mode} - 预览{'禁用' if self.background_mode_var.get() else '启用'}")
 
+    def toggle_track_mode(self):
+        mode = "按目标截图" if self.track_mode_var.get() else "逐帧触发截图"
+        self.log_message(f"截图方式: {mode}")
+        self.info_label.config(text=f"截图方式: {mode}（下一个视频生效）")
+
+    def toggle_activity(self):
+        mode = "开启" if self.activity_var.get() else "关闭"
+        self.log_message(f"活动热力图与时间线已{mode}")
+        self.info_label.config(text=f"活动热力图与时间线已{mode}（下一个视频生效）")
+
+    def toggle_event_db(self):
+        mode = "开启" if self.event_db_var.get() else "关闭"
+        self.log_message(f"事件索引已{mode}")
+        self.info_label.config(text=f"事件索引已{mode}（下一个视频生效）")
+
+    def toggle_dedup(self):
+        mode = "开启" if self.dedup_var.get() else "关闭"
+        self.log_message(f"相似截图去重已{mode}")
+        self.info_label.config(text=f"相似截图去重已{mode}（下一个视频生效）")
+
     def preview_selected_video(self):
         if not self.video_paths:
             messagebox.showwarning("警告", "请先添加视频文件")
@@ -1164,6 +1378,11 @@ class GMMVideoDetector:
             self.log_message(f"处理倍速设置为 {speed}倍")
             self.info_label.config(text=f"处理倍速: {speed}倍")
 
+    def _show_progress(self, percent: float, text: str):
+        self.total_percent_label.config(text=f"{percent:.1f}%")
+        self.progress_var.set(percent)
+        self.progress_label.config(text=text)
+
     def _stop_cleanup(self):
         self.processing = False
         self.paused = False
@@ -1194,16 +1413,39 @@ class GMMVideoDetector:
         self.log_message("处理已停止")
         self.root.after(100, self._stop_cleanup)
 
-    def save_screenshot(self, frame: np.ndarray, video_basename: str, frame_num: int) -> Optional[str]:
+    def save_track_screenshot(self, writer: ScreenshotWriter, track: Track) -> Optional[str]:
+        """保存目标面积最大的一帧"""
+        image = render_screenshot(track.best_frame, [track.best_box], track.proc_shape,
+                                  mode=self.screenshot_mode, max_dim=self.screenshot_max_dim)
+        track.best_frame = None
+        try:
+            location = writer.write(track.best_frame_id, track.best_time, track.best_ratio, image, track.zones)
+        except Exception as e:
+            self.log_message(f"保存截图失败: {str(e)}")
+            return None
+        if self.event_recorder is not None:
+            record = track.record()
+            self.event_recorder.add({
+                "frame_id": track.best_frame_id, "timestamp": record["best_time"], "ratio": record["best_ratio"],
+                "boxes": [record["best_box"]], "zones": record["zones"], "screenshot": location, "track": record
+            })
+        self.log_message(f"目标 {track.id} 截图已保存: {location}"
+                         f"（{track.enter_time:.1f}s - {track.exit_time:.1f}s，{track.hits} 帧）")
+        self.safe_ui_call(self.info_label.config, text=f"已保存截图: {os.path.basename(location)}")
+        return location
+
+    def save_screenshot(self, writer: ScreenshotWriter, image: np.ndarray, result) -> Optional[str]:
         try:
-            safe_name = "".join(c for c in video_basename if c.isalnum() or c in (' ', '-', '_')).rstrip()
-            filename = f"{safe_name}_frame_{frame_num}.jpg"
-            full_path = os.path.join(self.save_path, filename)
-            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            Image.fromarray(rgb).save(full_path, quality=95)
-            self.log_message(f"截图已保存: {full_path}")
-            self.info_label.config(text=f"已保存截图: {filename}")
-            return full_path
+            location = writer.write(result.frame_id, result.timestamp, result.ratio, image, result.triggered_zones)
+            self.log_message(f"截图已保存: {location}")
+            if self.event_recorder is not None:
+                self.event_recorder.add({
+                    "frame_id": result.frame_id, "timestamp": result.timestamp, "ratio": result.ratio,
+                    "boxes": [[int(v) for v in box] for box in result.boxes],
+                    "zones": [z for z in result.triggered_zones if z], "screenshot": location
+                })
+            self.info_label.config(text=f"已保存截图: {os.path.basename(location)}")
+            return location
         except Exception as e:
             self.log_message(f"保存截图失败: {str(e)}")
             messagebox.showerror("保存错误", f"保存截图失败:\n{str(e)}")